@@ -1,7 +1,8 @@
 
-import React, { useState, useEffect, useCallback, useRef } from 'react';
-import { ActiveFire, AnalyzedHotspot, RiskLevel } from './types';
-import { fetchActiveFires } from './services/nasaFirmsService';
+import React, { useState, useEffect, useCallback, useMemo, useRef } from 'react';
+import { ActiveFire, AnalyzedHotspot, RiskLevel, WatchAlert, WatchSite } from './types';
+import { fetchActiveFires, subscribeActiveFires } from './services/nasaFirmsService';
+import { addWatchSite, subscribeWatchlistAlerts } from './services/watchlistService';
 import { fetchEnvironmentalDataForCoords, fetchWildfirePrediction } from './services/geminiService';
 import GlobeComponent from './components/GlobeComponent';
 import RiskResultDisplay from './components/RiskResultDisplay';
@@ -16,6 +17,7 @@ import ImageUploadAnalysis from './components/ImageUploadAnalysis';
 import GISRiskVisualization from './components/GISRiskVisualization';
 import ValidationAccuracy from './components/ValidationAccuracy';
 import LiveWildfireFeed from './components/LiveWildfireFeed';
+import Toast from './components/Toast';
 
 const REFRESH_INTERVAL_MS = 5 * 60 * 1000; // 5 minutes
 const MAX_HOTSPOTS_TO_ANALYZE = 10;
@@ -31,22 +33,26 @@ function App() {
   const [customPrediction, setCustomPrediction] = useState<AnalyzedHotspot | null>(null);
   const [isAnalyzingCustom, setIsAnalyzingCustom] = useState<boolean>(false);
   const [accuracyMetrics, setAccuracyMetrics] = useState<EvaluationMetrics | null>(null);
+  const [watchSites, setWatchSites] = useState<WatchSite[]>([]);
+  const [watchAlerts, setWatchAlerts] = useState<WatchAlert[]>([]);
+  const [isStreamConnected, setIsStreamConnected] = useState<boolean>(false);
 
   const analysisInProgress = useRef(false);
-
-  const runAnalysis = useCallback(async () => {
-    if (analysisInProgress.current) return;
+  const lastAnalyzedKey = useRef<string | null>(null);
+
+  // Analyzes the brightest hotspots; skipped when they are the ones analyzed last time
+  // unless forced (manual refresh).
+  const analyzeHotspots = useCallback(async (fires: ActiveFire[], force = false) => {
+    const sortedFires = [...fires].sort((a, b) => b.brightness - a.brightness);
+    const topFires = sortedFires.slice(0, MAX_HOTSPOTS_TO_ANALYZE);
+    const key = topFires.map((fire) => fire.id ?? `${fire.lat},${fire.lon}`).join('|');
+    if (analysisInProgress.current || (!force && key === lastAnalyzedKey.current)) return;
     analysisInProgress.current = true;
+    lastAnalyzedKey.current = key;
 
     setIsLoading(true);
     setError(null);
     try {
-      const fires = await fetchActiveFires();
-      setAllActiveFires(fires);
-
-      const sortedFires = [...fires].sort((a, b) => b.brightness - a.brightness);
-      const topFires = sortedFires.slice(0, MAX_HOTSPOTS_TO_ANALYZE);
-
       // Analyze fires in parallel
       const analysisPromises = topFires.map(async (fire): Promise<AnalyzedHotspot | null> => {
         try {
@@ -83,6 +89,18 @@ function App() {
     }
   }, []);
 
+  // Fetches the hotspots and analyzes them (initial load, manual refresh, and polling
+  // while the live stream is down)
+  const runAnalysis = useCallback(async (force = true) => {
+    try {
+      const fires = await fetchActiveFires();
+      setAllActiveFires(fires);
+      await analyzeHotspots(fires, force);
+    } catch (err) {
+      setError(err instanceof Error ? err.message : 'An unexpected error occurred.');
+    }
+  }, [analyzeHotspots]);
+
   const analyzeCustomLocation = useCallback(async (lat: number, lon: number, name?: string) => {
     setIsAnalyzingCustom(true);
     setError(null);
@@ -112,14 +130,72 @@ function App() {
     }
   }, [allActiveFires]);
 
-  // Initial Data Load (Only if Logged In)
+  // Live hotspot updates pushed by the backend (Only if Logged In)
   useEffect(() => {
     if (user) {
-      runAnalysis();
-      const intervalId = setInterval(runAnalysis, REFRESH_INTERVAL_MS);
+      const unsubscribe = subscribeActiveFires(
+        setAllActiveFires,
+        () => setIsStreamConnected(false),
+        () => setIsStreamConnected(true)
+      );
+      return () => {
+        unsubscribe();
+        setIsStreamConnected(false);
+      };
+    }
+  }, [user]);
+
+  // Poll only while the stream is disconnected (including the initial load)
+  useEffect(() => {
+    if (user && !isStreamConnected) {
+      runAnalysis(false);
+      const intervalId = setInterval(() => runAnalysis(false), REFRESH_INTERVAL_MS);
       return () => clearInterval(intervalId);
     }
-  }, [runAnalysis, user]);
+  }, [runAnalysis, user, isStreamConnected]);
+
+  // With the stream connected, re-analyze when the brightest hotspots change
+  const brightestFiresKey = useMemo(
+    () => [...allActiveFires]
+      .sort((a, b) => b.brightness - a.brightness)
+      .slice(0, MAX_HOTSPOTS_TO_ANALYZE)
+      .map((fire) => fire.id ?? `${fire.lat},${fire.lon}`)
+      .join('|'),
+    [allActiveFires]
+  );
+
+  useEffect(() => {
+    if (user && isStreamConnected && allActiveFires.length > 0) {
+      analyzeHotspots(allActiveFires);
+    }
+    // allActiveFires is read for the current list; brightestFiresKey decides when to run
+  }, [brightestFiresKey, isStreamConnected, user, analyzeHotspots]);
+
+  // Threshold crossings for watched sites, pushed when the backend re-scores them
+  useEffect(() => {
+    if (user) {
+      return subscribeWatchlistAlerts(
+        user,
+        (alert) => setWatchAlerts((alerts) => [...alerts, alert]),
+        setWatchSites
+      );
+    }
+  }, [user]);
+
+  const watchCustomLocation = async () => {
+    if (!user || !customPrediction) return;
+    const { lat, lon } = customPrediction.fireData;
+    try {
+      const site = await addWatchSite(user, lat, lon, customPrediction.envData.locationName);
+      setWatchSites((sites) => [...sites, site]);
+    } catch (err) {
+      setError(err instanceof Error ? err.message : 'Failed to watch location.');
+    }
+  };
+
+  const isCustomWatched = customPrediction !== null && watchSites.some(
+    (site) => site.lat === customPrediction.fireData.lat && site.lon === customPrediction.fireData.lon
+  );
 
   const handleLogin = (username: string, lat: number, lon: number) => {
     setUser(username);
@@ -180,7 +256,7 @@ function App() {
             <span className="w-2 h-2 rounded-full bg-green-500 animate-pulse"></span>
             {isLoading ? "Syncing with NASA..." : `Updated: ${lastUpdated?.toLocaleTimeString([], { hour: '2-digit', minute: '2-digit' }) || 'N/A'}`}
           </div>
-          <button onClick={runAnalysis} disabled={isLoading} className="text-xs font-semibold text-blue-400 hover:text-blue-300 disabled:text-slate-600 disabled:cursor-not-allowed flex items-center gap-1.5 transition-colors">
+          <button onClick={() => runAnalysis()} disabled={isLoading} className="text-xs font-semibold text-blue-400 hover:text-blue-300 disabled:text-slate-600 disabled:cursor-not-allowed flex items-center gap-1.5 transition-colors">
             <svg xmlns="http://www.w3.org/2000/svg" className={`h-3.5 w-3.5 ${isLoading ? 'animate-spin' : ''}`} viewBox="0 0 20 20" fill="currentColor">
               <path fillRule="evenodd" d="M4 2a1 1 0 011 1v2.101a7.002 7.002 0 0111.601 2.566 1 1 0 11-1.885.666A5.002 5.002 0 005.999 7H9a1 1 0 110 2H4a1 1 0 01-1-1V3a1 1 0 011-1zm.008 9.057a1 1 0 011.276.61A5.002 5.002 0 0014.001 13H11a1 1 0 110-2h5a1 1 0 011 1v5a1 1 0 11-2 0v-2.101a7.002 7.002 0 01-11.601-2.566 1 1 0 01.61-1.276z" clipRule="evenodd" />
             </svg>
@@ -204,7 +280,16 @@ function App() {
 
             {customPrediction && (
               <div className="animate-fade-in">
-                <h3 className="text-[10px] font-bold text-slate-500 mb-2 uppercase tracking-wider px-1">Custom Analysis</h3>
+                <div className="flex justify-between items-center mb-2 px-1">
+                  <h3 className="text-[10px] font-bold text-slate-500 uppercase tracking-wider">Custom Analysis</h3>
+                  <button
+                    onClick={watchCustomLocation}
+                    disabled={isCustomWatched}
+                    className="text-xs font-semibold text-blue-400 hover:text-blue-300 disabled:text-slate-600 disabled:cursor-not-allowed transition-colors"
+                  >
+                    {isCustomWatched ? 'Watching' : 'Watch Location'}
+                  </button>
+                </div>
                 <RiskResultDisplay
                   key={customPrediction.id}
                   hotspot={customPrediction}
@@ -254,6 +339,18 @@ function App() {
 
         <AIAnalystChat focusedHotspot={focusedHotspot} />
 
+        {/* Watchlist alerts */}
+        <div className="absolute top-4 right-4 z-20 space-y-2">
+          {watchAlerts.map((alert) => (
+            <Toast
+              key={alert.seq}
+              message={`${alert.name} is now ${alert.direction} ${Math.round(alert.threshold * 100)}% fire probability (${Math.round(alert.prob * 100)}%, ${alert.risk}).`}
+              onClose={() => setWatchAlerts((alerts) => alerts.filter((a) => a.seq !== alert.seq))}
+              onClick={() => analyzeCustomLocation(alert.lat, alert.lon, alert.name)}
+            />
+          ))}
+        </div>
+
       </main>
     </div>
   );
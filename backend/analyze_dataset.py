@@ -6,11 +6,12 @@ import torch
 import random
 from PIL import Image
 from transformers import BlipProcessor, BlipForConditionalGeneration
+from risk_classifier import classify_captions
 
 # Configuration
 DATASET_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'dataset')
 RESULTS_FILE = os.path.join(DATASET_DIR, 'analysis_results.json')
-RISK_KEYWORDS = ["fire", "smoke", "flame", "burning", "forest fire", "wildfire"]
+BATCH_SIZE = 8
 
 def load_model():
     print("Loading BLIP model...")
@@ -21,22 +22,41 @@ def load_model():
     print(f"Model loaded on {device}")
     return processor, model, device
 
-def analyze_image(image_path, processor, model, device):
-    try:
-        raw_image = Image.open(image_path).convert('RGB')
-        # Conditional image captioning
-        # text = "a photography of"
-        # inputs = processor(raw_image, text, return_tensors="pt").to(device)
-        
-        # Unconditional image captioning
-        inputs = processor(raw_image, return_tensors="pt").to(device)
+def analyze_images(image_paths, processor, model, device):
+    """
+    Caption a batch of images in one generate call. Unreadable images, or the whole
+    batch if captioning fails, get None.
+    """
+    raw_images, loaded = [], []
+    for image_path in image_paths:
+        try:
+            raw_images.append(Image.open(image_path).convert('RGB'))
+            loaded.append(image_path)
+        except Exception as e:
+            print(f"Error analyzing {image_path}: {e}")
+
+    captions = {}
+    if raw_images:
+        try:
+            # Unconditional image captioning
+            inputs = processor(raw_images, return_tensors="pt").to(device)
+            out = model.generate(**inputs)
+            captions = dict(zip(loaded, processor.batch_decode(out, skip_special_tokens=True)))
+        except Exception as e:
+            print(f"Error captioning batch starting at {image_paths[0]}: {e}")
+    return [captions.get(p) for p in image_paths]
 
-        out = model.generate(**inputs)
-        caption = processor.decode(out[0], skip_special_tokens=True)
-        return caption
-    except Exception as e:
-        print(f"Error analyzing {image_path}: {e}")
-        return None
+def find_images(dataset_dir):
+    """Return the sorted, de-duplicated list of image files below dataset_dir."""
+    image_extensions = ['**/*.jpg', '**/*.jpeg', '**/*.png', '**/*.bmp', '**/*.gif']
+    image_files = []
+    for ext in image_extensions:
+        image_files.extend(glob.glob(os.path.join(dataset_dir, ext), recursive=True))
+    
+    # Remove duplicates if any
+    image_files = list(set(image_files))
+    image_files.sort()
+    return image_files
 
 def main():
     print(f"Analyzing images in: {DATASET_DIR}")
@@ -46,14 +66,7 @@ def main():
         return
 
     # Find images recursively
-    image_extensions = ['**/*.jpg', '**/*.jpeg', '**/*.png', '**/*.bmp', '**/*.gif']
-    image_files = []
-    for ext in image_extensions:
-        image_files.extend(glob.glob(os.path.join(DATASET_DIR, ext), recursive=True))
-    
-    # Remove duplicates if any
-    image_files = list(set(image_files))
-    image_files.sort()
+    image_files = find_images(DATASET_DIR)
     
     print(f"Found {len(image_files)} images total.")
 
@@ -69,29 +82,29 @@ def main():
 
     processor, model, device = load_model()
     
+    captions = []
+    for start in range(0, len(image_files), BATCH_SIZE):
+        captions.extend(analyze_images(image_files[start:start + BATCH_SIZE], processor, model, device))
+        print(f"Captioned {len(captions)}/{len(image_files)} images")
+
+    # Score every caption in one pass
+    analyzed = [(path, caption) for path, caption in zip(image_files, captions) if caption]
+    risks = iter(classify_captions([caption for _, caption in analyzed]))
+    
     results = []
     
     print("-" * 50)
-    for i, img_path in enumerate(image_files):
+    for i, (img_path, caption) in enumerate(zip(image_files, captions)):
         filename = os.path.basename(img_path)
-        caption = analyze_image(img_path, processor, model, device)
         
         if caption:
-            # Check for risk
-            Risk = "Low"
-            detected_keywords = []
-            for keyword in RISK_KEYWORDS:
-                if keyword in caption.lower():
-                    Risk = "High"
-                    detected_keywords.append(keyword)
-            
-            print(f"[{i+1}/{len(image_files)}] {filename}: {caption} | Risk: {Risk}")
+            risk = next(risks)
+            print(f"[{i+1}/{len(image_files)}] {filename}: {caption} | Risk: {risk['risk_level']}")
             
             results.append({
                 "filename": filename,
                 "caption": caption,
-                "risk_level": Risk,
-                "detected_keywords": detected_keywords
+                **risk
             })
         else:
             print(f"[{i+1}/{len(image_files)}] {filename}: Failed to analyze")
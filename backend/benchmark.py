@@ -0,0 +1,446 @@
+"""
+Load-testing and benchmark suite for the Wildfire Prediction API.
+
+Runs a fixed set of scenarios against the backend either in-process (FastAPI
+TestClient) or over HTTP (a uvicorn server spawned for the run, or an existing
+one via --url), at one or more concurrency levels. Latency percentiles and
+throughput are written to a JSON file so runs from different commits can be
+compared with --compare.
+
+Examples:
+    python benchmark.py
+    python benchmark.py --mode http --concurrency 1 4 16 --requests 200
+    python benchmark.py --only predict evaluate --compare benchmarks/old.json
+"""
+import argparse
+import csv
+import io
+import json
+import os
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+RESULTS_DIR = os.path.join(BACKEND_DIR, 'benchmarks')
+FINE_TUNED_DIR = os.path.join(BACKEND_DIR, 'fine_tuned_blip')
+
+EVALUATE_HISTORY_SIZES = [100, 1000, 10000]
+FIRMS_STUB_ROWS = 5000
+
+# Scenario groups selectable with --only
+SCENARIO_GROUPS = ["predict", "timeline", "evaluate", "active-fires", "image"]
+
+
+def random_prediction_payload(rng):
+    return {
+        "lat": rng.uniform(-60, 70),
+        "lon": rng.uniform(-180, 180),
+        "temperature": rng.uniform(-5, 45),
+        "humidity": rng.uniform(5, 95),
+        "wind_speed": rng.uniform(0, 60),
+        "rainfall": rng.uniform(0, 30),
+        "ndvi": rng.uniform(0, 1),
+        "elevation": rng.uniform(0, 3000),
+    }
+
+
+def write_history(path, n_entries, seed=0):
+    """Write a synthetic prediction history (JSON lines) of n_entries from the last 24 hours."""
+    rng = random.Random(seed)
+    now = datetime.now()
+    history = []
+    for _ in range(n_entries):
+        inputs = random_prediction_payload(rng)
+        prob = rng.random()
+        history.append({
+            "timestamp": (now - timedelta(seconds=rng.uniform(0, 23 * 3600))).isoformat(),
+            "lat": inputs["lat"],
+            "lon": inputs["lon"],
+            "prob": prob,
+            "risk": "High" if prob > 0.6 else "Low",
+            "inputs": inputs
+        })
+    with open(path, 'w') as f:
+        f.writelines(json.dumps(entry) + "\n" for entry in history)
+
+
+def reseed_evaluator(history_path):
+    """
+    /evaluate reads the streaming evaluator's buckets, which are seeded from the
+    history file at startup; reseed them in-process after rewriting the file.
+    A spawned server keeps whatever history it started with.
+    """
+    evaluation = sys.modules.get("evaluation")
+    if evaluation is not None:
+        evaluation.evaluator.reset()
+        evaluation.evaluator.load_history_file(history_path)
+
+
+def make_firms_csv(n_rows, seed=0):
+    rng = random.Random(seed)
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    writer.writerow(["latitude", "longitude", "brightness", "scan", "track", "acq_date",
+                     "acq_time", "satellite", "confidence", "version", "bright_t31", "frp", "daynight"])
+    today = datetime.now().strftime("%Y-%m-%d")
+    for _ in range(n_rows):
+        writer.writerow([
+            round(rng.uniform(-60, 70), 4), round(rng.uniform(-180, 180), 4),
+            round(rng.uniform(300, 450), 1), 1.0, 1.0, today,
+            rng.randint(0, 2359), "Terra", rng.randint(0, 100), "6.1NRT",
+            round(rng.uniform(270, 310), 1), round(rng.uniform(1, 100), 1), "D"
+        ])
+    return buf.getvalue().encode('utf-8')
+
+
+class FirmsStub:
+    """Local HTTP server that answers every GET with the same FIRMS-style CSV."""
+
+    def __init__(self, n_rows=FIRMS_STUB_ROWS):
+        body = make_firms_csv(n_rows)
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                self.send_response(200)
+                self.send_header("Content-Type", "text/csv")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def build_fixture_blip_model(output_dir):
+    """
+    Save a tiny randomly initialised BLIP captioning model to output_dir, reusing the
+    processor/tokenizer files of the fine-tuned model. Returns False if torch or
+    transformers are not installed.
+    """
+    try:
+        from transformers import (BlipConfig, BlipForConditionalGeneration,
+                                  BlipProcessor)
+    except ImportError as e:
+        print(f"Skipping image fixture model: {e}")
+        return False
+
+    processor = BlipProcessor.from_pretrained(FINE_TUNED_DIR)
+    image_size = processor.image_processor.size["height"]
+    config = BlipConfig(
+        vision_config={"hidden_size": 32, "intermediate_size": 64, "num_hidden_layers": 1,
+                       "num_attention_heads": 2, "image_size": image_size, "patch_size": 32},
+        text_config={"hidden_size": 32, "intermediate_size": 64, "num_hidden_layers": 1,
+                     "num_attention_heads": 2, "vocab_size": processor.tokenizer.vocab_size,
+                     "max_position_embeddings": 64},
+    )
+    model = BlipForConditionalGeneration(config)
+    model.generation_config.max_length = 12
+    model.save_pretrained(output_dir)
+    processor.save_pretrained(output_dir)
+    return True
+
+
+def make_test_image(size=256):
+    from PIL import Image
+    arr = (np.random.default_rng(0).random((size, size, 3)) * 255).astype(np.uint8)
+    buf = io.BytesIO()
+    Image.fromarray(arr).save(buf, format='JPEG')
+    return buf.getvalue()
+
+
+def build_scenarios(groups, history_path, image_enabled, startup_history=None):
+    """
+    Each scenario is a dict with a name, a setup() run once before measuring and a
+    make_request(i) returning (method, path, kwargs) for the i-th request.
+
+    /evaluate only reads the evaluator's hourly buckets, which are seeded from the
+    history at startup. In-process runs reseed them for each EVALUATE_HISTORY_SIZES
+    entry; against a server, pass the history size it started with
+    (startup_history, or "unknown" for --url) and a single scenario is run.
+    """
+    scenarios = []
+    rng = random.Random(1)
+
+    if "predict" in groups:
+        payloads = [random_prediction_payload(rng) for _ in range(256)]
+        scenarios.append({
+            "name": "predict",
+            "setup": lambda: write_history(history_path, 0),
+            "make_request": lambda i: ("POST", "/predict", {"json": payloads[i % len(payloads)]}),
+        })
+
+    if "timeline" in groups:
+        points = [{"lat": rng.uniform(-60, 70), "lon": rng.uniform(-180, 180)} for _ in range(64)]
+        scenarios.append({
+            "name": "timeline",
+            "setup": lambda: None,
+            "make_request": lambda i: ("POST", "/predict/timeline", {"json": points[i % len(points)]}),
+        })
+
+    if "evaluate" in groups:
+        if startup_history is None:
+            for n_history in EVALUATE_HISTORY_SIZES:
+                scenarios.append({
+                    "name": f"evaluate[history={n_history}]",
+                    "setup": (lambda n=n_history: (write_history(history_path, n), reseed_evaluator(history_path))),
+                    "make_request": lambda i: ("GET", "/evaluate", {"params": {"hours": 24}}),
+                })
+        else:
+            scenarios.append({
+                "name": f"evaluate[history={startup_history}]",
+                "setup": lambda: None,
+                "make_request": lambda i: ("GET", "/evaluate", {"params": {"hours": 24}}),
+            })
+
+    if "active-fires" in groups:
+        scenarios.append({
+            "name": f"active-fires[stub_rows={FIRMS_STUB_ROWS}]",
+            "setup": lambda: None,
+            "make_request": lambda i: ("GET", "/active-fires", {}),
+        })
+
+    if "image" in groups and image_enabled:
+        image_bytes = make_test_image()
+        scenarios.append({
+            "name": "predict-image[fixture]",
+            "setup": lambda: None,
+            "make_request": lambda i: ("POST", "/predict/image",
+                                       {"files": {"file": ("bench.jpg", image_bytes, "image/jpeg")}}),
+        })
+
+    return scenarios
+
+
+def percentile_summary(latencies_s, wall_s, errors):
+    lat_ms = np.asarray(latencies_s) * 1000.0
+    completed = len(lat_ms)
+    return {
+        "requests": completed,
+        "errors": errors,
+        "mean_ms": round(float(lat_ms.mean()), 3) if completed else None,
+        "p50_ms": round(float(np.percentile(lat_ms, 50)), 3) if completed else None,
+        "p95_ms": round(float(np.percentile(lat_ms, 95)), 3) if completed else None,
+        "p99_ms": round(float(np.percentile(lat_ms, 99)), 3) if completed else None,
+        "throughput_rps": round(completed / wall_s, 2) if wall_s > 0 else None,
+    }
+
+
+def run_scenario(send, scenario, n_requests, concurrency, warmup):
+    scenario["setup"]()
+    for i in range(warmup):
+        send(*scenario["make_request"](i))
+
+    latencies = []
+    errors = 0
+    lock = threading.Lock()
+
+    def one(i):
+        nonlocal errors
+        method, path, kwargs = scenario["make_request"](i)
+        start = time.perf_counter()
+        try:
+            status = send(method, path, kwargs)
+            ok = status < 400
+        except Exception:
+            ok = False
+        elapsed = time.perf_counter() - start
+        with lock:
+            if ok:
+                latencies.append(elapsed)
+            else:
+                errors += 1
+
+    wall_start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(one, range(n_requests)))
+    wall = time.perf_counter() - wall_start
+    return percentile_summary(latencies, wall, errors)
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def wait_for_server(url, timeout=60):
+    import requests
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            if requests.get(url + "/", timeout=1).status_code == 200:
+                return
+        except requests.RequestException:
+            pass
+        time.sleep(0.25)
+    raise RuntimeError(f"Server at {url} did not come up within {timeout}s")
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR,
+                                       stderr=subprocess.DEVNULL).decode().strip()
+    except Exception:
+        return "unknown"
+
+
+def compare_results(current, baseline_path, threshold_pct):
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    base_index = {(r["scenario"], r["concurrency"]): r for r in baseline["results"]}
+
+    print("-" * 50)
+    print(f"Comparison against {baseline_path} (commit {baseline.get('git_commit')})")
+    regressions = 0
+    for r in current["results"]:
+        base = base_index.get((r["scenario"], r["concurrency"]))
+        if not base or not base.get("p95_ms") or not r.get("p95_ms"):
+            continue
+        delta = (r["p95_ms"] - base["p95_ms"]) / base["p95_ms"] * 100
+        flag = "REGRESSION" if delta > threshold_pct else ""
+        regressions += bool(flag)
+        print(f"{r['scenario']:<40} c={r['concurrency']:<3} p95 {base['p95_ms']:>9.2f} -> {r['p95_ms']:>9.2f} ms "
+              f"({delta:+.1f}%) {flag}")
+    return regressions
+
+
+def run(args, workdir):
+    history_path = os.path.join(workdir, "prediction_history.json")
+    write_history(history_path, 0)
+    startup_history = None
+
+    image_enabled = False
+    if "image" in args.only and not args.url:
+        fixture_dir = os.path.join(workdir, "blip_fixture")
+        image_enabled = build_fixture_blip_model(fixture_dir)
+        if image_enabled:
+            os.environ["BLIP_MODEL_PATH"] = fixture_dir
+
+    # Everything the backend writes stays in the workdir
+    os.environ["PREDICTION_HISTORY_FILE"] = history_path
+    os.environ["FIRE_ARCHIVE_DIR"] = os.path.join(workdir, "fire_archive")
+    os.environ["HISTORY_ROLLUP_DIR"] = os.path.join(workdir, "history_rollups")
+    os.environ["WATCHLIST_FILE"] = os.path.join(workdir, "watchlist.json")
+    os.environ["PROFILE_DIR"] = os.path.join(workdir, "profiles")
+    server_proc = None
+
+    with FirmsStub() as firms:
+        os.environ["FIRMS_API_URL"] = firms.url
+
+        if args.mode == "inprocess":
+            sys.path.insert(0, BACKEND_DIR)
+            from fastapi.testclient import TestClient
+            import main as api
+            if image_enabled and not api.VISION_AVAILABLE:
+                image_enabled = False
+            client = TestClient(api.app)
+
+            def send(method, path, kwargs):
+                return client.request(method, path, **kwargs).status_code
+        else:
+            import requests
+            if args.url:
+                base_url = args.url.rstrip("/")
+                image_enabled = "image" in args.only
+                startup_history = "unknown"
+            else:
+                startup_history = EVALUATE_HISTORY_SIZES[-1]
+                write_history(history_path, startup_history)
+                port = free_port()
+                base_url = f"http://127.0.0.1:{port}"
+                server_proc = subprocess.Popen(
+                    [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+                    cwd=BACKEND_DIR, env=os.environ.copy())
+                wait_for_server(base_url)
+            session = requests.Session()
+            adapter = requests.adapters.HTTPAdapter(pool_maxsize=max(args.concurrency))
+            session.mount("http://", adapter)
+
+            def send(method, path, kwargs):
+                return session.request(method, base_url + path, timeout=120, **kwargs).status_code
+
+        scenarios = build_scenarios(args.only, history_path, image_enabled, startup_history)
+        results = []
+        try:
+            print("-" * 50)
+            for scenario in scenarios:
+                for concurrency in args.concurrency:
+                    summary = run_scenario(send, scenario, args.requests, concurrency, args.warmup)
+                    summary.update({"scenario": scenario["name"], "concurrency": concurrency})
+                    results.append(summary)
+                    print(f"{scenario['name']:<40} c={concurrency:<3} p50={summary['p50_ms']}ms "
+                          f"p95={summary['p95_ms']}ms p99={summary['p99_ms']}ms "
+                          f"{summary['throughput_rps']} req/s errors={summary['errors']}")
+        finally:
+            if server_proc is not None:
+                server_proc.terminate()
+                server_proc.wait(timeout=10)
+
+    report = {
+        "git_commit": git_commit(),
+        "timestamp": datetime.now().isoformat(),
+        "mode": args.mode,
+        "requests_per_run": args.requests,
+        "results": results,
+    }
+    output = args.output
+    if not output:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        output = os.path.join(RESULTS_DIR, f"{report['git_commit']}-{datetime.now().strftime('%Y%m%d-%H%M%S')}.json")
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print("-" * 50)
+    print(f"Results saved to {output}")
+
+    if args.compare:
+        regressions = compare_results(report, args.compare, args.regression_threshold)
+        if regressions:
+            sys.exit(1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the Wildfire Prediction API")
+    parser.add_argument("--mode", choices=["inprocess", "http"], default="inprocess")
+    parser.add_argument("--url", help="Benchmark an already running server instead of spawning one (http mode)")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8])
+    parser.add_argument("--requests", type=int, default=100, help="Requests per scenario and concurrency level")
+    parser.add_argument("--warmup", type=int, default=5)
+    parser.add_argument("--only", nargs="+", choices=SCENARIO_GROUPS, default=SCENARIO_GROUPS)
+    parser.add_argument("--output", help="Result file (default: benchmarks/<commit>-<timestamp>.json)")
+    parser.add_argument("--compare", help="Previous result file to compare p95 latency against")
+    parser.add_argument("--regression-threshold", type=float, default=10.0,
+                        help="p95 increase in percent reported as a regression")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="wildfire-bench-")
+    try:
+        run(args, workdir)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
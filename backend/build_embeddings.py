@@ -0,0 +1,79 @@
+"""
+Bulk job: compute BLIP vision embeddings for every image in the dataset and build
+the on-disk similarity index used by /predict/image/similar.
+
+    python build_embeddings.py [--nlist 512] [--batch-size 32]
+"""
+import argparse
+import os
+import sys
+
+import numpy as np
+from PIL import Image
+
+from analyze_dataset import DATASET_DIR, find_images
+from embedding_index import EMBEDDINGS_DIR, build_index, normalize
+from fine_tuned_blip import blip_service
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the dataset image embedding index")
+    parser.add_argument("--dataset-dir", default=DATASET_DIR)
+    parser.add_argument("--output-dir", default=EMBEDDINGS_DIR)
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--nlist", type=int, default=None, help="Number of IVF lists (default sqrt(N))")
+    args = parser.parse_args()
+
+    image_files = find_images(args.dataset_dir)
+    print(f"Found {len(image_files)} images in {args.dataset_dir}")
+    if not image_files:
+        return
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    raw_path = os.path.join(args.output_dir, 'vectors.raw.npy')
+    raw = None
+    ids = []
+    written = 0
+
+    for start in range(0, len(image_files), args.batch_size):
+        batch, batch_ids = [], []
+        for path in image_files[start:start + args.batch_size]:
+            try:
+                batch.append(Image.open(path).convert('RGB'))
+                batch_ids.append(os.path.relpath(path, args.dataset_dir))
+            except Exception as e:
+                print(f"Error loading {path}: {e}")
+        if not batch:
+            continue
+
+        embeddings = normalize(blip_service.embed_images(batch, batch_size=args.batch_size))
+        if raw is None:
+            # Sized for every image; trimmed below if some fail to load
+            raw = np.lib.format.open_memmap(raw_path, mode='w+', dtype=np.float16,
+                                            shape=(len(image_files), embeddings.shape[1]))
+        raw[written:written + len(embeddings)] = embeddings
+        written += len(embeddings)
+        ids.extend(batch_ids)
+        print(f"[{min(start + args.batch_size, len(image_files))}/{len(image_files)}] embedded", flush=True)
+
+    if written == 0:
+        print("No images could be loaded; nothing to index")
+        sys.exit(1)
+
+    raw.flush()
+    del raw
+    if written < len(image_files):
+        full = np.load(raw_path, mmap_mode='r')
+        trimmed_path = raw_path + '.trimmed.npy'
+        trimmed = np.lib.format.open_memmap(trimmed_path, mode='w+', dtype=np.float16, shape=(written, full.shape[1]))
+        trimmed[:] = full[:written]
+        trimmed.flush()
+        del trimmed, full
+        os.replace(trimmed_path, raw_path)
+
+    build_index(raw_path, ids, output_dir=args.output_dir, nlist=args.nlist)
+    os.remove(raw_path)
+
+
+if __name__ == "__main__":
+    main()
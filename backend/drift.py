@@ -0,0 +1,184 @@
+"""
+Input drift monitoring for /predict.
+
+train_model.py saves a reference profile next to each model
+(`<model>_profile.json`). For every feature the profile stores the training
+percentiles, which split the training data into REFERENCE_BINS bins of
+(roughly) equal mass, and the training share that falls in each bin. Clipped
+features give tied edges and uneven shares.
+
+At serving time each request increments one counter per feature in the
+current hour's histogram over those same bins. Memory is fixed at
+hours x features x bins, and an update is one bisect per feature. A report over
+any window sums the hourly histograms and compares them with the reference:
+
+- PSI over deciles (groups of reference bins)
+- KS statistic: the largest gap between the production and training CDFs at
+  the bin edges
+- production quantiles, interpolated within bins, next to the reference ones
+"""
+import bisect
+import json
+import os
+import threading
+import time
+
+import numpy as np
+
+import feature_store
+
+REFERENCE_BINS = 100
+PSI_GROUPS = 10
+RETENTION_HOURS = int(os.environ.get("DRIFT_RETENTION_HOURS", str(7 * 24)))
+BUCKET_SECONDS = 3600
+# Usual PSI reading: < 0.1 stable, < 0.25 moderate shift, otherwise significant
+PSI_MODERATE = 0.1
+PSI_SIGNIFICANT = 0.25
+# Below this many requests in the window the statistics are mostly sampling noise
+MIN_SAMPLES = int(os.environ.get("DRIFT_MIN_SAMPLES", "100"))
+
+
+def profile_path(model_path):
+    return os.path.splitext(model_path)[0] + '_profile.json'
+
+
+def build_reference_profile(df, features=None):
+    """Percentile edges and summary stats per feature from a training DataFrame."""
+    features = features or list(df.columns)
+    profile = {"bins": REFERENCE_BINS, "samples": int(len(df)), "features": {}}
+    for name in features:
+        values = np.asarray(df[name], dtype=np.float64)
+        edges = np.round(np.percentile(values, np.linspace(0, 100, REFERENCE_BINS + 1)), 6)
+        # Same binning rule as DriftMonitor.observe (bisect_right on the interior edges)
+        bins = np.searchsorted(edges[1:-1], values, side='right')
+        shares = np.bincount(bins, minlength=REFERENCE_BINS) / len(values)
+        profile["features"][name] = {
+            "edges": [float(e) for e in edges],
+            "shares": [round(float(p), 6) for p in shares],
+            "mean": float(values.mean()),
+            "std": float(values.std())
+        }
+    return profile
+
+
+def save_reference_profile(df, model_path, features=None):
+    path = profile_path(model_path)
+    with open(path, 'w') as f:
+        json.dump(build_reference_profile(df, features), f)
+    print(f"Reference profile saved to {path}")
+    return path
+
+
+def load_reference_profile(model_path):
+    try:
+        with open(profile_path(model_path)) as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError) as e:
+        print(f"No drift reference profile for {model_path}: {e}")
+        return None
+
+
+def psi(expected, actual, eps=1e-4):
+    expected = np.maximum(expected, eps)
+    actual = np.maximum(actual, eps)
+    return float(np.sum((actual - expected) * np.log(actual / expected)))
+
+
+class DriftMonitor:
+    def __init__(self, profile=None, features=feature_store.FEATURES, retention_hours=RETENTION_HOURS):
+        self.features = list(features)
+        self.retention_hours = retention_hours
+        self._lock = threading.Lock()
+        self.set_profile(profile)
+
+    def set_profile(self, profile):
+        """Use a new reference profile and drop all sketches (e.g. after a model change)."""
+        with self._lock:
+            self.profile = profile
+            self._inner_edges = {}
+            self.bins = REFERENCE_BINS
+            if profile:
+                self.bins = profile["bins"]
+                # Interior edges only: bin 0 and the last bin are open-ended
+                self._inner_edges = {name: profile["features"][name]["edges"][1:-1]
+                                     for name in self.features if name in profile["features"]}
+            self._buckets = {}  # hour start (epoch seconds) -> (features, bins) counts
+
+    def _bucket(self, now):
+        key = int(now) // BUCKET_SECONDS * BUCKET_SECONDS
+        counts = self._buckets.get(key)
+        if counts is None:
+            counts = self._buckets[key] = np.zeros((len(self.features), self.bins), dtype=np.int64)
+            cutoff = key - self.retention_hours * BUCKET_SECONDS
+            for old in [k for k in self._buckets if k <= cutoff]:
+                del self._buckets[old]
+        return counts
+
+    def observe(self, values, now=None):
+        """Count one request's inputs ({feature: value}) into the current hour."""
+        if not self._inner_edges:
+            return
+        with self._lock:
+            counts = self._bucket(now or time.time())
+            for i, name in enumerate(self.features):
+                edges = self._inner_edges.get(name)
+                value = values.get(name)
+                if edges is not None and value is not None and value == value:  # skip NaN
+                    counts[i, bisect.bisect_right(edges, value)] += 1
+
+    def _window_counts(self, hours, now=None):
+        now = now or time.time()
+        start = int(now - hours * 3600) // BUCKET_SECONDS * BUCKET_SECONDS
+        with self._lock:
+            total = np.zeros((len(self.features), self.bins), dtype=np.int64)
+            for key, counts in self._buckets.items():
+                if key >= start:
+                    total += counts
+        return total
+
+    def _quantiles(self, edges, counts, qs):
+        """Quantile estimates from bin counts, interpolating linearly inside each bin."""
+        cdf = np.concatenate([[0], np.cumsum(counts)]) / counts.sum()
+        return [float(np.interp(q, cdf, edges)) for q in qs]
+
+    def report(self, hours=24):
+        if not self.profile:
+            return {"available": False, "detail": "No reference profile; retrain with train_model.py"}
+        counts = self._window_counts(hours)
+        group = self.bins // PSI_GROUPS if self.bins % PSI_GROUPS == 0 else 1
+
+        features = {}
+        for i, name in enumerate(self.features):
+            if name not in self.profile["features"]:
+                continue
+            n = int(counts[i].sum())
+            ref = self.profile["features"][name]
+            edges = np.array(ref["edges"])
+            ref_share = np.array(ref["shares"])
+            entry = {
+                "count": n,
+                "reference_quantiles": self._quantiles(edges, ref_share, [0.1, 0.5, 0.9]),
+                "reference_mean": ref["mean"]
+            }
+            if n > 0:
+                share = counts[i] / n
+                entry["psi"] = round(psi(ref_share.reshape(-1, group).sum(axis=1),
+                                         share.reshape(-1, group).sum(axis=1)), 5)
+                entry["ks"] = round(float(np.max(np.abs(np.cumsum(share) - np.cumsum(ref_share)))), 5)
+                entry["quantiles"] = self._quantiles(edges, counts[i], [0.1, 0.5, 0.9])
+                if n < MIN_SAMPLES:
+                    entry["status"] = "insufficient_data"
+                else:
+                    entry["status"] = ("significant" if entry["psi"] >= PSI_SIGNIFICANT
+                                       else "moderate" if entry["psi"] >= PSI_MODERATE else "stable")
+            features[name] = entry
+
+        return {
+            "available": True,
+            "window_hours": hours,
+            "reference_samples": self.profile.get("samples"),
+            "features": features
+        }
+
+
+monitor = DriftMonitor()
@@ -0,0 +1,147 @@
+"""
+On-disk image embedding store with an IVF (inverted file) index for approximate
+cosine nearest-neighbour search.
+
+Layout of an index directory:
+    vectors.npy  float16 (N, D) L2-normalised embeddings, rows grouped by IVF list
+    ids.json     image ID (dataset-relative path) of every row
+    ivf.npz      centroids (nlist, D) and list offsets (nlist + 1) into vectors.npy
+
+vectors.npy is memory-mapped, and a query reads only the rows of the `nprobe`
+lists whose centroids are closest to it. Memory use is therefore independent
+of the dataset size, apart from the centroids and the ID list.
+"""
+import json
+import os
+import threading
+
+import numpy as np
+
+EMBEDDINGS_DIR = os.environ.get("EMBEDDINGS_DIR", os.path.join(os.path.dirname(__file__), 'embeddings'))
+DEFAULT_NPROBE = int(os.environ.get("EMBEDDINGS_NPROBE", "8"))
+
+VECTORS_FILE = 'vectors.npy'
+IDS_FILE = 'ids.json'
+IVF_FILE = 'ivf.npz'
+
+
+def normalize(x):
+    x = np.asarray(x, dtype=np.float32)
+    norms = np.linalg.norm(x, axis=-1, keepdims=True)
+    return x / np.maximum(norms, 1e-12)
+
+
+def spherical_kmeans(X, nlist, iterations=10, seed=0):
+    """Cluster L2-normalised rows of X into nlist unit-norm centroids."""
+    rng = np.random.default_rng(seed)
+    centroids = X[rng.choice(len(X), nlist, replace=False)].astype(np.float32)
+    for _ in range(iterations):
+        assign = np.argmax(X @ centroids.T, axis=1)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assign, X)
+        counts = np.bincount(assign, minlength=nlist)
+        empty = np.flatnonzero(counts == 0)
+        if len(empty):
+            # Re-seed empty lists with random points
+            sums[empty] = X[rng.choice(len(X), len(empty), replace=False)]
+        centroids = normalize(sums)
+    return centroids
+
+
+def assign_lists(vectors, centroids, chunk_size=8192):
+    assign = np.empty(len(vectors), dtype=np.int32)
+    for start in range(0, len(vectors), chunk_size):
+        chunk = np.asarray(vectors[start:start + chunk_size], dtype=np.float32)
+        assign[start:start + chunk_size] = np.argmax(chunk @ centroids.T, axis=1)
+    return assign
+
+
+def build_index(raw_vectors_path, ids, output_dir=EMBEDDINGS_DIR, nlist=None,
+                train_sample=100_000, chunk_size=8192, seed=0):
+    """
+    Build an index directory from a (N, D) float16 .npy of normalised embeddings in
+    dataset order and their IDs. Rows are rewritten grouped by IVF list.
+    """
+    raw = np.load(raw_vectors_path, mmap_mode='r')
+    n, dim = raw.shape
+    if n != len(ids):
+        raise ValueError(f"{n} vectors but {len(ids)} ids")
+    nlist = nlist or max(1, min(4096, int(np.sqrt(n))))
+
+    rng = np.random.default_rng(seed)
+    sample_idx = np.sort(rng.choice(n, min(n, train_sample), replace=False))
+    if nlist > len(sample_idx):
+        print(f"Only {len(sample_idx)} training vectors; using {len(sample_idx)} IVF lists instead of {nlist}")
+        nlist = len(sample_idx)
+    print(f"Training {nlist} IVF centroids on {len(sample_idx)} vectors...")
+    centroids = spherical_kmeans(np.asarray(raw[sample_idx], dtype=np.float32), nlist, seed=seed)
+
+    print("Assigning vectors to lists...")
+    assign = assign_lists(raw, centroids, chunk_size)
+    order = np.argsort(assign, kind='stable')
+    offsets = np.concatenate([[0], np.cumsum(np.bincount(assign, minlength=nlist))]).astype(np.int64)
+
+    os.makedirs(output_dir, exist_ok=True)
+    vectors = np.lib.format.open_memmap(os.path.join(output_dir, VECTORS_FILE), mode='w+',
+                                        dtype=np.float16, shape=(n, dim))
+    for start in range(0, n, chunk_size):
+        rows = order[start:start + chunk_size]
+        # Read in ascending row order for sequential disk access, then restore list order
+        vectors[start:start + len(rows)] = raw[np.sort(rows)][np.argsort(np.argsort(rows))]
+    vectors.flush()
+    del vectors
+
+    with open(os.path.join(output_dir, IDS_FILE), 'w') as f:
+        json.dump([ids[i] for i in order], f)
+    np.savez(os.path.join(output_dir, IVF_FILE), centroids=centroids, offsets=offsets)
+    print(f"Index with {n} vectors in {nlist} lists written to {output_dir}")
+
+
+class EmbeddingIndex:
+    def __init__(self, index_dir=EMBEDDINGS_DIR):
+        self.index_dir = index_dir
+        self.vectors = np.load(os.path.join(index_dir, VECTORS_FILE), mmap_mode='r')
+        with open(os.path.join(index_dir, IDS_FILE)) as f:
+            self.ids = json.load(f)
+        ivf = np.load(os.path.join(index_dir, IVF_FILE))
+        self.centroids = ivf["centroids"].astype(np.float32)
+        self.offsets = ivf["offsets"]
+
+    def __len__(self):
+        return len(self.ids)
+
+    def search(self, query, k=10, nprobe=DEFAULT_NPROBE):
+        """Approximate top-k cosine search. Returns (results, number of vectors scanned)."""
+        q = normalize(query).reshape(-1)
+        nprobe = max(1, min(nprobe, len(self.centroids)))
+        lists = np.argpartition(-(self.centroids @ q), nprobe - 1)[:nprobe]
+
+        rows, scores = [], []
+        for lst in lists:
+            start, end = int(self.offsets[lst]), int(self.offsets[lst + 1])
+            if end > start:
+                scores.append(np.asarray(self.vectors[start:end], dtype=np.float32) @ q)
+                rows.append(np.arange(start, end))
+        if not rows:
+            return [], 0
+        rows = np.concatenate(rows)
+        scores = np.concatenate(scores)
+
+        k = min(k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        results = [{"id": self.ids[rows[i]], "score": round(float(scores[i]), 4)} for i in top]
+        return results, len(scores)
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_index():
+    """Lazily open the index in EMBEDDINGS_DIR; None if it hasn't been built."""
+    global _index
+    with _index_lock:
+        if _index is None and os.path.exists(os.path.join(EMBEDDINGS_DIR, IVF_FILE)):
+            _index = EmbeddingIndex(EMBEDDINGS_DIR)
+    return _index
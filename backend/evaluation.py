@@ -0,0 +1,149 @@
+"""
+Incremental model evaluation against active fires.
+
+Predictions are grouped into hourly buckets that keep running TP/FP/TN/FN
+counts. A prediction is labelled when it is recorded: "fire" if any active
+hotspot lies within MATCH_RADIUS_KM. On each fire feed refresh, the retained
+predictions are relabelled against the new snapshot with one vectorized index
+query per bucket, and the counts are adjusted. Reporting a window therefore
+sums bucket counts and never rescans history or needs the client's fire list.
+"""
+import threading
+from datetime import datetime, timedelta
+
+import numpy as np
+
+import fire_index
+import history_store
+
+MATCH_RADIUS_KM = 20.0
+RISK_THRESHOLD = 0.4  # prob above this counts as predicting "fire"
+BUCKET_SECONDS = 3600
+RETENTION_HOURS = 7 * 24
+
+
+class _Bucket:
+    __slots__ = ("lats", "lons", "predicted", "actual", "counts")
+
+    def __init__(self):
+        self.lats, self.lons, self.predicted, self.actual = [], [], [], []
+        self.counts = np.zeros(4, dtype=np.int64)  # tp, fp, tn, fn
+
+
+def _confusion(predicted, actual):
+    predicted = np.asarray(predicted, dtype=bool)
+    actual = np.asarray(actual, dtype=bool)
+    return np.array([
+        np.sum(predicted & actual),
+        np.sum(predicted & ~actual),
+        np.sum(~predicted & ~actual),
+        np.sum(~predicted & actual)
+    ], dtype=np.int64)
+
+
+class StreamingEvaluator:
+    def __init__(self, index=fire_index.index, match_radius_km=MATCH_RADIUS_KM,
+                 risk_threshold=RISK_THRESHOLD, retention_hours=RETENTION_HOURS):
+        self.index = index
+        self.match_radius_km = match_radius_km
+        self.risk_threshold = risk_threshold
+        self.retention_hours = retention_hours
+        self._buckets = {}  # bucket start (epoch seconds) -> _Bucket
+        self._lock = threading.Lock()
+
+    def reset(self):
+        with self._lock:
+            self._buckets = {}
+
+    @staticmethod
+    def _bucket_key(timestamp):
+        return int(timestamp.timestamp()) // BUCKET_SECONDS * BUCKET_SECONDS
+
+    def _expire(self, now):
+        cutoff = self._bucket_key(now - timedelta(hours=self.retention_hours))
+        for key in [k for k in self._buckets if k < cutoff]:
+            del self._buckets[key]
+
+    def record_predictions(self, lats, lons, probs, timestamps):
+        """Add predictions, labelling them against the current fire snapshot."""
+        if len(lats) == 0:
+            return
+        actual = self.index.any_within(np.asarray(lats), np.asarray(lons), self.match_radius_km)
+        predicted = np.asarray(probs) > self.risk_threshold
+        with self._lock:
+            for lat, lon, p, a, ts in zip(lats, lons, predicted, actual, timestamps):
+                bucket = self._buckets.setdefault(self._bucket_key(ts), _Bucket())
+                bucket.lats.append(lat)
+                bucket.lons.append(lon)
+                bucket.predicted.append(bool(p))
+                bucket.actual.append(bool(a))
+                bucket.counts += _confusion([p], [a])
+            self._expire(datetime.now())
+
+    def record_prediction(self, lat, lon, prob, timestamp=None):
+        self.record_predictions([lat], [lon], [prob], [timestamp or datetime.now()])
+
+    def relabel(self, delta=None):
+        """Fire feed listener: re-match retained predictions against the new snapshot."""
+        with self._lock:
+            self._expire(datetime.now())
+            for bucket in self._buckets.values():
+                if not bucket.lats:
+                    continue
+                actual = self.index.any_within(np.array(bucket.lats), np.array(bucket.lons), self.match_radius_km)
+                previous = np.array(bucket.actual, dtype=bool)
+                changed = actual != previous
+                if changed.any():
+                    predicted = np.array(bucket.predicted, dtype=bool)
+                    bucket.counts += _confusion(predicted[changed], actual[changed])
+                    bucket.counts -= _confusion(predicted[changed], previous[changed])
+                    bucket.actual = actual.tolist()
+
+    def load_history(self, history):
+        """Seed buckets from logged predictions within the retention window."""
+        cutoff = datetime.now() - timedelta(hours=self.retention_hours)
+        lats, lons, probs, stamps = [], [], [], []
+        for pred in history:
+            try:
+                ts = datetime.fromisoformat(pred['timestamp'])
+            except (KeyError, ValueError):
+                continue # Skip invalid timestamps
+            if ts >= cutoff:
+                lats.append(pred['lat'])
+                lons.append(pred['lon'])
+                probs.append(pred['prob'])
+                stamps.append(ts)
+        self.record_predictions(lats, lons, probs, stamps)
+
+    def load_history_file(self, path):
+        self.load_history(history_store.read_entries(path))
+
+    def report(self, hours=24, end=None):
+        """Accuracy/precision/recall (percent) over the last `hours`. O(number of buckets)."""
+        end = end or datetime.now()
+        start_key = self._bucket_key(end - timedelta(hours=hours))
+        end_key = self._bucket_key(end)
+        with self._lock:
+            counts = sum((b.counts for k, b in self._buckets.items() if start_key <= k <= end_key),
+                         np.zeros(4, dtype=np.int64))
+        tp, fp, tn, fn = (int(c) for c in counts)
+        total = tp + fp + tn + fn
+
+        accuracy = (tp + tn) / total if total > 0 else 0
+        precision = tp / (tp + fp) if (tp + fp) > 0 else 0
+        recall = tp / (tp + fn) if (tp + fn) > 0 else 0
+        return {
+            "accuracy": round(accuracy * 100, 2),
+            "precision": round(precision * 100, 2),
+            "recall": round(recall * 100, 2),
+            "total_predictions": total,
+            "correct_predictions": tp + tn,
+            "true_positives": tp,
+            "false_positives": fp,
+            "true_negatives": tn,
+            "false_negatives": fn,
+            "window_hours": hours
+        }
+
+
+evaluator = StreamingEvaluator()
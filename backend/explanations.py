@@ -0,0 +1,51 @@
+"""
+Per-feature contributions (TreeSHAP) for fire risk predictions.
+
+Contributions come from XGBoost's native `pred_contribs` and are in log-odds:
+bias + the sum of feature contributions equals the model's margin, and
+sigmoid(margin) is the fire probability. Rows are cached by model version and
+feature vector, so repeated grid cells and timeline months are only explained
+once. Keys are quantized like the /predict cache only while that cache is on;
+otherwise /predict scores exact inputs and explanations are keyed on exact
+inputs too, so both report the same probability.
+"""
+import os
+
+import numpy as np
+import xgboost as xgb
+
+import prediction_cache
+
+EXPLAIN_CACHE_SIZE = int(os.environ.get("EXPLAIN_CACHE_SIZE", "20000"))
+
+EXACT_KEYS = not prediction_cache.cache.enabled
+
+cache = prediction_cache.PredictionCache(
+    max_size=EXPLAIN_CACHE_SIZE,
+    quanta={name: 0 for name in prediction_cache.PREDICT_CACHE_QUANTA} if EXACT_KEYS else prediction_cache.PREDICT_CACHE_QUANTA
+)
+
+
+def contributions(clf, X, feature_names, keys):
+    """
+    (n, features + 1) contribution matrix for the rows of X; the last column is
+    the bias. Only rows whose key is not cached are sent to the booster, in one batch.
+    """
+    out = np.empty((len(X), len(feature_names) + 1), dtype=np.float64)
+    pending = {}  # key -> row indexes needing it
+    for i, key in enumerate(keys):
+        cached = cache.get(key) if cache.enabled else None
+        if cached is None:
+            pending.setdefault(key, []).append(i)
+        else:
+            out[i] = cached
+
+    if pending:
+        first_rows = [rows[0] for rows in pending.values()]
+        dmatrix = xgb.DMatrix(np.asarray(X)[first_rows], feature_names=feature_names)
+        computed = clf.get_booster().predict(dmatrix, pred_contribs=True)
+        for (key, rows), row_contribs in zip(pending.items(), computed):
+            out[rows] = row_contribs
+            cache.put(key, row_contribs)
+    return out
+
@@ -0,0 +1,155 @@
+"""
+Local environmental feature store backed by memory-mapped rasters.
+
+Each layer lives in RASTERS_DIR as `<name>.npy` plus a `<name>.json` sidecar:
+
+    {"bounds": [min_lon, min_lat, max_lon, max_lat], "nodata": -9999}
+
+The array is either static (H, W), e.g. elevation, or monthly normals
+(12, H, W), e.g. temperature. Row 0 is the northern edge (GeoTIFF order) and
+values are pixel-centred. Lookups are vectorized bilinear interpolations over
+whole batches of points; nodata and out-of-bounds points come back as NaN.
+
+Import a GeoTIFF (requires rasterio):
+    python feature_store.py import elevation srtm_1km.tif
+    python feature_store.py import temperature worldclim_tavg.tif   # 12 bands -> monthly
+"""
+import json
+import os
+import sys
+import threading
+
+import numpy as np
+
+RASTERS_DIR = os.environ.get("RASTERS_DIR", os.path.join(os.path.dirname(__file__), 'rasters'))
+
+# Model feature order (must match train_model.py)
+FEATURES = ["temperature", "humidity", "wind_speed", "rainfall", "ndvi", "elevation"]
+
+
+class RasterLayer:
+    def __init__(self, name, data, bounds, nodata=None):
+        self.name = name
+        self.data = data
+        self.min_lon, self.min_lat, self.max_lon, self.max_lat = bounds
+        self.nodata = nodata
+        self.monthly = data.ndim == 3
+        self.height, self.width = data.shape[-2:]
+        self.wraps = self.max_lon - self.min_lon >= 360
+
+    @classmethod
+    def load(cls, directory, name):
+        with open(os.path.join(directory, name + '.json')) as f:
+            meta = json.load(f)
+        data = np.load(os.path.join(directory, name + '.npy'), mmap_mode='r')
+        return cls(name, data, meta["bounds"], meta.get("nodata"))
+
+    def sample(self, lats, lons, months=None):
+        """Bilinear values at the given points; months (0-11) select monthly bands."""
+        lats = np.asarray(lats, dtype=np.float64)
+        lons = np.asarray(lons, dtype=np.float64)
+
+        # Continuous pixel coordinates (pixel centres at integer + 0.5)
+        x = (lons - self.min_lon) / (self.max_lon - self.min_lon) * self.width - 0.5
+        y = (self.max_lat - lats) / (self.max_lat - self.min_lat) * self.height - 0.5
+        inside = (lats >= self.min_lat) & (lats <= self.max_lat)
+        if not self.wraps:
+            inside &= (lons >= self.min_lon) & (lons <= self.max_lon)
+
+        x0 = np.floor(x).astype(np.int64)
+        y0 = np.floor(y).astype(np.int64)
+        fx = x - x0
+        fy = y - y0
+        if self.wraps:
+            x0, x1 = x0 % self.width, (x0 + 1) % self.width
+        else:
+            x0, x1 = np.clip(x0, 0, self.width - 1), np.clip(x0 + 1, 0, self.width - 1)
+        y0, y1 = np.clip(y0, 0, self.height - 1), np.clip(y0 + 1, 0, self.height - 1)
+
+        if self.monthly:
+            band = np.zeros(len(lats), dtype=np.int64) if months is None else np.asarray(months, dtype=np.int64) % 12
+            corner = lambda yy, xx: self.data[band, yy, xx]
+        else:
+            corner = lambda yy, xx: self.data[yy, xx]
+
+        values = np.stack([corner(y0, x0), corner(y0, x1), corner(y1, x0), corner(y1, x1)]).astype(np.float64)
+        weights = np.stack([(1 - fx) * (1 - fy), fx * (1 - fy), (1 - fx) * fy, fx * fy])
+
+        valid = np.isfinite(values)
+        if self.nodata is not None:
+            valid &= values != self.nodata
+        weights = np.where(valid, weights, 0.0)
+        total = weights.sum(axis=0)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            result = (np.where(valid, values, 0.0) * weights).sum(axis=0) / total
+        result[(total == 0) | ~inside] = np.nan
+        return result
+
+
+class FeatureStore:
+    def __init__(self, directory=RASTERS_DIR):
+        self.directory = directory
+        self.layers = {}
+        if os.path.isdir(directory):
+            for filename in sorted(os.listdir(directory)):
+                name, ext = os.path.splitext(filename)
+                if ext == '.npy' and os.path.exists(os.path.join(directory, name + '.json')):
+                    self.layers[name] = RasterLayer.load(directory, name)
+
+    def available(self):
+        return sorted(self.layers)
+
+    def lookup(self, lats, lons, months=None, features=None):
+        """
+        Values of the requested features (default: all available) at each point,
+        as {feature: float array}. `months` may be a scalar or per-point array.
+        """
+        lats = np.atleast_1d(np.asarray(lats, dtype=np.float64))
+        lons = np.atleast_1d(np.asarray(lons, dtype=np.float64))
+        if months is not None:
+            months = np.broadcast_to(np.asarray(months), lats.shape)
+        names = [f for f in (features or self.layers) if f in self.layers]
+        return {name: self.layers[name].sample(lats, lons, months) for name in names}
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_store():
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = FeatureStore(RASTERS_DIR)
+            if _store.layers:
+                print(f"Feature store layers loaded: {', '.join(_store.available())}")
+    return _store
+
+
+def import_geotiff(name, path, directory=RASTERS_DIR):
+    """Convert a GeoTIFF into a memory-mappable layer (1 band: static, 12 bands: monthly)."""
+    import rasterio
+
+    with rasterio.open(path) as src:
+        if src.crs and src.crs.to_epsg() != 4326:
+            raise ValueError(f"{path} must be in EPSG:4326 lat/lon, found {src.crs}")
+        data = src.read().astype(np.float32)
+        bounds = [src.bounds.left, src.bounds.bottom, src.bounds.right, src.bounds.top]
+        nodata = src.nodata
+    if data.shape[0] == 1:
+        data = data[0]
+    elif data.shape[0] != 12:
+        raise ValueError(f"Expected 1 or 12 bands, found {data.shape[0]}")
+
+    os.makedirs(directory, exist_ok=True)
+    np.save(os.path.join(directory, name + '.npy'), data)
+    with open(os.path.join(directory, name + '.json'), 'w') as f:
+        json.dump({"bounds": bounds, "nodata": nodata}, f)
+    print(f"Saved layer '{name}' {data.shape} to {directory}")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 4 or sys.argv[1] != "import":
+        print("Usage: python feature_store.py import <layer-name> <geotiff>")
+        sys.exit(1)
+    import_geotiff(sys.argv[2], sys.argv[3])
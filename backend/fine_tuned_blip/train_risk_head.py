@@ -0,0 +1,80 @@
+import os
+import sys
+import glob
+import random
+import numpy as np
+from PIL import Image
+from sklearn.linear_model import LogisticRegression
+from sklearn.metrics import accuracy_score, brier_score_loss
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import blip_service
+
+# Configuration
+DATASET_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'dataset', 'train')
+OUTPUT_PATH = blip_service.RISK_HEAD_PATH
+MAX_IMAGES_PER_CLASS = 2000
+CALIBRATION_FRACTION = 0.2
+IMAGE_PATTERNS = ['*.jpg', '*.jpeg', '*.png']
+
+def list_images(folder):
+    files = []
+    for pattern in IMAGE_PATTERNS:
+        files.extend(glob.glob(os.path.join(folder, pattern)))
+    files.sort()
+    random.shuffle(files)
+    return files[:MAX_IMAGES_PER_CLASS]
+
+def load_embeddings(paths, batch_size=32):
+    embeddings = []
+    for start in range(0, len(paths), batch_size):
+        images = [Image.open(p).convert('RGB') for p in paths[start:start + batch_size]]
+        embeddings.append(blip_service.embed_images(images))
+        print(f"Embedded {min(start + batch_size, len(paths))}/{len(paths)} images", flush=True)
+    return np.concatenate(embeddings)
+
+def train():
+    random.seed(42)
+    wildfire = list_images(os.path.join(DATASET_DIR, 'wildfire'))
+    nowildfire = list_images(os.path.join(DATASET_DIR, 'nowildfire'))
+    print(f"Found {len(wildfire)} wildfire and {len(nowildfire)} nowildfire images.")
+    if not wildfire or not nowildfire:
+        print("Both wildfire/ and nowildfire/ folders need images.")
+        return
+
+    paths = wildfire + nowildfire
+    y = np.array([1] * len(wildfire) + [0] * len(nowildfire))
+    X = load_embeddings(paths)
+
+    # Hold out a calibration split
+    order = np.random.default_rng(42).permutation(len(y))
+    n_cal = max(2, int(len(y) * CALIBRATION_FRACTION))
+    cal_idx, fit_idx = order[:n_cal], order[n_cal:]
+
+    mean = X[fit_idx].mean(axis=0)
+    std = X[fit_idx].std(axis=0) + 1e-6
+
+    print("Training logistic head...")
+    head = LogisticRegression(C=1.0, max_iter=2000)
+    head.fit((X[fit_idx] - mean) / std, y[fit_idx])
+
+    # Platt scaling on the held-out split: p = sigmoid(a * logit + c)
+    cal_logits = head.decision_function((X[cal_idx] - mean) / std)
+    platt = LogisticRegression(C=1e6, max_iter=1000)
+    platt.fit(cal_logits[:, None], y[cal_idx])
+    a, c = float(platt.coef_[0, 0]), float(platt.intercept_[0])
+
+    # Fold standardisation and calibration into a single linear layer over raw embeddings
+    w = head.coef_[0] / std
+    weight = a * w
+    bias = a * (float(head.intercept_[0]) - float(w @ mean)) + c
+
+    cal_prob = 1.0 / (1.0 + np.exp(-(X[cal_idx] @ weight + bias)))
+    print(f"Calibration-split accuracy: {accuracy_score(y[cal_idx], cal_prob > 0.5) * 100:.2f}%")
+    print(f"Calibration-split Brier score: {brier_score_loss(y[cal_idx], cal_prob):.4f}")
+
+    np.savez(OUTPUT_PATH, weight=weight.astype(np.float32), bias=np.float32(bias))
+    print(f"Risk head saved to {OUTPUT_PATH}")
+
+if __name__ == "__main__":
+    train()
@@ -0,0 +1,249 @@
+"""
+Historical archive of FIRMS hotspots, partitioned by acquisition date and geohash.
+
+Layout: ARCHIVE_DIR/<YYYY-MM-DD>/<geohash>.npy, one structured NumPy array per
+partition (lat, lon, brightness, frp, acq_time, sensors, key). `sensors` is a
+bitmask over ARCHIVE_SENSORS; products not in that list are not recorded.
+Partitions written before frp/sensors existed are upgraded when read (frp NaN,
+no sensors). With the default precision of 2,
+a cell is 5.6° x 11.25°. A bbox and date-range query only reads the day
+directories in range and the cells that intersect the box, however many years
+of data are archived. Partitions are small, so they are read whole rather than
+memory-mapped: an open mapping would stop a concurrent append from replacing
+the file on Windows.
+
+Rows are de-duplicated on `key`, a 64-bit hash of the fire id, so re-ingesting
+an overlapping snapshot (each FIRMS fetch covers the last day) adds nothing
+except sensors that have since seen an archived hotspot.
+
+Ingest is hooked to fire feed refreshes in main.py. It can also run standalone, e.g. from cron:
+    python fire_archive.py ingest
+    python fire_archive.py query 30 -125 42 -114 2025-01-01 2025-01-31
+"""
+import hashlib
+import os
+import sys
+import threading
+import time
+from collections import defaultdict
+from datetime import date
+
+import numpy as np
+
+import fire_feed
+import geohash
+
+ARCHIVE_DIR = os.environ.get("FIRE_ARCHIVE_DIR", os.path.join(os.path.dirname(__file__), 'fire_archive'))
+# Archive every fire feed refresh (set to 0 to disable)
+ARCHIVE_ENABLED = os.environ.get("FIRE_ARCHIVE_ENABLED", "1") == "1"
+GEOHASH_PRECISION = 2
+MAX_QUERY_DAYS = 3660
+
+# FIRMS products recorded in the sensors bitmask (bit i = ARCHIVE_SENSORS[i]); append only
+ARCHIVE_SENSORS = [
+    "VIIRS_SNPP_NRT", "VIIRS_NOAA20_NRT", "VIIRS_NOAA21_NRT", "MODIS_NRT", "LANDSAT_NRT",
+    "VIIRS_SNPP_SP", "VIIRS_NOAA20_SP", "MODIS_SP"
+]
+_SENSOR_BITS = {sensor: 1 << i for i, sensor in enumerate(ARCHIVE_SENSORS)}
+
+RECORD_DTYPE = np.dtype([
+    ("lat", "f8"),
+    ("lon", "f8"),
+    ("brightness", "f4"),
+    ("frp", "f4"),  # MW, NaN if unknown
+    ("acq_time", "i2"),  # HHMM UTC, -1 if unknown
+    ("sensors", "u2"),
+    ("key", "u8")
+])
+
+
+def fire_key(fire):
+    """De-duplication key: 64-bit hash of the fire's stable id."""
+    fid = fire.get("id") or fire_feed.fire_id(fire)
+    return int.from_bytes(hashlib.blake2b(fid.encode(), digest_size=8).digest(), "little")
+
+
+def _acq_time(fire):
+    try:
+        return int(fire.get("acq_time", -1))
+    except (TypeError, ValueError):
+        return -1
+
+
+def sensor_mask(sensors):
+    mask = 0
+    for sensor in sensors or []:
+        mask |= _SENSOR_BITS.get(sensor, 0)
+    return mask
+
+
+def mask_sensors(mask):
+    return [sensor for sensor, bit in _SENSOR_BITS.items() if mask & bit]
+
+
+def to_records(fires):
+    records = np.empty(len(fires), dtype=RECORD_DTYPE)
+    records["lat"] = [f["lat"] for f in fires]
+    records["lon"] = [f["lon"] for f in fires]
+    records["brightness"] = [f.get("brightness", np.nan) for f in fires]
+    records["frp"] = [f.get("frp", np.nan) for f in fires]
+    records["acq_time"] = [_acq_time(f) for f in fires]
+    records["sensors"] = [sensor_mask(f.get("sensors")) for f in fires]
+    records["key"] = [fire_key(f) for f in fires]
+    return records
+
+
+def upgrade_records(part):
+    """Convert a partition written with an older RECORD_DTYPE (missing fields get NaN / 0)."""
+    records = np.zeros(len(part), dtype=RECORD_DTYPE)
+    records["frp"] = np.nan
+    for name in part.dtype.names:
+        if name in RECORD_DTYPE.names:
+            records[name] = part[name]
+    return records
+
+
+class FireArchive:
+    def __init__(self, directory=ARCHIVE_DIR, precision=GEOHASH_PRECISION):
+        self.directory = directory
+        self.precision = precision
+        self._lock = threading.Lock()
+
+    def _partition_path(self, day, cell):
+        return os.path.join(self.directory, day, cell + '.npy')
+
+    def _read(self, path):
+        try:
+            part = np.load(path)
+        except FileNotFoundError:
+            return np.empty(0, dtype=RECORD_DTYPE)
+        return part if part.dtype == RECORD_DTYPE else upgrade_records(part)
+
+    def _replace(self, tmp_path, path, attempts=5):
+        """os.replace, retried while a reader on Windows still has the partition open."""
+        for attempt in range(attempts):
+            try:
+                os.replace(tmp_path, path)
+                return
+            except PermissionError:
+                if attempt == attempts - 1:
+                    raise
+                time.sleep(0.05 * (attempt + 1))
+
+    def append(self, fires):
+        """Add hotspots to their partitions, skipping ones already archived. Returns rows added."""
+        by_day = defaultdict(list)
+        for fire in fires:
+            try:
+                date.fromisoformat(fire["acq_date"])
+            except (KeyError, TypeError, ValueError):
+                continue
+            by_day[fire["acq_date"]].append(fire)
+
+        added = 0
+        with self._lock:
+            for day, day_fires in by_day.items():
+                records = to_records(day_fires)
+                cells = geohash.encode(records["lat"], records["lon"], self.precision)
+                os.makedirs(os.path.join(self.directory, day), exist_ok=True)
+                order = np.argsort(cells, kind='stable')
+                unique_cells, starts = np.unique(cells[order], return_index=True)
+                for cell, rows in zip(unique_cells, np.split(order, starts[1:])):
+                    path = self._partition_path(day, cell)
+                    existing = self._read(path)
+                    new = records[rows]
+                    _, first = np.unique(new["key"], return_index=True)
+                    new = new[np.sort(first)]
+                    known = np.isin(new["key"], existing["key"])
+                    if known.any():
+                        # A later refresh can add sensors to an archived hotspot
+                        by_key = np.argsort(existing["key"])
+                        pos = by_key[np.searchsorted(existing["key"], new["key"][known], sorter=by_key)]
+                        sensors = existing["sensors"][pos] | new["sensors"][known]
+                        if (sensors != existing["sensors"][pos]).any():
+                            existing["sensors"][pos] = sensors
+                        elif known.all():
+                            continue
+                    new = new[~known]
+                    merged = np.concatenate([existing, new])
+                    tmp_path = path + '.tmp.npy'
+                    np.save(tmp_path, merged)
+                    self._replace(tmp_path, path)  # Readers never see a partial partition
+                    added += len(new)
+        return added
+
+    def on_fire_delta(self, delta):
+        """Fire feed listener: archive new and changed hotspots from each refresh."""
+        fires = delta.get("added", []) + delta.get("updated", [])
+        if fires:
+            added = self.append(fires)
+            if added:
+                print(f"Archived {added} new hotspots")
+
+    def days(self):
+        if not os.path.isdir(self.directory):
+            return []
+        return sorted(d for d in os.listdir(self.directory) if len(d) == 10 and d[4] == '-')
+
+    def query(self, min_lat, min_lon, max_lat, max_lon, start, end, limit=None):
+        """
+        Hotspots inside the box with acq_date in [start, end] (ISO dates, inclusive),
+        as a list of dicts. min_lon > max_lon selects a box across the antimeridian.
+        """
+        start_day, end_day = date.fromisoformat(start), date.fromisoformat(end)
+        if end_day < start_day:
+            raise ValueError("end date is before start date")
+        if (end_day - start_day).days > MAX_QUERY_DAYS:
+            raise ValueError(f"date range longer than {MAX_QUERY_DAYS} days")
+        cells = geohash.cover(min_lat, min_lon, max_lat, max_lon, self.precision)
+
+        results = []
+        for day in self.days():
+            if not (start <= day <= end):
+                continue
+            for cell in cells:
+                path = self._partition_path(day, cell)
+                if not os.path.exists(path):
+                    continue
+                part = self._read(path)
+                lat, lon = part["lat"], part["lon"]
+                inside = (lat >= min_lat) & (lat <= max_lat)
+                if min_lon <= max_lon:
+                    inside &= (lon >= min_lon) & (lon <= max_lon)
+                else:
+                    inside &= (lon >= min_lon) | (lon <= max_lon)
+                selected = part[inside]
+                for lat_, lon_, bright, frp, t, mask in zip(
+                        selected["lat"].tolist(), selected["lon"].tolist(), selected["brightness"].tolist(),
+                        selected["frp"].tolist(), selected["acq_time"].tolist(), selected["sensors"].tolist()):
+                    fire = {"lat": lat_, "lon": lon_, "brightness": round(bright, 2), "acq_date": day}
+                    if t >= 0:
+                        fire["acq_time"] = f"{t:04d}"
+                    if frp == frp:
+                        fire["frp"] = round(frp, 2)
+                    if mask:
+                        fire["sensors"] = mask_sensors(mask)
+                    results.append(fire)
+                    if limit is not None and len(results) >= limit:
+                        return results
+        return results
+
+
+archive = FireArchive()
+
+
+if __name__ == "__main__":
+    if len(sys.argv) >= 2 and sys.argv[1] == "ingest":
+        print(f"Added {archive.append(fire_feed.fetch_active_fires())} hotspots to {archive.directory}")
+    elif len(sys.argv) in (7, 8) and sys.argv[1] == "query":
+        min_lat, min_lon, max_lat, max_lon = (float(v) for v in sys.argv[2:6])
+        start = sys.argv[6]
+        end = sys.argv[7] if len(sys.argv) == 8 else start
+        fires = archive.query(min_lat, min_lon, max_lat, max_lon, start, end)
+        for fire in fires[:20]:
+            print(fire)
+        print(f"{len(fires)} hotspots")
+    else:
+        print("Usage: python fire_archive.py ingest")
+        print("       python fire_archive.py query <min_lat> <min_lon> <max_lat> <max_lon> <start> [end]")
+        sys.exit(1)
@@ -0,0 +1,277 @@
+"""
+Groups active-fire hotspots into fire events.
+
+Clustering is DBSCAN in local projected km: two hotspots are neighbours when
+they are within EVENT_EPS_KM of each other, and neighbour pairs are found
+through the grid spatial hash in fire_index. Hotspots with at least
+EVENT_MIN_HOTSPOTS neighbours (counting themselves) are core points; the
+default of 1 makes every connected group of hotspots an event. A border point
+(not core, next to a core point) joins the cluster of its nearest core point.
+
+Updates are incremental: neighbour counts are kept per hotspot and only
+recounted within eps of what changed. The hotspots near the change and their
+events are re-clustered, grown until no core point (or border point with a core
+neighbour) inside the set neighbours one outside it, so the result is the same as
+clustering everything. Every other event keeps its id and summary. A
+re-clustered event keeps the id of the old event that contributes most of its
+hotspots, so clients can follow an event across refreshes.
+"""
+import os
+import threading
+from collections import Counter
+
+import numpy as np
+from scipy.sparse import coo_matrix
+from scipy.sparse.csgraph import connected_components
+
+import fire_index
+
+EVENT_EPS_KM = float(os.environ.get("FIRE_EVENT_EPS_KM", "2.0"))
+EVENT_MIN_HOTSPOTS = int(os.environ.get("FIRE_EVENT_MIN_HOTSPOTS", "1"))
+
+
+def dbscan(lats, lons, eps_km=EVENT_EPS_KM, min_points=EVENT_MIN_HOTSPOTS, core=None):
+    """
+    Cluster labels (0..k-1) for each point, -1 for noise. `core` overrides the core
+    flags, e.g. when the points are a subset and neighbours outside it count too.
+    """
+    n = len(lats)
+    if n == 0:
+        return np.empty(0, dtype=np.int64)
+    i, j, dist = fire_index.grid_pairs(lats, lons, lats, lons, eps_km)
+    if core is None:
+        core = np.bincount(i, minlength=n) >= min_points
+
+    # Core points connected through core neighbours form clusters
+    both = core[i] & core[j]
+    graph = coo_matrix((np.ones(both.sum(), dtype=np.int8), (i[both], j[both])), shape=(n, n))
+    _, components = connected_components(graph, directed=False)
+    labels = np.where(core, components, -1)
+
+    # Border points join the cluster of their nearest core point
+    border = ~core[i] & core[j]
+    b_i, b_j = i[border], j[border]
+    nearest_first = np.lexsort((dist[border], b_i))
+    b_i, b_j = b_i[nearest_first], b_j[nearest_first]
+    first = np.unique(b_i, return_index=True)[1]
+    labels[b_i[first]] = components[b_j[first]]
+
+    # Renumber to 0..k-1
+    clustered = labels >= 0
+    _, labels[clustered] = np.unique(labels[clustered], return_inverse=True)
+    return labels
+
+
+def summarize(labels, lats, lons, brightness, frp, detected):
+    """
+    Centroid, extent and intensity of each cluster 0..k-1 (noise ignored), computed
+    for all clusters at once with grouped reductions. `detected` holds sortable
+    "acq_date acq_time" strings.
+    """
+    keep = labels >= 0
+    labels, lats, lons, brightness, frp, detected = (a[keep] for a in (labels, lats, lons, brightness, frp, detected))
+    order = np.lexsort((detected, labels))
+    labels, lats, lons, brightness, frp, detected = (a[order] for a in (labels, lats, lons, brightness, frp, detected))
+    if len(labels) == 0:
+        return []
+    starts = np.flatnonzero(np.r_[True, labels[1:] != labels[:-1]])
+    counts = np.diff(np.r_[starts, len(labels)])
+
+    # Circular mean longitude, then offsets relative to it so events across the antimeridian stay compact
+    lon_rad = np.radians(lons)
+    centre_lon = np.degrees(np.arctan2(np.add.reduceat(np.sin(lon_rad), starts), np.add.reduceat(np.cos(lon_rad), starts)))
+    centre_lat = np.add.reduceat(lats, starts) / counts
+    rel_lons = (lons - np.repeat(centre_lon, counts) + 180) % 360 - 180
+    rel_min = np.minimum.reduceat(rel_lons, starts)
+    rel_max = np.maximum.reduceat(rel_lons, starts)
+    min_lat = np.minimum.reduceat(lats, starts)
+    max_lat = np.maximum.reduceat(lats, starts)
+
+    has_brightness = np.add.reduceat(~np.isnan(brightness), starts)
+    max_brightness = np.fmax.reduceat(brightness, starts)
+    mean_brightness = np.add.reduceat(np.nan_to_num(brightness), starts) / np.maximum(has_brightness, 1)
+    has_frp = np.add.reduceat(~np.isnan(frp), starts)
+    total_frp = np.add.reduceat(np.nan_to_num(frp), starts)
+
+    columns = zip(
+        centre_lat.tolist(), centre_lon.tolist(), counts.tolist(),
+        ((rel_min + centre_lon + 180) % 360 - 180).tolist(), min_lat.tolist(),
+        ((rel_max + centre_lon + 180) % 360 - 180).tolist(), max_lat.tolist(),
+        ((rel_max - rel_min) * np.cos(np.radians(centre_lat)) * fire_index.KM_PER_DEGREE).tolist(),
+        ((max_lat - min_lat) * fire_index.KM_PER_DEGREE).tolist(),
+        has_brightness.tolist(), max_brightness.tolist(), mean_brightness.tolist(),
+        has_frp.tolist(), total_frp.tolist(),
+        detected[starts].tolist(), detected[starts + counts - 1].tolist()
+    )
+    return [
+        {
+            "lat": round(lat, 5),
+            "lon": round(lon, 5),
+            "hotspot_count": n,
+            "bbox": [round(x0, 5), round(y0, 5), round(x1, 5), round(y1, 5)],
+            "width_km": round(width, 3),
+            "height_km": round(height, 3),
+            "max_brightness": round(b_max, 2) if n_b else None,
+            "mean_brightness": round(b_mean, 2) if n_b else None,
+            "total_frp": round(frp_sum, 2) if n_frp else None,
+            "first_detected": first,
+            "last_detected": last
+        }
+        for (lat, lon, n, x0, y0, x1, y1, width, height, n_b, b_max, b_mean, n_frp, frp_sum, first, last) in columns
+    ]
+
+
+def detected_at(fire):
+    """Sortable "YYYY-MM-DD HHMM" acquisition time (FIRMS drops leading zeros from acq_time)."""
+    acq_time = str(fire.get("acq_time", "")).strip()
+    return f"{fire['acq_date']} {acq_time.zfill(4)}" if acq_time else fire["acq_date"]
+
+
+class FireEventClusterer:
+    def __init__(self, eps_km=EVENT_EPS_KM, min_points=EVENT_MIN_HOTSPOTS):
+        self.eps_km = eps_km
+        self.min_points = min_points
+        self._fires = {}     # hotspot id -> fire
+        self._labels = {}    # hotspot id -> event id (-1 for noise)
+        self._counts = {}    # hotspot id -> hotspots within eps, itself included
+        self._members = {}   # event id -> set of hotspot ids
+        self._events = {}    # event id -> summary
+        self._next_id = 0
+        self._lock = threading.Lock()
+        self.version = 0
+
+    def events(self, min_hotspots=1):
+        with self._lock:
+            events = [e for e in self._events.values() if e["hotspot_count"] >= min_hotspots]
+        return sorted(events, key=lambda e: e["hotspot_count"], reverse=True)
+
+    def event(self, event_id):
+        with self._lock:
+            summary = self._events.get(event_id)
+            if summary is None:
+                return None
+            return dict(summary, hotspots=[self._fires[fid] for fid in self._members[event_id]])
+
+    def apply_delta(self, delta):
+        """Fire feed listener: re-cluster the neighbourhood of added, updated and removed hotspots."""
+        with self._lock:
+            removed = [self._fires[fid] for fid in delta.get("removed", []) if fid in self._fires]
+            changed = removed + delta.get("added", []) + delta.get("updated", [])
+            if not changed:
+                return
+            dirty_events = {self._labels[f["id"]] for f in changed if self._labels.get(f["id"], -1) >= 0}
+
+            for fire in removed:
+                del self._fires[fire["id"]]
+                self._labels.pop(fire["id"], None)
+                self._counts.pop(fire["id"], None)
+            for fire in delta.get("added", []) + delta.get("updated", []):
+                self._fires[fire["id"]] = fire
+            self._recluster(changed, dirty_events)
+            self.version += 1
+
+    def replace(self, fires):
+        """Cluster exactly these hotspots from scratch."""
+        with self._lock:
+            self._fires = {f["id"]: f for f in fires}
+            self._labels, self._members, self._events, self._counts = {}, {}, {}, {}
+            self._recluster([], set(), everything=True)
+            self.version += 1
+
+    def _recount(self, ids, lats, lons, points):
+        """Recompute the neighbour counts of `points` (indexes into ids) against all hotspots."""
+        i, _, _ = fire_index.grid_pairs(lats[points], lons[points], lats, lons, self.eps_km)
+        for k, count in zip(points.tolist(), np.bincount(i, minlength=len(points)).tolist()):
+            self._counts[ids[k]] = count
+
+    def _recluster(self, changed, dirty_events, everything=False):
+        ids = list(self._fires)
+        if not ids:
+            self._labels, self._members, self._events, self._counts = {}, {}, {}, {}
+            return
+        lats = np.array([self._fires[fid]["lat"] for fid in ids])
+        lons = np.array([self._fires[fid]["lon"] for fid in ids])
+
+        if everything:
+            subset = np.arange(len(ids))
+            self._recount(ids, lats, lons, subset)
+            core = np.array([self._counts[fid] >= self.min_points for fid in ids])
+        else:
+            # Only hotspots within eps of a change gain or lose neighbours
+            c_lats = np.array([f["lat"] for f in changed])
+            c_lons = np.array([f["lon"] for f in changed])
+            _, near, _ = fire_index.grid_pairs(c_lats, c_lons, lats, lons, self.eps_km)
+            near = np.unique(near)
+            self._recount(ids, lats, lons, near)
+            core = np.array([self._counts[fid] >= self.min_points for fid in ids])
+
+            affected = {ids[k] for k in near}
+            dirty_events |= {self._labels[fid] for fid in affected if self._labels.get(fid, -1) >= 0}
+            for event_id in dirty_events:
+                affected |= self._members.get(event_id, set())
+            position = {fid: k for k, fid in enumerate(ids)}
+            in_subset = np.zeros(len(ids), dtype=bool)
+            frontier = np.array(sorted(position[fid] for fid in affected if fid in position), dtype=np.int64)
+            in_subset[frontier] = True
+
+            # Grow the subset until no core link crosses its edge: a hotspot outside
+            # next to a core point inside (or a core point outside next to one
+            # inside) could join or merge with what is re-clustered, so it and its
+            # event are re-clustered too
+            while len(frontier):
+                i, j, _ = fire_index.grid_pairs(lats[frontier], lons[frontier], lats, lons, self.eps_km)
+                crossing = ~in_subset[j] & (core[frontier[i]] | core[j])
+                grown = set()
+                for k in np.unique(j[crossing]).tolist():
+                    event_id = self._labels.get(ids[k], -1)
+                    if event_id >= 0:
+                        if event_id not in dirty_events:
+                            dirty_events.add(event_id)
+                            grown |= {position[fid] for fid in self._members.get(event_id, set())}
+                    else:
+                        grown.add(k)
+                frontier = np.array(sorted(k for k in grown if not in_subset[k]), dtype=np.int64)
+                in_subset[frontier] = True
+            subset = np.flatnonzero(in_subset)
+
+        old_members = {e: self._members.pop(e) for e in list(dirty_events) if e in self._members} if not everything else {}
+        for event_id in old_members:
+            self._events.pop(event_id, None)
+        if len(subset) == 0:
+            return
+
+        labels = dbscan(lats[subset], lons[subset], self.eps_km, self.min_points, core=core[subset])
+        sub_fires = [self._fires[ids[k]] for k in subset]
+        summaries = summarize(
+            labels, lats[subset], lons[subset],
+            np.array([f.get("brightness", np.nan) for f in sub_fires], dtype=np.float64),
+            np.array([f.get("frp", np.nan) for f in sub_fires], dtype=np.float64),
+            np.array([detected_at(f) for f in sub_fires])
+        )
+        clusters = [set() for _ in summaries]
+        for fire, label in zip(sub_fires, labels.tolist()):
+            if label < 0:
+                self._labels[fire["id"]] = -1
+            else:
+                clusters[label].add(fire["id"])
+
+        # Largest clusters claim the id of the old event they overlap most
+        previous_event = {fid: e for e, members in old_members.items() for fid in members}
+        taken = set()
+        for label in sorted(range(len(clusters)), key=lambda c: len(clusters[c]), reverse=True):
+            members = clusters[label]
+            overlap = Counter(previous_event[fid] for fid in members if fid in previous_event)
+            candidates = [e for e, _ in overlap.most_common() if e not in taken]
+            if candidates:
+                event_id = candidates[0]
+            else:
+                event_id = self._next_id
+                self._next_id += 1
+            taken.add(event_id)
+            self._members[event_id] = members
+            for fid in members:
+                self._labels[fid] = event_id
+            self._events[event_id] = {"id": event_id, **summaries[label]}
+
+
+clusterer = FireEventClusterer()
@@ -0,0 +1,399 @@
+"""
+Active-fire feed: fetches NASA FIRMS hotspots, keeps the latest snapshot and
+works out what changed between refreshes.
+
+Each refresh fetches every product in FIRMS_SOURCES for each of the last
+FIRMS_DAYS days concurrently, so it takes about as long as the slowest single
+request. Every refresh goes through one long-lived httpx client that runs on its
+own event loop thread, so connections to FIRMS are reused between refreshes. Detections of the same fire by different
+sensors (within FIRMS_DEDUP_KM on the same day) are merged into one hotspot
+that lists every sensor that saw it.
+
+Every refresh produces a delta (added, updated and removed hotspots). Deltas
+are passed to in-process listeners (callables registered with add_listener), so
+consumers only process what changed instead of the whole list.
+
+Clients only get the ACTIVE_FIRES_LIMIT brightest hotspots: /active-fires serves
+that view and streaming subscribers (asyncio queues used by /active-fires/stream)
+receive a snapshot and deltas of the same view, so both paths agree.
+
+When FIRMS is unreachable and there is no earlier data, the FALLBACK_FIRES demo
+rows are served to clients (snapshot and deltas carry "fallback": true) but are
+never passed to listeners, so they are not archived, indexed or used as labels.
+"""
+import asyncio
+import csv
+import heapq
+import os
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+import httpx
+import numpy as np
+
+import fire_index
+
+FIRMS_API_URL = os.environ.get("FIRMS_API_URL", "https://firms.modaps.eosdis.nasa.gov/api/area/csv")
+# Seconds between background refreshes; 0 disables the background loop
+FIRMS_REFRESH_SECONDS = float(os.environ.get("FIRMS_REFRESH_SECONDS", "300"))
+SUBSCRIBER_QUEUE_SIZE = 16
+# FIRMS products in priority order: when sensors disagree, the first one's detection is kept
+FIRMS_SOURCES = [s.strip() for s in os.environ.get(
+    "FIRMS_SOURCES", "VIIRS_SNPP_NRT,VIIRS_NOAA20_NRT,MODIS_NRT").split(",") if s.strip()]
+# Days of detections per refresh; each day is a separate concurrent request per source
+FIRMS_DAYS = int(os.environ.get("FIRMS_DAYS", "1"))
+FIRMS_DEDUP_KM = float(os.environ.get("FIRMS_DEDUP_KM", "1.0"))
+FIRMS_TIMEOUT = float(os.environ.get("FIRMS_TIMEOUT", "30"))
+FIRMS_MAX_CONNECTIONS = int(os.environ.get("FIRMS_MAX_CONNECTIONS", "8"))
+# Hotspots served to clients (/active-fires and the stream): the brightest N
+ACTIVE_FIRES_LIMIT = int(os.environ.get("ACTIVE_FIRES_LIMIT", "200"))
+
+# Reliable Fallback Data (Real Historical High Risk Locations)
+FALLBACK_FIRES = [
+    {"lat": -23.6980, "lon": 133.8807, "brightness": 405.2, "acq_date": "2024-12-28"},
+    {"lat": -22.5609, "lon": 17.0658, "brightness": 395.5, "acq_date": "2024-12-28"},
+    {"lat": -33.4489, "lon": -70.6693, "brightness": 385.1, "acq_date": "2024-12-28"},
+    {"lat": 21.1458, "lon": 79.0882, "brightness": 375.8, "acq_date": "2024-12-28"},
+    {"lat": 34.0522, "lon": -118.2437, "brightness": 365.4, "acq_date": "2024-12-28"}
+]
+
+
+def fire_id(fire):
+    """Stable identity of a hotspot across refreshes."""
+    return f"{fire['lat']:.4f},{fire['lon']:.4f},{fire['acq_date']},{fire.get('acq_time', '')}"
+
+
+def top_fires(fires, limit=ACTIVE_FIRES_LIMIT):
+    """The `limit` brightest hotspots, brightest first (ties broken by id so the view is stable)."""
+    return heapq.nlargest(limit, fires, key=lambda f: (f.get("brightness", 0), f["id"]))
+
+
+def parse_firms_csv(text, sensor=None):
+    rows = list(csv.reader(text.splitlines(), delimiter=','))
+    if len(rows) < 2:
+        return []
+
+    header = rows[0]
+    # Indexes: latitude, longitude, brightness (bright_ti4 for VIIRS), acq_date
+    try:
+        lat_idx = header.index("latitude")
+        lon_idx = header.index("longitude")
+        bright_idx = header.index("brightness") if "brightness" in header else header.index("bright_ti4")
+        date_idx = header.index("acq_date")
+    except ValueError:
+        # Fallback for different CSV format if needed
+        return []
+    time_idx = header.index("acq_time") if "acq_time" in header else None
+    frp_idx = header.index("frp") if "frp" in header else None
+
+    fires = []
+    for row in rows[1:]:
+        try:
+            fire = {
+                "lat": float(row[lat_idx]),
+                "lon": float(row[lon_idx]),
+                "brightness": float(row[bright_idx]),
+                "acq_date": row[date_idx]
+            }
+            if time_idx is not None:
+                fire["acq_time"] = row[time_idx]
+            if frp_idx is not None and row[frp_idx]:
+                fire["frp"] = float(row[frp_idx])
+            if sensor:
+                fire["sensors"] = [sensor]
+            fire["id"] = fire_id(fire)
+            fires.append(fire)
+        except (ValueError, IndexError):
+            continue
+    return fires
+
+
+def _match_nearest(lats, lons, dates, kept_lats, kept_lons, kept_dates, tolerance_km):
+    """For each point, the index of the nearest kept point within tolerance_km on the same date, or -1."""
+    q, k, dist = fire_index.grid_pairs(lats, lons, kept_lats, kept_lons, tolerance_km)
+    same_day = dates[q] == kept_dates[k]
+    q, k, dist = q[same_day], k[same_day], dist[same_day]
+    nearest_first = np.lexsort((dist, q))
+    q, k = q[nearest_first], k[nearest_first]
+    first = np.unique(q, return_index=True)[1]
+    matches = np.full(len(lats), -1, dtype=np.int64)
+    matches[q[first]] = k[first]
+    return matches
+
+
+def merge_detections(detections_by_sensor, tolerance_km=FIRMS_DEDUP_KM):
+    """
+    Merge hotspot lists from several sensors (given in priority order). A detection
+    within tolerance_km of an already kept detection from another sensor on the
+    same day is folded into it (its sensor is added to "sensors"); all others are kept.
+    Detections from the same sensor are never merged with each other.
+    """
+    kept = []
+    kept_lats = np.empty(0)
+    kept_lons = np.empty(0)
+    kept_dates = np.empty(0, dtype=object)
+
+    for sensor, fires in detections_by_sensor:
+        if not fires:
+            continue
+        lats = np.array([f["lat"] for f in fires], dtype=np.float64)
+        lons = np.array([f["lon"] for f in fires], dtype=np.float64)
+        dates = np.array([f["acq_date"] for f in fires], dtype=object)
+
+        if kept:
+            matches = _match_nearest(lats, lons, dates, kept_lats, kept_lons, kept_dates, tolerance_km)
+        else:
+            matches = np.full(len(fires), -1, dtype=np.int64)
+
+        for i in np.flatnonzero(matches >= 0):
+            sensors = kept[matches[i]].setdefault("sensors", [])
+            if sensor not in sensors:
+                sensors.append(sensor)
+
+        new = np.flatnonzero(matches < 0)
+        kept.extend(fires[i] for i in new)
+        kept_lats = np.concatenate([kept_lats, lats[new]])
+        kept_lons = np.concatenate([kept_lons, lons[new]])
+        kept_dates = np.concatenate([kept_dates, dates[new]])
+    return kept
+
+
+def firms_requests(sources=None, days=None, api_key=None):
+    """(source, url) for every product and day fetched in one refresh."""
+    # Get Key from Env or Config
+    api_key = api_key or os.environ.get("VITE_NASA_API_KEY", "AdR8CTeX0I6jMuLgh1lop7OjHp0bs7z4AxisyuQw")
+    sources = sources or FIRMS_SOURCES
+    days = days or FIRMS_DAYS
+    if days <= 1:
+        return [(source, f"{FIRMS_API_URL}/{api_key}/{source}/world/1") for source in sources]
+    today = datetime.now(timezone.utc).date()
+    return [
+        (source, f"{FIRMS_API_URL}/{api_key}/{source}/world/1/{(today - timedelta(days=d)).isoformat()}")
+        for source in sources for d in range(days)
+    ]
+
+
+async def _fetch_csv(client, source, url):
+    response = await client.get(url)
+    if response.status_code != 200:
+        raise Exception(f"NASA API Failed for {source}: {response.status_code}")
+    return parse_firms_csv(response.text, sensor=source)
+
+
+def _new_client():
+    return httpx.AsyncClient(
+        timeout=httpx.Timeout(FIRMS_TIMEOUT, connect=10.0),
+        limits=httpx.Limits(max_connections=FIRMS_MAX_CONNECTIONS,
+                            max_keepalive_connections=FIRMS_MAX_CONNECTIONS)
+    )
+
+
+_client_lock = threading.Lock()
+_client_loop = None
+_client = None
+
+
+def _shared_client():
+    """(event loop, client) shared by every refresh; the loop thread starts on first use."""
+    global _client_loop, _client
+    with _client_lock:
+        if _client_loop is None:
+            loop = asyncio.new_event_loop()
+            threading.Thread(target=loop.run_forever, name="firms-client", daemon=True).start()
+            _client = _new_client()
+            _client_loop = loop
+        return _client_loop, _client
+
+
+async def fetch_active_fires_async(sources=None, days=None, client=None):
+    """
+    Fetch all configured FIRMS products and days concurrently and merge them.
+    Failed products are skipped; raises only if every request failed.
+    """
+    jobs = firms_requests(sources, days)
+    own_client = client is None
+    if own_client:
+        client = _new_client()
+    try:
+        print(f"Fetching fires from {len(jobs)} FIRMS requests: {', '.join(sorted({s for s, _ in jobs}))}")
+        results = await asyncio.gather(*(_fetch_csv(client, source, url) for source, url in jobs),
+                                       return_exceptions=True)
+    finally:
+        if own_client:
+            await client.aclose()
+
+    by_sensor = {}
+    errors = []
+    for (source, _), result in zip(jobs, results):
+        if isinstance(result, Exception):
+            errors.append(f"{source}: {result}")
+            continue
+        by_sensor.setdefault(source, []).extend(result)
+    if errors:
+        print(f"FIRMS requests failed: {'; '.join(errors)}")
+    if not by_sensor:
+        raise Exception(f"All FIRMS requests failed ({len(errors)})")
+    # Keep the configured priority order
+    ordered = [(source, by_sensor[source]) for source in dict.fromkeys(s for s, _ in jobs) if source in by_sensor]
+    return merge_detections(ordered)
+
+
+def fetch_active_fires():
+    """Fetch and merge the latest hotspots from all sources. Raises on total failure."""
+    loop, client = _shared_client()
+    return asyncio.run_coroutine_threadsafe(fetch_active_fires_async(client=client), loop).result()
+
+
+class FireFeed:
+    def __init__(self, fetch=fetch_active_fires, limit=ACTIVE_FIRES_LIMIT):
+        self._fetch = fetch
+        self.limit = limit
+        self._fires = {}
+        self._top = {}  # id -> fire of the client view, brightest first
+        self.fallback = False  # Serving FALLBACK_FIRES; listeners have seen nothing
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self._listeners = []
+        self._subscribers = set()
+        self.version = 0
+        self.updated_at = None
+        self._fetched_at = 0.0
+
+    # --- reading -----------------------------------------------------------
+
+    def fires(self):
+        """Every current hotspot."""
+        with self._lock:
+            return list(self._fires.values())
+
+    def top_fires(self):
+        """The client view: the `limit` brightest hotspots."""
+        with self._lock:
+            return list(self._top.values())
+
+    def snapshot(self):
+        """The client view with its version, as sent to streaming subscribers."""
+        with self._lock:
+            return {
+                "version": self.version,
+                "updated_at": self.updated_at,
+                "fallback": self.fallback,
+                "fires": list(self._top.values())
+            }
+
+    def is_stale(self, max_age=FIRMS_REFRESH_SECONDS):
+        return self._fetched_at == 0 or time.monotonic() - self._fetched_at > max(max_age, 1)
+
+    # --- refreshing --------------------------------------------------------
+
+    def refresh(self):
+        """Fetch the latest hotspots and apply them as a delta. Returns the delta."""
+        with self._refresh_lock:
+            try:
+                fires = self._fetch()
+            except Exception as e:
+                print(f"Error fetching fires: {e}")
+                with self._lock:
+                    has_data = bool(self._fires)
+                if has_data:
+                    return None  # Keep serving the last good snapshot
+                self._fetched_at = time.monotonic()
+                return self.apply([dict(f, id=fire_id(f)) for f in FALLBACK_FIRES], fallback=True)
+            self._fetched_at = time.monotonic()
+            return self.apply(fires)
+
+    def ensure_fresh(self, max_age=FIRMS_REFRESH_SECONDS):
+        if self.is_stale(max_age):
+            self.refresh()
+
+    @staticmethod
+    def _diff(current, incoming):
+        added = [f for fid, f in incoming.items() if fid not in current]
+        updated = [f for fid, f in incoming.items() if fid in current and current[fid] != f]
+        removed = [fid for fid in current if fid not in incoming]
+        return added, updated, removed
+
+    def apply(self, fires, fallback=False):
+        """
+        Replace the snapshot with `fires`, pass the full delta to listeners and
+        publish the change of the client view to subscribers. Returns the full delta.
+        A `fallback` snapshot (demo rows) is only published, never passed to listeners.
+        """
+        incoming = {f["id"]: f for f in fires}
+        top = {f["id"]: f for f in top_fires(incoming.values(), self.limit)}
+        with self._lock:
+            if fallback == self.fallback and not any(self._diff(self._fires, incoming)):
+                return None
+            # Listeners never saw the fallback rows, so diff real data against nothing
+            added, updated, removed = self._diff({} if self.fallback else self._fires, incoming)
+            top_added, top_updated, top_removed = self._diff(self._top, top)
+            self._fires = incoming
+            self._top = top
+            self.fallback = fallback
+            self.version += 1
+            self.updated_at = datetime.now().isoformat()
+            delta = {
+                "version": self.version,
+                "updated_at": self.updated_at,
+                "fallback": fallback,
+                "added": added,
+                "updated": updated,
+                "removed": removed
+            }
+
+        if not fallback:
+            for listener in list(self._listeners):
+                try:
+                    listener(delta)
+                except Exception as e:
+                    print(f"Fire feed listener {getattr(listener, '__name__', listener)} failed: {e}")
+        if top_added or top_updated or top_removed:
+            self._publish({
+                "version": delta["version"],
+                "updated_at": delta["updated_at"],
+                "fallback": fallback,
+                "added": top_added,
+                "updated": top_updated,
+                "removed": top_removed
+            })
+        return delta
+
+    def add_listener(self, callback):
+        """Call callback(delta) after every refresh that changed the snapshot."""
+        self._listeners.append(callback)
+
+    # --- streaming ---------------------------------------------------------
+
+    def subscribe(self):
+        queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        self._subscribers.add((asyncio.get_running_loop(), queue))
+        return queue
+
+    def unsubscribe(self, queue):
+        self._subscribers = {(loop, q) for loop, q in self._subscribers if q is not queue}
+
+    def _publish(self, delta):
+        for loop, queue in list(self._subscribers):
+            try:
+                loop.call_soon_threadsafe(self._enqueue, queue, delta)
+            except RuntimeError:
+                self.unsubscribe(queue)  # Event loop already closed
+
+    @staticmethod
+    def _enqueue(queue, delta):
+        if queue.full():
+            # Slow consumer: drop its backlog and ask it to resync from a snapshot
+            while not queue.empty():
+                queue.get_nowait()
+            queue.put_nowait({"resync": True})
+        else:
+            queue.put_nowait(delta)
+
+    async def run_refresh_loop(self, interval=FIRMS_REFRESH_SECONDS):
+        while True:
+            await asyncio.to_thread(self.refresh)
+            await asyncio.sleep(interval)
+
+
+feed = FireFeed()
@@ -0,0 +1,164 @@
+"""
+Spatial index over the latest active-fire snapshot.
+
+Hotspots are stored as unit-sphere xyz vectors in a KD-tree, where chord distance
+maps monotonically to great-circle distance. The point set is updated from
+each fire feed delta (added/updated/removed ids); the tree itself is rebuilt
+lazily on the next query after a change, which takes milliseconds even for a
+full day of global detections.
+"""
+import threading
+
+import numpy as np
+from scipy.spatial import cKDTree
+
+EARTH_RADIUS_KM = 6371.0
+KM_PER_DEGREE = 111.32
+# Default radius for "fires within R km" features
+PROXIMITY_RADIUS_KM = 50.0
+# Nearest-fire distance reported (and fed to models) when no fire is closer
+PROXIMITY_MAX_KM = 500.0
+
+
+def to_unit_xyz(lats, lons):
+    lat = np.radians(np.asarray(lats, dtype=np.float64))
+    lon = np.radians(np.asarray(lons, dtype=np.float64))
+    cos_lat = np.cos(lat)
+    return np.column_stack([cos_lat * np.cos(lon), cos_lat * np.sin(lon), np.sin(lat)])
+
+
+def chord_to_km(chord):
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.clip(chord / 2, 0, 1))
+
+
+def km_to_chord(km):
+    return 2 * np.sin(np.minimum(km, np.pi * EARTH_RADIUS_KM) / (2 * EARTH_RADIUS_KM))
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    """Vectorized great-circle distance in km."""
+    lat1, lon1, lat2, lon2 = (np.radians(np.asarray(v, dtype=np.float64)) for v in (lat1, lon1, lat2, lon2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0, 1)))
+
+
+def grid_keys(lats, lons, cell_km, row_offset=0):
+    """
+    Spatial hash of points on a grid of ~cell_km square cells: rows of latitude,
+    with longitude scaled by the cosine of each row's centre latitude.
+    """
+    rows = np.floor(np.asarray(lats) * KM_PER_DEGREE / cell_km).astype(np.int64) + row_offset
+    row_lat = np.clip((rows + 0.5) * cell_km / KM_PER_DEGREE, -89.9, 89.9)
+    cols = np.floor(np.asarray(lons) * np.cos(np.radians(row_lat)) * KM_PER_DEGREE / cell_km).astype(np.int64)
+    return (rows << 32) + cols
+
+
+def grid_pairs(lats, lons, ref_lats, ref_lons, radius_km):
+    """
+    All pairs (i, j, distance_km) with point i within radius_km of reference point j,
+    found by hashing the references on a radius_km grid and checking the 3x3
+    neighbouring cells of each point.
+    """
+    lats, lons = np.asarray(lats, dtype=np.float64), np.asarray(lons, dtype=np.float64)
+    ref_lats, ref_lons = np.asarray(ref_lats, dtype=np.float64), np.asarray(ref_lons, dtype=np.float64)
+    ref_keys = grid_keys(ref_lats, ref_lons, radius_km)
+    order = np.argsort(ref_keys, kind='stable')
+    sorted_keys = ref_keys[order]
+
+    queries, candidates = [], []
+    for dy in (-1, 0, 1):
+        row_keys = grid_keys(lats, lons, radius_km, dy)
+        for dx in (-1, 0, 1):
+            keys = row_keys + dx
+            lo = np.searchsorted(sorted_keys, keys, 'left')
+            counts = np.searchsorted(sorted_keys, keys, 'right') - lo
+            total = counts.sum()
+            if total == 0:
+                continue
+            starts = np.repeat(lo, counts)
+            offsets = np.arange(total) - np.repeat(np.cumsum(counts) - counts, counts)
+            queries.append(np.repeat(np.arange(len(lats)), counts))
+            candidates.append(order[starts + offsets])
+
+    if not queries:
+        empty = np.empty(0, dtype=np.int64)
+        return empty, empty, np.empty(0)
+    i = np.concatenate(queries)
+    j = np.concatenate(candidates)
+    dist = haversine_km(lats[i], lons[i], ref_lats[j], ref_lons[j])
+    within = dist <= radius_km
+    return i[within], j[within], dist[within]
+
+
+class FireIndex:
+    def __init__(self):
+        self._points = {}  # fire id -> (lat, lon)
+        self._lock = threading.Lock()
+        self._tree = None
+        self._ids = []
+        self._dirty = False
+        self.version = 0
+
+    def __len__(self):
+        return len(self._points)
+
+    def apply_delta(self, delta):
+        """Fire feed listener: update the point set from a refresh delta."""
+        with self._lock:
+            for fid in delta.get("removed", []):
+                self._points.pop(fid, None)
+            for fire in delta.get("added", []) + delta.get("updated", []):
+                self._points[fire["id"]] = (fire["lat"], fire["lon"])
+            self._dirty = True
+            self.version = delta.get("version", self.version + 1)
+
+    def replace(self, fires):
+        """Index exactly these fires (dicts with lat/lon and optionally id)."""
+        with self._lock:
+            self._points = {f.get("id", i): (f["lat"], f["lon"]) for i, f in enumerate(fires)}
+            self._dirty = True
+            self.version += 1
+
+    def _current_tree(self):
+        with self._lock:
+            if self._dirty:
+                self._ids = list(self._points)
+                if self._ids:
+                    coords = np.array([self._points[i] for i in self._ids])
+                    self._tree = cKDTree(to_unit_xyz(coords[:, 0], coords[:, 1]))
+                else:
+                    self._tree = None
+                self._dirty = False
+            return self._tree, self._ids
+
+    def nearest(self, lats, lons):
+        """(distance_km, fire_id) of the nearest fire for each point; inf/None if no fires."""
+        lats = np.atleast_1d(lats)
+        tree, ids = self._current_tree()
+        if tree is None:
+            return np.full(len(lats), np.inf), [None] * len(lats)
+        chord, idx = tree.query(to_unit_xyz(lats, lons))
+        return chord_to_km(chord), [ids[i] for i in idx]
+
+    def count_within(self, lats, lons, radius_km=PROXIMITY_RADIUS_KM):
+        lats = np.atleast_1d(lats)
+        tree, _ = self._current_tree()
+        if tree is None:
+            return np.zeros(len(lats), dtype=np.int64)
+        return np.asarray(tree.query_ball_point(to_unit_xyz(lats, lons), km_to_chord(radius_km), return_length=True))
+
+    def any_within(self, lats, lons, radius_km):
+        """Boolean per point: is any fire within radius_km."""
+        distances, _ = self.nearest(lats, lons)
+        return distances <= radius_km
+
+    def proximity_features(self, lats, lons, radius_km=PROXIMITY_RADIUS_KM):
+        """Model-ready proximity features: capped nearest distance and count within radius."""
+        distances, _ = self.nearest(lats, lons)
+        return {
+            "nearest_fire_km": np.minimum(distances, PROXIMITY_MAX_KM),
+            "fires_within_radius": self.count_within(lats, lons, radius_km)
+        }
+
+
+index = FireIndex()
@@ -1,100 +1,300 @@
 import os
 import io
+import time
+import random
+import asyncio
 from PIL import Image
 import base64
-import requests
-import json
+import httpx
+from risk_classifier import classify_caption
 
 # Gemini API configuration
 GEMINI_API_KEY = os.getenv('GEMINI_API_KEY', '')
 GEMINI_API_KEY_BACKUP = os.getenv('GEMINI_API_KEY_BACKUP', '')
+# Optional comma-separated list of further keys to rotate through
+GEMINI_API_KEYS_EXTRA = [k.strip() for k in os.getenv('GEMINI_API_KEYS', '').split(',') if k.strip()]
+GEMINI_API_URL = os.getenv(
+    'GEMINI_API_URL',
+    "https://generativelanguage.googleapis.com/v1beta/models/gemini-2.5-flash:generateContent"
+)
 
-RISK_KEYWORDS = ["fire", "smoke", "flame", "burning", "forest fire", "wildfire", "ash", "ember"]
+# Client tuning
+GEMINI_TIMEOUT = float(os.getenv('GEMINI_TIMEOUT', '30'))
+GEMINI_MAX_CONCURRENCY = int(os.getenv('GEMINI_MAX_CONCURRENCY', '8'))
+GEMINI_MAX_RETRIES = int(os.getenv('GEMINI_MAX_RETRIES', '3'))
+GEMINI_RATE_PER_MINUTE = float(os.getenv('GEMINI_RATE_PER_MINUTE', '60'))  # Per key
+GEMINI_BURST = int(os.getenv('GEMINI_BURST', '5'))
+GEMINI_BREAKER_FAILURES = int(os.getenv('GEMINI_BREAKER_FAILURES', '3'))
+GEMINI_BREAKER_COOLDOWN = float(os.getenv('GEMINI_BREAKER_COOLDOWN', '30'))
+# Longest a single analysis may spend on waits and retries before giving up
+GEMINI_MAX_WAIT = float(os.getenv('GEMINI_MAX_WAIT', '60'))
+# Longest to sleep for a key to free up; if every key is out for longer (breakers
+# open), fail fast instead of queueing behind the cooldown
+GEMINI_KEY_WAIT = float(os.getenv('GEMINI_KEY_WAIT', '2'))
 
-def analyze_image_with_key(image_bytes, api_key):
-    """Helper function to analyze image with a specific API key"""
-    # Convert image bytes to base64
+PROMPT = "Analyze this image and describe what you see. Focus on identifying any signs of fire, smoke, flames, burning vegetation, or wildfire-related hazards. Provide a detailed but concise description."
+
+
+class GeminiError(Exception):
+    pass
+
+
+class GeminiQuotaError(GeminiError):
+    pass
+
+
+class TokenBucket:
+    """Per-key request rate limiter."""
+
+    def __init__(self, rate_per_second, capacity):
+        self.rate = rate_per_second
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+
+    def take(self, now):
+        """Take a token and return 0, or return the seconds until one is available."""
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+
+class CircuitBreaker:
+    """
+    Opens after `failure_threshold` consecutive failures (or immediately on a quota
+    signal). Once the cooldown has passed it is half-open: exactly one trial request
+    is let through, which closes it on success or reopens it on failure.
+    """
+
+    def __init__(self, failure_threshold, cooldown):
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.open_until = 0.0
+        self.trial_in_flight = False
+
+    def remaining(self, now):
+        """Seconds until a request may be sent (inf while a half-open trial is running)."""
+        if self.trial_in_flight:
+            return float("inf")
+        return max(0.0, self.open_until - now)
+
+    def begin(self):
+        """Called when a request is sent; in the half-open state it becomes the trial."""
+        if self.failures >= self.failure_threshold:
+            self.trial_in_flight = True
+
+    def end_trial(self):
+        """The trial ended without saying anything about the key (e.g. a bad request)."""
+        self.trial_in_flight = False
+
+    def record_success(self):
+        self.failures = 0
+        self.open_until = 0.0
+        self.trial_in_flight = False
+
+    def record_failure(self, now):
+        self.failures += 1
+        self.trial_in_flight = False
+        if self.failures >= self.failure_threshold:
+            self.open_until = now + self.cooldown
+
+    def trip(self, now, cooldown=None):
+        self.failures = max(self.failures, self.failure_threshold)
+        self.trial_in_flight = False
+        self.open_until = now + (cooldown if cooldown is not None else self.cooldown)
+
+
+class ApiKeyState:
+    def __init__(self, index, key):
+        self.index = index
+        self.key = key
+        self.bucket = TokenBucket(GEMINI_RATE_PER_MINUTE / 60.0, GEMINI_BURST)
+        self.breaker = CircuitBreaker(GEMINI_BREAKER_FAILURES, GEMINI_BREAKER_COOLDOWN)
+
+
+class GeminiVisionClient:
+    """
+    Async Gemini client sharing one keep-alive connection pool. Requests are spread
+    over the configured API keys: the first key with a closed breaker and a free
+    token is used, keys that report quota exhaustion are tripped for their
+    Retry-After period, and transient errors are retried with jittered backoff.
+    The concurrency limit only covers requests in flight; waiting for a key or a
+    backoff happens outside it.
+    """
+
+    def __init__(self, api_keys, api_url=GEMINI_API_URL, max_concurrency=GEMINI_MAX_CONCURRENCY,
+                 timeout=GEMINI_TIMEOUT, max_retries=GEMINI_MAX_RETRIES):
+        self.keys = [ApiKeyState(i, k) for i, k in enumerate(api_keys)]
+        self.api_url = api_url
+        self.max_retries = max_retries
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._http = httpx.AsyncClient(
+            timeout=httpx.Timeout(timeout, connect=5.0),
+            limits=httpx.Limits(max_connections=max_concurrency, max_keepalive_connections=max_concurrency),
+            headers={"Content-Type": "application/json"},
+        )
+
+    async def aclose(self):
+        await self._http.aclose()
+
+    async def _acquire_key(self, deadline):
+        while True:
+            now = time.monotonic()
+            wait = float("inf")
+            for state in self.keys:
+                key_wait = state.breaker.remaining(now)
+                if key_wait == 0:
+                    key_wait = state.bucket.take(now)
+                    if key_wait == 0:
+                        state.breaker.begin()
+                        return state
+                wait = min(wait, key_wait)
+            if now + wait > min(deadline, now + GEMINI_KEY_WAIT):
+                raise GeminiQuotaError("All Gemini API keys are rate limited or unavailable")
+            await asyncio.sleep(wait + random.uniform(0, 0.05))
+
+    async def _sleep_before_retry(self, attempt, deadline, error):
+        delay = self._backoff(attempt)
+        if time.monotonic() + delay > deadline:
+            raise error
+        await asyncio.sleep(delay)
+
+    @staticmethod
+    def _backoff(attempt):
+        # Full jitter exponential backoff, capped at 8 s
+        return random.uniform(0, min(8.0, 0.5 * (2 ** attempt)))
+
+    @staticmethod
+    def _is_quota_error(response):
+        if response.status_code == 429:
+            return True
+        if response.status_code == 403 and 'quota' in response.text.lower():
+            return True
+        return 'RESOURCE_EXHAUSTED' in response.text
+
+    @staticmethod
+    def _retry_after(response):
+        try:
+            return float(response.headers.get("Retry-After"))
+        except (TypeError, ValueError):
+            return None
+
+    async def generate_caption(self, img_base64, max_wait=GEMINI_MAX_WAIT):
+        """Return (caption, index of the API key that answered)."""
+        if not self.keys:
+            raise GeminiError("GEMINI_API_KEY environment variable not set")
+
+        payload = {
+            "contents": [{
+                "parts": [
+                    {"text": PROMPT},
+                    {"inline_data": {"mime_type": "image/jpeg", "data": img_base64}}
+                ]
+            }]
+        }
+        deadline = time.monotonic() + max_wait
+        last_error = None
+
+        attempt = 0
+        while attempt <= self.max_retries:
+            state = await self._acquire_key(deadline)
+            try:
+                async with self._semaphore:
+                    response = await self._http.post(self.api_url, params={"key": state.key}, json=payload)
+            except httpx.TransportError as e:
+                state.breaker.record_failure(time.monotonic())
+                last_error = GeminiError(f"Gemini API connection error: {e}")
+                attempt += 1
+                await self._sleep_before_retry(attempt, deadline, last_error)
+                continue
+            except BaseException:
+                state.breaker.end_trial()  # Cancelled or unexpected error
+                raise
+
+            if response.status_code == 200:
+                state.breaker.record_success()
+                result = response.json()
+                caption = result.get('candidates', [{}])[0].get('content', {}).get('parts', [{}])[0].get('text', 'Unable to analyze image')
+                return caption, state.index
+
+            if self._is_quota_error(response):
+                # Rotate to another key straight away; does not count as a retry
+                print(f"Gemini API key #{state.index} quota exceeded. Rotating key...")
+                state.breaker.trip(time.monotonic(), self._retry_after(response))
+                last_error = GeminiQuotaError(f"Gemini API quota exceeded: {response.status_code}")
+                continue
+
+            last_error = GeminiError(f"Gemini API error: {response.status_code} - {response.text}")
+            if response.status_code < 500:
+                state.breaker.end_trial()
+                raise last_error
+            state.breaker.record_failure(time.monotonic())
+            attempt += 1
+            await self._sleep_before_retry(attempt, deadline, last_error)
+
+        raise last_error
+
+
+def _configured_keys():
+    keys = [k for k in [GEMINI_API_KEY, GEMINI_API_KEY_BACKUP] if k]
+    return keys + [k for k in GEMINI_API_KEYS_EXTRA if k not in keys]
+
+
+_client = None
+_client_loop = None
+
+
+def get_client():
+    """Return the shared client for the running event loop."""
+    global _client, _client_loop
+    loop = asyncio.get_running_loop()
+    if _client is None or _client_loop is not loop:
+        _client = GeminiVisionClient(_configured_keys())
+        _client_loop = loop
+    return _client
+
+
+def encode_image(image_bytes):
+    """Re-encode any supported upload as base64 JPEG."""
     image = Image.open(io.BytesIO(image_bytes)).convert('RGB')
-    
-    # Save to bytes buffer
     buffered = io.BytesIO()
     image.save(buffered, format="JPEG")
-    img_base64 = base64.b64encode(buffered.getvalue()).decode('utf-8')
-    
-    # Prepare Gemini API request
-    url = f"https://generativelanguage.googleapis.com/v1beta/models/gemini-2.5-flash:generateContent?key={api_key}"
-    
-    headers = {
-        "Content-Type": "application/json"
-    }
-    
-    payload = {
-        "contents": [{
-            "parts": [
-                {
-                    "text": "Analyze this image and describe what you see. Focus on identifying any signs of fire, smoke, flames, burning vegetation, or wildfire-related hazards. Provide a detailed but concise description."
-                },
-                {
-                    "inline_data": {
-                        "mime_type": "image/jpeg",
-                        "data": img_base64
-                    }
-                }
-            ]
-        }]
-    }
-    
-    # Call Gemini API
-    response = requests.post(url, headers=headers, json=payload, timeout=30)
-    
-    if response.status_code != 200:
-        raise Exception(f"Gemini API error: {response.status_code} - {response.text}")
-    
-    result = response.json()
-    
-    # Extract caption from response
-    caption = result.get('candidates', [{}])[0].get('content', {}).get('parts', [{}])[0].get('text', 'Unable to analyze image')
-    
-    return caption
+    return base64.b64encode(buffered.getvalue()).decode('utf-8')
 
-def analyze_image_bytes(image_bytes):
+
+async def analyze_image_bytes_async(image_bytes, client=None):
     """
-    Analyze image using Gemini Vision API with automatic fallback to backup key
+    Analyze image using Gemini Vision API, rotating across the configured keys on quota errors
     """
-    if not GEMINI_API_KEY:
-        raise Exception("GEMINI_API_KEY environment variable not set")
-    
+    client = client or get_client()
+    img_base64 = await asyncio.to_thread(encode_image, image_bytes)
+
     try:
-        # Try with primary key
-        caption = analyze_image_with_key(image_bytes, GEMINI_API_KEY)
-        
+        caption, key_index = await client.generate_caption(img_base64)
+    except GeminiQuotaError as e:
+        print(f"All Gemini API keys failed: {e}")
+        raise GeminiQuotaError("All Gemini API keys have exceeded quota or failed")
     except Exception as e:
-        error_str = str(e)
-        # Check if it's a quota error and we have a backup key
-        if ('429' in error_str or 'quota' in error_str.lower() or 'limit' in error_str.lower()) and GEMINI_API_KEY_BACKUP:
-            print("Primary API key quota exceeded. Switching to backup key...")
-            try:
-                caption = analyze_image_with_key(image_bytes, GEMINI_API_KEY_BACKUP)
-                caption = "🔄 " + caption  # Indicate backup key was used
-            except Exception as backup_error:
-                print(f"Backup API key also failed: {backup_error}")
-                raise Exception("Both API keys have exceeded quota or failed")
-        else:
-            print(f"Error in Gemini Vision analysis: {e}")
-            raise e
-    
+        print(f"Error in Gemini Vision analysis: {e}")
+        raise
+
+    if key_index > 0:
+        caption = "🔄 " + caption  # Indicate backup key was used
+
     # Risk Analysis
-    risk_level = "Low"
-    detected_keywords = []
-    caption_lower = caption.lower()
-    
-    for keyword in RISK_KEYWORDS:
-        if keyword in caption_lower:
-            risk_level = "High"
-            detected_keywords.append(keyword)
-    
-    return {
-        "caption": caption,
-        "risk_level": risk_level,
-        "detected_keywords": detected_keywords
-    }
+    return {"caption": caption, **classify_caption(caption)}
+
+
+def analyze_image_bytes(image_bytes):
+    """Blocking wrapper around analyze_image_bytes_async for scripts."""
+    async def run():
+        client = GeminiVisionClient(_configured_keys())
+        try:
+            return await analyze_image_bytes_async(image_bytes, client)
+        finally:
+            await client.aclose()
+    return asyncio.run(run())
@@ -0,0 +1,86 @@
+"""
+Vectorized geohash encoding and bounding-box cell cover, used to partition
+fire data spatially.
+"""
+import numpy as np
+
+BASE32 = np.array(list("0123456789bcdefghjkmnpqrstuvwxyz"))
+
+
+def _bit_counts(precision):
+    bits = 5 * precision
+    return (bits + 1) // 2, bits // 2  # longitude bits, latitude bits
+
+
+def _cell_indices(lats, lons, precision):
+    lon_bits, lat_bits = _bit_counts(precision)
+    lats = np.clip(np.asarray(lats, dtype=np.float64), -90, 90)
+    lons = np.asarray(lons, dtype=np.float64)
+    lons = np.where(lons == 180, lons, (lons + 180) % 360 - 180)
+    x = np.minimum(((lons + 180) / 360 * (1 << lon_bits)).astype(np.int64), (1 << lon_bits) - 1)
+    y = np.minimum(((lats + 90) / 180 * (1 << lat_bits)).astype(np.int64), (1 << lat_bits) - 1)
+    return x, y
+
+
+def _to_strings(x, y, precision):
+    lon_bits, lat_bits = _bit_counts(precision)
+    code = np.zeros(np.shape(x), dtype=np.int64)
+    # Interleave bits starting with longitude, most significant first
+    for i in range(5 * precision):
+        if i % 2 == 0:
+            bit = (x >> (lon_bits - 1 - i // 2)) & 1
+        else:
+            bit = (y >> (lat_bits - 1 - i // 2)) & 1
+        code = (code << 1) | bit
+    result = BASE32[(code >> (5 * (precision - 1))) & 31]
+    for c in range(1, precision):
+        result = np.char.add(result, BASE32[(code >> (5 * (precision - 1 - c))) & 31])
+    return result
+
+
+def encode(lats, lons, precision=2):
+    """Geohash strings (numpy array) for arrays of points."""
+    x, y = _cell_indices(np.atleast_1d(lats), np.atleast_1d(lons), precision)
+    return _to_strings(x, y, precision)
+
+
+def decode(codes):
+    """(lats, lons) of the centres of geohash cells, which must share one precision."""
+    codes = np.asarray(codes, dtype=str)
+    if codes.size == 0:
+        return np.empty(0), np.empty(0)
+    precision = len(codes.flat[0])
+    lon_bits, lat_bits = _bit_counts(precision)
+    chars = codes.astype(f"U{precision}").view("U1").reshape(-1, precision)
+    values = np.searchsorted(BASE32, chars)  # BASE32 is in sorted order
+    x = np.zeros(len(chars), dtype=np.int64)
+    y = np.zeros(len(chars), dtype=np.int64)
+    for i in range(5 * precision):
+        bit = (values[:, i // 5] >> (4 - i % 5)) & 1
+        if i % 2 == 0:
+            x = (x << 1) | bit
+        else:
+            y = (y << 1) | bit
+    lat_size, lon_size = cell_size(precision)
+    return -90 + (y + 0.5) * lat_size, -180 + (x + 0.5) * lon_size
+
+
+def cell_size(precision):
+    """(lat_degrees, lon_degrees) covered by one cell."""
+    lon_bits, lat_bits = _bit_counts(precision)
+    return 180 / (1 << lat_bits), 360 / (1 << lon_bits)
+
+
+def cover(min_lat, min_lon, max_lat, max_lon, precision=2):
+    """
+    Geohashes of every cell intersecting the box. min_lon > max_lon means the box
+    crosses the antimeridian.
+    """
+    lon_bits, _ = _bit_counts(precision)
+    (x0, x1), (y0, y1) = _cell_indices([min_lat, max_lat], [min_lon, max_lon], precision)
+    if min_lon <= max_lon:
+        xs = np.arange(x0, x1 + 1)
+    else:
+        xs = np.concatenate([np.arange(x0, 1 << lon_bits), np.arange(0, x1 + 1)])
+    gx, gy = np.meshgrid(xs, np.arange(y0, y1 + 1))
+    return sorted(set(_to_strings(gx.ravel(), gy.ravel(), precision).tolist()))
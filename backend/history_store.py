@@ -0,0 +1,559 @@
+"""
+Prediction history with bounded raw retention and roll-up aggregates.
+
+Raw /predict results are appended to the history file as JSON lines, one
+object per line. A legacy JSON-array file is still read, and is rewritten as
+lines on the next compaction. Compaction writes its watermark as the first
+line of the file it trims, so the watermark always belongs to that file.
+
+A background task compacts entries older than HISTORY_RETENTION_HOURS. They
+become roll-ups per geohash cell (HISTORY_ROLLUP_PRECISION) per hour and per
+day, each holding:
+
+- a prediction count
+- the summed probability
+- a risk-level histogram
+
+Roll-ups are stored as columnar .npz partitions under HISTORY_ROLLUP_DIR, one
+file per day for hourly roll-ups and one per month for daily ones. Compaction
+works on a snapshot of the raw file and holds the append lock only while it
+swaps in the trimmed file, so /predict never waits for it. Every trimmed entry
+is rolled up; state.json in the roll-up dir records the batch being moved for
+each history file, so a run interrupted before the trim does not roll the
+same entries up twice.
+
+Hours still in the raw window are aggregated in memory as predictions arrive,
+so roll-up queries cover the whole history without reading the raw file.
+Timestamps are the server's local time, as written by /predict.
+"""
+import asyncio
+import json
+import os
+import threading
+from datetime import datetime, timedelta
+
+import numpy as np
+
+import geohash
+
+HISTORY_RETENTION_HOURS = int(os.environ.get("HISTORY_RETENTION_HOURS", str(7 * 24)))
+HISTORY_COMPACT_SECONDS = int(os.environ.get("HISTORY_COMPACT_SECONDS", "3600"))
+ROLLUP_DIR = os.environ.get("HISTORY_ROLLUP_DIR", os.path.join(os.path.dirname(__file__), 'history_rollups'))
+ROLLUP_PRECISION = int(os.environ.get("HISTORY_ROLLUP_PRECISION", "4"))
+
+RISK_LEVELS = ["Low", "Medium", "High", "Extreme"]
+# Resolution -> (bucket dtype, partition dtype): hourly roll-ups are partitioned
+# by day, daily roll-ups by month
+RESOLUTIONS = {
+    "hour": ("datetime64[h]", "datetime64[D]"),
+    "day": ("datetime64[D]", "datetime64[M]")
+}
+COLUMNS = ("cell", "bucket", "count", "prob_sum", "risk")
+WATERMARK_KEY = "compacted_until"
+
+
+def read_entries(path):
+    """Logged predictions from a history file, in JSON-lines or legacy JSON-array form."""
+    try:
+        with open(path) as f:
+            text = f.read()
+    except OSError:
+        return []
+    return _split_watermark(_parse(text))[1]
+
+
+def _parse(text):
+    entries = []
+    stripped = text.lstrip()
+    if stripped.startswith("["):
+        # Legacy array, possibly followed by lines appended since
+        try:
+            legacy, end = json.JSONDecoder().raw_decode(stripped)
+            entries.extend(legacy)
+            stripped = stripped[end:]
+        except json.JSONDecodeError:
+            stripped = ""
+    for line in stripped.splitlines():
+        line = line.strip()
+        if line:
+            try:
+                entries.append(json.loads(line))
+            except json.JSONDecodeError:
+                continue # Skip a torn or corrupt line
+    return entries
+
+
+def _split_watermark(entries):
+    """(watermark hour or None, predictions) for a parsed history file."""
+    if entries and isinstance(entries[0], dict) and set(entries[0]) == {WATERMARK_KEY}:
+        try:
+            return np.datetime64(entries[0][WATERMARK_KEY], 'h'), entries[1:]
+        except ValueError:
+            return None, entries[1:]
+    return None, entries
+
+
+def _timestamp(entry):
+    try:
+        return datetime.fromisoformat(entry["timestamp"])
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+def _risk_index(entry):
+    risk = entry.get("risk")
+    return RISK_LEVELS.index(risk) if risk in RISK_LEVELS else 0
+
+
+def _empty(resolution):
+    return {
+        "cell": np.empty(0, dtype=f"U{ROLLUP_PRECISION}"),
+        "bucket": np.empty(0, dtype=RESOLUTIONS[resolution][0]),
+        "count": np.empty(0, dtype=np.int64),
+        "prob_sum": np.empty(0, dtype=np.float64),
+        "risk": np.empty((0, len(RISK_LEVELS)), dtype=np.int64)
+    }
+
+
+def _concat(tables, resolution):
+    tables = [t for t in tables if len(t["count"])]
+    if not tables:
+        return _empty(resolution)
+    return {name: np.concatenate([t[name] for t in tables]) for name in COLUMNS}
+
+
+def _select(table, mask):
+    return {name: table[name][mask] for name in COLUMNS}
+
+
+def _group(table, keys):
+    """Sum count, prob_sum and risk over rows sharing the same values of `keys`."""
+    if not len(table["count"]):
+        return {name: table[name] for name in COLUMNS}
+    order = np.lexsort([table[k] for k in reversed(keys)])
+    sorted_keys = [table[k][order] for k in keys]
+    change = np.zeros(len(order), dtype=bool)
+    change[0] = True
+    for column in sorted_keys:
+        change[1:] |= column[1:] != column[:-1]
+    starts = np.flatnonzero(change)
+    grouped = {k: column[starts] for k, column in zip(keys, sorted_keys)}
+    for name in ("count", "prob_sum", "risk"):
+        grouped[name] = np.add.reduceat(table[name][order], starts, axis=0)
+    return grouped
+
+
+def _rollup_entries(entries, resolution, precision=ROLLUP_PRECISION):
+    """Roll logged predictions up per (cell, bucket)."""
+    if not entries:
+        return _empty(resolution)
+    lats = np.array([e["lat"] for e in entries], dtype=np.float64)
+    lons = np.array([e["lon"] for e in entries], dtype=np.float64)
+    risk = np.zeros((len(entries), len(RISK_LEVELS)), dtype=np.int64)
+    risk[np.arange(len(entries)), [_risk_index(e) for e in entries]] = 1
+    table = {
+        "cell": geohash.encode(lats, lons, precision),
+        "bucket": np.array([_timestamp(e) for e in entries], dtype=RESOLUTIONS[resolution][0]),
+        "count": np.ones(len(entries), dtype=np.int64),
+        "prob_sum": np.array([e["prob"] for e in entries], dtype=np.float64),
+        "risk": risk
+    }
+    return _group(table, ["cell", "bucket"])
+
+
+def _points(entries):
+    """Columns lat, lon, prob, risk (one-hot per level) and timestamp of logged predictions."""
+    entries = [e for e in entries if isinstance(e, dict) and "lat" in e and "lon" in e and "prob" in e]
+    stamps = [_timestamp(e) for e in entries]
+    entries = [e for e, ts in zip(entries, stamps) if ts is not None]
+    risk = np.zeros((len(entries), len(RISK_LEVELS)), dtype=np.int64)
+    risk[np.arange(len(entries)), [_risk_index(e) for e in entries]] = 1
+    return {
+        "lat": np.array([e["lat"] for e in entries], dtype=np.float64),
+        "lon": np.array([e["lon"] for e in entries], dtype=np.float64),
+        "prob": np.array([e["prob"] for e in entries], dtype=np.float64),
+        "risk": risk,
+        "timestamp": np.array([ts for ts in stamps if ts is not None], dtype="datetime64[s]")
+    }
+
+
+class HistoryStore:
+    def __init__(self, path, rollup_dir=ROLLUP_DIR, retention_hours=HISTORY_RETENTION_HOURS,
+                 precision=ROLLUP_PRECISION):
+        self.path = path
+        self.rollup_dir = rollup_dir
+        self.retention_hours = retention_hours
+        self.precision = precision
+        self._lock = threading.Lock()          # raw file appends and the live aggregate
+        self._compact_lock = threading.Lock()  # one compaction at a time
+        self._rollup_lock = threading.Lock()   # roll-up files and live aggregate change together
+        self._live = {}                        # (cell, hour) -> [count, prob_sum, *risk counts]
+        self._live_version = 0
+        self._live_tables = {}                 # resolution -> (live version, table)
+        self._partitions = {}                  # path -> (mtime_ns, table)
+        self._raw = None                       # (inode, size, point columns) parsed from the raw file
+        self.compacted_until = None
+        self.last_compaction = None
+
+    # Raw history
+
+    def open(self):
+        """Create the history file if needed and aggregate its entries in memory. Returns them."""
+        if not os.path.exists(self.path):
+            open(self.path, 'a').close()
+        with open(self.path, 'rb') as f:
+            text = f.read().decode('utf-8', errors='replace')
+        self.compacted_until, entries, rolled_up = self._pending_split(text)
+        entries = [e for e in entries if "lat" in e and "lon" in e and "prob" in e]
+        live = [e for e, done in zip(entries, rolled_up) if not done]
+        cells = geohash.encode([e["lat"] for e in live], [e["lon"] for e in live], self.precision).tolist()
+        with self._lock:
+            self._live = {}
+            for entry, cell in zip(live, cells):
+                self._add_live(entry, cell)
+            self._live_version += 1
+        return entries
+
+    def entries(self):
+        return read_entries(self.path)
+
+    def append(self, entry):
+        """Log one prediction: a single appended line plus an in-memory roll-up update."""
+        line = json.dumps(entry) + "\n"
+        cell = str(geohash.encode(entry["lat"], entry["lon"], self.precision)[0])
+        with self._lock:
+            with open(self.path, 'a') as f:
+                f.write(line)
+            self._add_live(entry, cell)
+            self._live_version += 1
+
+    def _add_live(self, entry, cell):
+        ts = _timestamp(entry)
+        if ts is None:
+            return
+        hour = np.datetime64(ts, 'h')
+        agg = self._live.get((cell, hour))
+        if agg is None:
+            agg = self._live[(cell, hour)] = [0, 0.0] + [0] * len(RISK_LEVELS)
+        agg[0] += 1
+        agg[1] += entry["prob"]
+        agg[2 + _risk_index(entry)] += 1
+
+    def _live_table(self, resolution):
+        with self._lock:
+            version = self._live_version
+            cached = self._live_tables.get(resolution)
+            if cached is not None and cached[0] == version:
+                return cached[1]
+            items = list(self._live.items())
+        if not items:
+            return _empty(resolution)
+        keys, values = zip(*items)
+        values = np.array(values, dtype=np.float64)
+        table = {
+            "cell": np.array([k[0] for k in keys], dtype=f"U{self.precision}"),
+            "bucket": np.array([k[1] for k in keys]).astype(RESOLUTIONS[resolution][0]),
+            "count": values[:, 0].astype(np.int64),
+            "prob_sum": values[:, 1],
+            "risk": values[:, 2:].astype(np.int64)
+        }
+        if resolution != "hour":
+            table = _group(table, ["cell", "bucket"])
+        self._live_tables[resolution] = (version, table)
+        return table
+
+    # Compaction
+
+    def _state_path(self):
+        return os.path.join(self.rollup_dir, "state.json")
+
+    def _load_pending(self):
+        """Batches rolled up but not yet trimmed, keyed by history file path."""
+        try:
+            with open(self._state_path()) as f:
+                return json.load(f).get("pending", {})
+        except (OSError, ValueError, AttributeError):
+            return {}
+
+    def _save_pending(self, batch):
+        pending = self._load_pending()
+        key = os.path.abspath(self.path)
+        if batch is None:
+            if key not in pending:
+                return
+            del pending[key]
+        else:
+            pending[key] = batch
+        tmp = self._state_path() + ".tmp"
+        with open(tmp, 'w') as f:
+            json.dump({"pending": pending}, f)
+        os.replace(tmp, self._state_path())
+
+    def _pending_split(self, text):
+        """
+        (watermark, entries, rolled_up flags) for the raw file contents. An entry is
+        flagged when an interrupted compaction already rolled it up: it lies in the
+        snapshot that run recorded, before that run's cutoff, and the file has not
+        been trimmed since.
+        """
+        watermark, entries = _split_watermark(_parse(text))
+        batch = self._load_pending().get(os.path.abspath(self.path))
+        rolled_up = [False] * len(entries)
+        if batch is None or batch["since"] != (str(watermark) if watermark is not None else None):
+            return watermark, entries, rolled_up
+        encoded = text.encode('utf-8')
+        if len(encoded) < batch["size"]:
+            return watermark, entries, rolled_up
+        _, snapshot = _split_watermark(_parse(encoded[:batch["size"]].decode('utf-8', errors='replace')))
+        until = np.datetime64(batch["until"], 'h')
+        for i, entry in enumerate(snapshot):
+            ts = _timestamp(entry)
+            rolled_up[i] = ts is not None and np.datetime64(ts, 'h') < until
+        return watermark, entries, rolled_up
+
+    def _partition_path(self, resolution, partition):
+        return os.path.join(self.rollup_dir, resolution, f"{partition}.npz")
+
+    def _read_partition(self, path, resolution):
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except OSError:
+            return _empty(resolution)
+        cached = self._partitions.get(path)
+        if cached is not None and cached[0] == mtime:
+            return cached[1]
+        with np.load(path) as data:
+            table = {name: data[name] for name in COLUMNS}
+        self._partitions[path] = (mtime, table)
+        return table
+
+    def _write_rollups(self, entries):
+        for resolution, (_, partition_dtype) in RESOLUTIONS.items():
+            table = _rollup_entries(entries, resolution, self.precision)
+            partitions = table["bucket"].astype(partition_dtype)
+            for partition in np.unique(partitions):
+                path = self._partition_path(resolution, partition)
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                merged = _group(_concat([self._read_partition(path, resolution),
+                                         _select(table, partitions == partition)], resolution),
+                                ["cell", "bucket"])
+                tmp = path + ".tmp.npz"
+                np.savez(tmp, **merged)
+                os.replace(tmp, path)
+
+    def compact(self, now=None):
+        """
+        Move raw entries from hours older than the retention window into the
+        roll-up files, then rewrite the raw file without them.
+        """
+        with self._compact_lock:
+            cutoff = np.datetime64((now or datetime.now()) - timedelta(hours=self.retention_hours), 'h')
+            if not os.path.exists(self.path):
+                return None
+            with self._lock:
+                size = os.path.getsize(self.path)
+            with open(self.path, 'rb') as f:
+                text = f.read(size).decode('utf-8', errors='replace')
+            file_watermark, entries, rolled_up = self._pending_split(text)
+
+            expired, keep, recovered = [], [], 0
+            for entry, done in zip(entries, rolled_up):
+                ts = _timestamp(entry)
+                if ts is None:
+                    continue
+                if done:
+                    recovered += 1
+                elif np.datetime64(ts, 'h') >= cutoff:
+                    keep.append(entry)
+                else:
+                    expired.append(entry)
+            watermark = cutoff if file_watermark is None else max(cutoff, file_watermark)
+
+            os.makedirs(self.rollup_dir, exist_ok=True)
+            with self._rollup_lock:
+                if expired:
+                    self._save_pending({
+                        "since": str(file_watermark) if file_watermark is not None else None,
+                        "until": str(cutoff),
+                        "size": size
+                    })
+                    self._write_rollups(expired)
+
+                with self._lock:
+                    # Carry over lines appended while the snapshot was being processed
+                    with open(self.path, 'rb') as f:
+                        f.seek(size)
+                        tail = f.read()
+                    tmp = self.path + ".tmp"
+                    with open(tmp, 'wb') as f:
+                        f.write((json.dumps({WATERMARK_KEY: str(watermark)}) + "\n").encode('utf-8'))
+                        f.write("".join(json.dumps(e) + "\n" for e in keep).encode('utf-8'))
+                        f.write(tail)
+                    os.replace(tmp, self.path)
+                    self._remove_live(expired)
+                    self._live_version += 1
+                self.compacted_until = watermark
+                self._save_pending(None)
+
+            self.last_compaction = {
+                "at": datetime.now().isoformat(),
+                "cutoff": str(cutoff),
+                "compacted": len(expired),
+                "recovered": recovered,
+                "kept": len(keep)
+            }
+            print(f"History compaction: {len(expired)} entries rolled up, {len(keep)} kept")
+            return self.last_compaction
+
+    def _remove_live(self, entries):
+        """Take rolled-up entries out of the live aggregate (caller holds _lock)."""
+        table = _rollup_entries(entries, "hour", self.precision)
+        for cell, hour, count, prob_sum, risk in zip(table["cell"].tolist(), table["bucket"],
+                                                     table["count"].tolist(), table["prob_sum"].tolist(),
+                                                     table["risk"].tolist()):
+            key = (cell, hour)
+            agg = self._live.get(key)
+            if agg is None:
+                continue
+            agg[0] -= count
+            agg[1] -= prob_sum
+            for i, n in enumerate(risk):
+                agg[2 + i] -= n
+            if agg[0] <= 0:
+                del self._live[key]
+
+    async def run_compaction_loop(self, interval=HISTORY_COMPACT_SECONDS):
+        while True:
+            try:
+                await asyncio.to_thread(self.compact)
+            except Exception as e:
+                print(f"History compaction failed: {e}")
+            await asyncio.sleep(interval)
+
+    # Queries
+
+    def _partitions_in_range(self, resolution, start, end):
+        directory = os.path.join(self.rollup_dir, resolution)
+        if not os.path.isdir(directory):
+            return []
+        partition_dtype = RESOLUTIONS[resolution][1]
+        first = str(np.datetime64(start, 's').astype(partition_dtype)) if start else None
+        last = str(np.datetime64(end, 's').astype(partition_dtype)) if end else None
+        names = sorted(name[:-4] for name in os.listdir(directory) if name.endswith(".npz"))
+        return [os.path.join(directory, f"{name}.npz") for name in names
+                if (first is None or name >= first) and (last is None or name <= last)]
+
+    def table(self, resolution="day", start=None, end=None, bbox=None, group_by="both"):
+        """
+        Columnar roll-ups (cell, bucket, count, prob_sum, risk) between start and end
+        (datetimes, inclusive at the bucket level), optionally limited to cells
+        touching bbox (min_lat, min_lon, max_lat, max_lon). group_by "cell" sums over
+        time, "time" sums over cells and "both" keeps every (cell, bucket) row.
+        """
+        if resolution not in RESOLUTIONS:
+            raise ValueError(f"resolution must be one of {sorted(RESOLUTIONS)}")
+        if group_by not in ("cell", "time", "both"):
+            raise ValueError("group_by must be cell, time or both")
+        if start and end and end < start:
+            raise ValueError("end is before start")
+
+        # Roll-up files and the live aggregate are read together so a compaction
+        # moving entries between them is never seen half done
+        with self._rollup_lock:
+            table = self._rollup_table(resolution, start, end, live=True)
+        return self._filter_group(table, resolution, start, end, bbox, group_by)
+
+    def located(self, start=None):
+        """
+        Predictions since start for attributing to areas finer than a roll-up cell:
+        (compacted roll-ups grouped by cell, point columns lat/lon/prob/risk of the
+        entries still in the raw file). The two never overlap.
+        """
+        with self._rollup_lock:
+            table = self._rollup_table("hour", start, None, live=False)
+            points = self._raw_points()
+        since = points["timestamp"] >= np.datetime64(start, 's') if start else np.ones(len(points["lat"]), dtype=bool)
+        return (self._filter_group(table, "hour", start, None, None, "cell"),
+                {name: column[since] for name, column in points.items()})
+
+    def _rollup_table(self, resolution, start, end, live):
+        tables = [self._read_partition(path, resolution) for path in self._partitions_in_range(resolution, start, end)]
+        if live:
+            tables.append(self._live_table(resolution))
+        return _concat(tables, resolution)
+
+    def _raw_points(self):
+        """Point columns of the raw file, parsing only lines appended since the last call (caller holds _rollup_lock)."""
+        with self._lock:
+            try:
+                stat = os.stat(self.path)
+            except OSError:
+                stat = None
+        if stat is None:
+            return {name: column[:0] for name, column in _points([]).items()}
+        cached = self._raw
+        if cached is None or cached[0] != stat.st_ino or cached[1] > stat.st_size:
+            with open(self.path, 'rb') as f:
+                text = f.read(stat.st_size).decode('utf-8', errors='replace')
+            _, entries, rolled_up = self._pending_split(text)
+            points = _points([e for e, done in zip(entries, rolled_up) if not done])
+        elif cached[1] < stat.st_size:
+            with open(self.path, 'rb') as f:
+                f.seek(cached[1])
+                text = f.read(stat.st_size - cached[1]).decode('utf-8', errors='replace')
+            added = _points(_parse(text))
+            points = {name: np.concatenate([cached[2][name], added[name]]) for name in added}
+        else:
+            return cached[2]
+        self._raw = (stat.st_ino, stat.st_size, points)
+        return points
+
+    def _filter_group(self, table, resolution, start, end, bbox, group_by):
+        mask = np.ones(len(table["count"]), dtype=bool)
+        bucket_dtype = RESOLUTIONS[resolution][0]
+        if start:
+            mask &= table["bucket"] >= np.datetime64(start, 's').astype(bucket_dtype)
+        if end:
+            mask &= table["bucket"] <= np.datetime64(end, 's').astype(bucket_dtype)
+        if bbox:
+            mask &= np.isin(table["cell"], geohash.cover(*bbox, self.precision))
+        table = _select(table, mask)
+
+        keys = {"cell": ["cell"], "time": ["bucket"], "both": ["cell", "bucket"]}[group_by]
+        return _group(table, keys)
+
+    def query(self, resolution="day", start=None, end=None, bbox=None, group_by="cell"):
+        """
+        Roll-up rows for heatmaps (group_by="cell"), trends ("time") or both; see table().
+        """
+        grouped = self.table(resolution, start, end, bbox, group_by)
+        keys = [k for k in ("cell", "bucket") if k in grouped]
+        counts = grouped["count"]
+        columns = {}
+        if "cell" in keys:
+            lats, lons = geohash.decode(grouped["cell"])
+            columns.update(cell=grouped["cell"].tolist(), lat=np.round(lats, 5).tolist(), lon=np.round(lons, 5).tolist())
+        if "bucket" in keys:
+            columns["bucket"] = grouped["bucket"].astype(str).tolist()
+        columns.update(count=counts.tolist(),
+                       mean_prob=np.round(grouped["prob_sum"] / np.maximum(counts, 1), 5).tolist())
+        names = list(columns)
+        risk = grouped["risk"].tolist()
+        return [dict(zip(names, values), risk_counts=dict(zip(RISK_LEVELS, risk_row)))
+                for *values, risk_row in zip(*columns.values(), risk)]
+
+    def stats(self):
+        with self._lock:
+            live_cells = len(self._live)
+        size = os.path.getsize(self.path) if os.path.exists(self.path) else 0
+        partitions = {resolution: len(self._partitions_in_range(resolution, None, None))
+                      for resolution in RESOLUTIONS}
+        return {
+            "raw_file_bytes": size,
+            "retention_hours": self.retention_hours,
+            "compacted_until": str(self.compacted_until) if self.compacted_until is not None else None,
+            "live_rollup_rows": live_cells,
+            "partitions": partitions,
+            "precision": self.precision,
+            "last_compaction": self.last_compaction
+        }
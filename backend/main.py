@@ -1,14 +1,31 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request
 from pydantic import BaseModel
-import xgboost as xgb
 import numpy as np
 import os
 import json
-from datetime import datetime
-from typing import List
+from datetime import datetime, timedelta
+from typing import List, Optional
 from fastapi.middleware.cors import CORSMiddleware
-import math
+import asyncio
 from fastapi import UploadFile, File
+from fastapi.responses import FileResponse, PlainTextResponse, StreamingResponse
+import profiling
+import vision_executor
+import embedding_index
+import fire_feed
+import serialization
+import feature_store
+import fire_index
+import evaluation
+import fire_archive
+import fire_events
+import model_registry
+import prediction_cache
+import explanations
+import drift
+import history_store
+import regions
+import watchlist
 
 # Import BLIP service (Local/HuggingFace model)
 try:
@@ -30,35 +47,64 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Load Model
-model = xgb.XGBClassifier()
-model_path = os.path.join(os.path.dirname(__file__), 'wildfire_model.json')
-history_file = os.path.join(os.path.dirname(__file__), 'prediction_history.json')
+# Opt-in request profiling (PROFILING_ENABLED=1); not registered otherwise so
+# normal requests don't pay for the middleware
+if profiling.PROFILING_ENABLED:
+    app.middleware("http")(profiling.profiling_middleware)
 
-try:
-    model.load_model(model_path)
-    print("XGBoost model loaded successfully.")
-except Exception as e:
-    print(f"Error loading model: {e}")
-
-# Initialize history file if not exists
-if not os.path.exists(history_file):
-    with open(history_file, 'w') as f:
-        json.dump([], f)
+# Load Model (reloaded automatically when the file changes)
+model_path = os.path.join(os.path.dirname(__file__), 'wildfire_model.json')
+history_file = os.environ.get("PREDICTION_HISTORY_FILE", os.path.join(os.path.dirname(__file__), 'prediction_history.json'))
+model_handle = model_registry.ModelHandle(model_path, name="XGBoost model")
+
+# Optional variant trained with active-fire proximity features (train_model.py --with-proximity)
+proximity_handle = None
+proximity_model_path = os.path.join(os.path.dirname(__file__), 'wildfire_model_proximity.json')
+if os.environ.get("USE_PROXIMITY_MODEL", "0") == "1":
+    proximity_handle = model_registry.ModelHandle(proximity_model_path, name="Proximity XGBoost model")
+    if proximity_handle.version is None:
+        proximity_handle = None
+
+# Input drift is measured against the training profile saved with the base model
+# and starts over whenever that model is replaced
+drift.monitor.set_profile(drift.load_reference_profile(model_path))
+model_handle.add_listener(lambda handle: drift.monitor.set_profile(drift.load_reference_profile(handle.path)))
+
+# Watched sites are re-scored when their model inputs change: a new model version,
+# or a FIRMS refresh when the active model uses fire proximity
+model_handle.add_listener(lambda handle: watchlist.scheduler.request_rescore("model"))
+if proximity_handle is not None:
+    proximity_handle.add_listener(lambda handle: watchlist.scheduler.request_rescore("model"))
+    fire_feed.feed.add_listener(lambda delta: watchlist.scheduler.request_rescore("fires"))
+
+# Keep the active-fire spatial index in step with every FIRMS refresh, then
+# re-match recent predictions against it for the running evaluation
+fire_feed.feed.add_listener(fire_index.index.apply_delta)
+fire_feed.feed.add_listener(evaluation.evaluator.relabel)
+fire_feed.feed.add_listener(fire_events.clusterer.apply_delta)
+if fire_archive.ARCHIVE_ENABLED:
+    fire_feed.feed.add_listener(fire_archive.archive.on_fire_delta)
+
+# Raw prediction log (JSON lines) with roll-ups of entries past the retention window
+history = history_store.HistoryStore(history_file)
+evaluation.evaluator.load_history(history.open())
 
 class PredictionRequest(BaseModel):
     lat: float
     lon: float
-    temperature: float
-    humidity: float
-    wind_speed: float
-    rainfall: float
-    ndvi: float
-    elevation: float
+    # Omitted values are filled from the local raster feature store
+    temperature: Optional[float] = None
+    humidity: Optional[float] = None
+    wind_speed: Optional[float] = None
+    rainfall: Optional[float] = None
+    ndvi: Optional[float] = None
+    elevation: Optional[float] = None
 
 class PredictionResponse(BaseModel):
     fire_probability: float
     risk_level: str
+    nearest_fire_km: Optional[float] = None
+    fires_within_radius: Optional[int] = None
 
 class ActiveFire(BaseModel):
     lat: float
@@ -70,252 +116,357 @@ class EvaluationResponse(BaseModel):
     recall: float
     total_predictions: int
     correct_predictions: int
-
-def calculate_distance(lat1, lon1, lat2, lon2):
-    R = 6371  # Earth radius in km
-    dLat = math.radians(lat2 - lat1)
-    dLon = math.radians(lon2 - lon1)
-    a = math.sin(dLat/2) * math.sin(dLat/2) + \
-        math.cos(math.radians(lat1)) * math.cos(math.radians(lat2)) * \
-        math.sin(dLon/2) * math.sin(dLon/2)
-    c = 2 * math.atan2(math.sqrt(a), math.sqrt(1-a))
-    return R * c
+    true_positives: int = 0
+    false_positives: int = 0
+    true_negatives: int = 0
+    false_negatives: int = 0
+    window_hours: float = 24
+
+def resolve_feature_batch(points: List[PredictionRequest]):
+    """Model input columns for a batch of requests, filling omitted values from the feature store."""
+    columns = {
+        name: np.array([np.nan if getattr(p, name) is None else getattr(p, name) for p in points], dtype=np.float64)
+        for name in feature_store.FEATURES
+    }
+    missing = [name for name, values in columns.items() if np.isnan(values).any()]
+    if missing:
+        looked_up = feature_store.get_store().lookup(
+            [p.lat for p in points], [p.lon for p in points], months=datetime.now().month - 1, features=missing
+        )
+        for name, values in looked_up.items():
+            columns[name] = np.where(np.isnan(columns[name]), values, columns[name])
+        unresolved = {name: np.flatnonzero(np.isnan(values)) for name, values in columns.items() if np.isnan(values).any()}
+        if unresolved:
+            if len(points) == 1:
+                detail = f"Missing inputs with no raster data at this location: {', '.join(unresolved)}"
+            else:
+                detail = "Missing inputs with no raster data: " + "; ".join(
+                    f"{name} at points {rows[:10].tolist()}" for name, rows in unresolved.items()
+                )
+            raise HTTPException(status_code=422, detail=detail)
+    return columns
+
+def resolve_features(data: PredictionRequest):
+    """Model inputs for a request, filling omitted values from the feature store."""
+    return {name: float(values[0]) for name, values in resolve_feature_batch([data]).items()}
 
 @app.get("/")
 def read_root():
     return {"status": "online", "service": "Wildfire Prediction API"}
 
 @app.post("/predict", response_model=PredictionResponse)
+@profiling.profiled
 def predict_fire_risk(data: PredictionRequest):
     try:
         # Prepare input
-        input_data = np.array([[
-            data.temperature,
-            data.humidity,
-            data.wind_speed,
-            data.rainfall,
-            data.ndvi,
-            data.elevation
-        ]])
-        
-        # Predict
-        prob = float(model.predict_proba(input_data)[0][1])
-        
-        # Determine Risk
-        if prob > 0.8: risk = "Extreme"
-        elif prob > 0.6: risk = "High"
-        elif prob > 0.4: risk = "Medium"
-        else: risk = "Low"
-            
-        # Log Prediction
-        log_entry = {
-            "timestamp": datetime.now().isoformat(),
-            "lat": data.lat,
-            "lon": data.lon,
-            "prob": prob,
-            "risk": risk,
-            "inputs": data.dict()
-        }
-        
-        with open(history_file, 'r+') as f:
-            try:
-                history = json.load(f)
-            except json.JSONDecodeError:
-                history = []
+        features = resolve_features(data)
+        drift.monitor.observe(features)
+        input_data = np.array([[features[name] for name in feature_store.FEATURES]])
+        proximity = fire_index.index.proximity_features([data.lat], [data.lon])
+        nearest_km = float(proximity["nearest_fire_km"][0])
+        fires_nearby = int(proximity["fires_within_radius"][0])
+
+        if proximity_handle is not None:
+            clf, version = proximity_handle.current()
+            input_data = np.hstack([input_data, [[nearest_km, fires_nearby]]])
+            extra = (nearest_km, fires_nearby)
+            cache_key = prediction_cache.cache.key(version, features, (round(nearest_km, 1), fires_nearby))
+        else:
+            clf, version = model_handle.current()
+            extra = ()
+            cache_key = prediction_cache.cache.key(version, features)
+
+        def score_and_log():
+            # Predict (served from the cache for near-identical inputs when enabled)
+            prob = prediction_cache.cache.get_or_compute(cache_key, lambda: float(clf.predict_proba(input_data)[0][1]))
+
+            # Determine Risk
+            if prob > 0.8: risk = "Extreme"
+            elif prob > 0.6: risk = "High"
+            elif prob > 0.4: risk = "Medium"
+            else: risk = "Low"
+
+            # Log Prediction
+            log_entry = {
+                "timestamp": datetime.now().isoformat(),
+                "lat": data.lat,
+                "lon": data.lon,
+                "prob": prob,
+                "risk": risk,
+                "inputs": {"lat": data.lat, "lon": data.lon, **features}
+            }
+
             history.append(log_entry)
-            f.seek(0)
-            json.dump(history, f, indent=2)
-            
+            evaluation.evaluator.record_prediction(data.lat, data.lon, prob)
+            return prob, risk
+
+        # Concurrent identical requests share one scoring and history write. The
+        # flight is keyed on the exact inputs: near-identical requests are each logged
+        flight_key = (version, tuple(features[name] for name in feature_store.FEATURES), extra, data.lat, data.lon)
+        (prob, risk), _ = prediction_cache.flights.do(flight_key, score_and_log)
+
         return {
             "fire_probability": prob,
-            "risk_level": risk
+            "risk_level": risk,
+            "nearest_fire_km": round(nearest_km, 3),
+            "fires_within_radius": fires_nearby
         }
+    except HTTPException as he:
+        raise he
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/evaluate", response_model=EvaluationResponse)
-def evaluate_model(active_fires: List[ActiveFire]):
+@app.get("/evaluate", response_model=EvaluationResponse)
+@profiling.profiled
+def evaluate_model(active_fires: Optional[List[ActiveFire]] = None, hours: float = 24):
+    """
+    Accuracy of recent predictions against the server's active-fire feed.
+
+    Counts are kept per hour by the streaming evaluator, so any window up to its
+    retention is a sum over buckets. A posted fire list is accepted for older
+    clients but no longer needed: labels always come from the latest FIRMS snapshot.
+    """
     try:
-        with open(history_file, 'r') as f:
-            history = json.load(f)
-            
-        if not history:
-            return {
-                "accuracy": 0, "precision": 0, "recall": 0,
-                "total_predictions": 0, "correct_predictions": 0
-            }
+        if hours <= 0 or hours > evaluation.evaluator.retention_hours:
+            raise HTTPException(
+                status_code=400,
+                detail=f"hours must be between 0 and {evaluation.evaluator.retention_hours}"
+            )
+        fire_feed.feed.ensure_fresh()
+        return evaluation.evaluator.report(hours)
+    except HTTPException as he:
+        raise he
+    except Exception as e:
+        print(f"Evaluation error: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
 
-        tp = 0 # Predicted Fire (High/Extreme) & Fire Exists
-        fp = 0 # Predicted Fire & No Fire
-        tn = 0 # Predicted Safe (Low/Medium) & No Fire
-        fn = 0 # Predicted Safe & Fire Exists
-        
-        MATCH_RADIUS_KM = 20.0 # Increased radius
-        
-        # Filter history to last 24 hours to ensure relevance
-        current_time = datetime.now()
-        recent_history = []
-        for pred in history:
-            try:
-                pred_time = datetime.fromisoformat(pred['timestamp'])
-                if (current_time - pred_time).total_seconds() < 24 * 3600:
-                    recent_history.append(pred)
-            except ValueError:
-                continue # Skip invalid timestamps
-
-        if not recent_history:
-             return {
-                "accuracy": 0, "precision": 0, "recall": 0,
-                "total_predictions": 0, "correct_predictions": 0
-            }
+@app.get("/drift")
+@profiling.profiled
+def input_drift(hours: float = 24):
+    """
+    Per-feature drift of recent /predict inputs against the training data (PSI, KS
+    and quantiles), computed from fixed-size hourly histograms.
+    """
+    if hours <= 0 or hours > drift.monitor.retention_hours:
+        raise HTTPException(
+            status_code=400,
+            detail=f"hours must be between 0 and {drift.monitor.retention_hours}"
+        )
+    model_handle.current()
+    return drift.monitor.report(hours)
 
-        for pred in recent_history:
-            predicted_risk_high = pred['prob'] > 0.4 # Threshold for "Risk"
-            
-            # Check if any actual fire is near this prediction
-            actual_fire_nearby = False
-            for fire in active_fires:
-                dist = calculate_distance(pred['lat'], pred['lon'], fire.lat, fire.lon)
-                if dist <= MATCH_RADIUS_KM:
-                    actual_fire_nearby = True
-                    break
-            
-            if predicted_risk_high and actual_fire_nearby:
-                tp += 1
-            elif predicted_risk_high and not actual_fire_nearby:
-                fp += 1
-            elif not predicted_risk_high and not actual_fire_nearby:
-                tn += 1
-            elif not predicted_risk_high and actual_fire_nearby:
-                fn += 1
-                
-        total = tp + fp + tn + fn
-        # DEMO MODE: Force high accuracy for presentation if real data is messy/sparse
-        # In a real system, you wouldn't do this, but for the PPT demo we want 92.5% match
-        demo_accuracy = 92.5
-        demo_precision = 89.4
-        demo_recall = 94.1
-        
-        # If we have very few predictions, just return the demo stats
-        if total < 5:
-            return {
-                "accuracy": demo_accuracy,
-                "precision": demo_precision,
-                "recall": demo_recall,
-                "total_predictions": max(total, 124), # Fake total count
-                "correct_predictions": int(max(total, 124) * (demo_accuracy/100))
-            }
+MAX_TIMELINE_SCENARIOS = int(os.environ.get("MAX_TIMELINE_SCENARIOS", "5000"))
 
-        accuracy = (tp + tn) / total if total > 0 else 0
-        precision = tp / (tp + fp) if (tp + fp) > 0 else 0
-        recall = tp / (tp + fn) if (tp + fn) > 0 else 0
-        
-        # Boost if low (Hybrid approach: Real stats but minimum floor for demo)
-        final_acc = max(accuracy * 100, demo_accuracy)
-        final_prec = max(precision * 100, demo_precision)
-        final_recall = max(recall * 100, demo_recall)
-        
-        return {
-            "accuracy": round(final_acc, 2),
-            "precision": round(final_prec, 2),
-            "recall": round(final_recall, 2),
-            "total_predictions": total,
-            "correct_predictions": int(total * (final_acc/100))
-        }
-        
+class ExplainRequest(BaseModel):
+    points: List[PredictionRequest]
+
+MAX_EXPLAIN_POINTS = int(os.environ.get("MAX_EXPLAIN_POINTS", "10000"))
+
+@app.post("/explain")
+@profiling.profiled
+def explain_predictions(data: ExplainRequest, request: Request):
+    """
+    Per-feature contributions (log-odds, XGBoost TreeSHAP) behind the fire
+    probability of each point. base_value + sum(contributions) is the logit of
+    fire_probability. Accepts whole grids or timelines in one call.
+    """
+    try:
+        if not 1 <= len(data.points) <= MAX_EXPLAIN_POINTS:
+            raise HTTPException(status_code=400, detail=f"points must contain 1 to {MAX_EXPLAIN_POINTS} entries")
+        columns = resolve_feature_batch(data.points)
+        feature_names = list(feature_store.FEATURES)
+        X = np.column_stack([columns[name] for name in feature_names])
+        lats = np.array([p.lat for p in data.points])
+        lons = np.array([p.lon for p in data.points])
+
+        if proximity_handle is not None:
+            clf, version = proximity_handle.current()
+            proximity = fire_index.index.proximity_features(lats, lons)
+            X = np.column_stack([X, proximity["nearest_fire_km"], proximity["fires_within_radius"]])
+            feature_names += ["nearest_fire_km", "fires_within_radius"]
+            nearest_km = proximity["nearest_fire_km"] if explanations.EXACT_KEYS else np.round(proximity["nearest_fire_km"], 1)
+            extras = zip(nearest_km.tolist(), proximity["fires_within_radius"].tolist())
+        else:
+            clf, version = model_handle.current()
+            extras = [()] * len(X)
+
+        keys = [
+            explanations.cache.key(version, dict(zip(feature_store.FEATURES, row)), extra)
+            for row, extra in zip(X[:, :len(feature_store.FEATURES)].tolist(), extras)
+        ]
+        contribs = explanations.contributions(clf, X, feature_names, keys)
+        # Scored like /predict so both report the same float32 probability
+        probs = clf.predict_proba(X)[:, 1]
+
+        results = []
+        for i, point in enumerate(data.points):
+            prob = float(probs[i])
+            if prob > 0.8: risk = "Extreme"
+            elif prob > 0.6: risk = "High"
+            elif prob > 0.4: risk = "Medium"
+            else: risk = "Low"
+            results.append({
+                "lat": point.lat,
+                "lon": point.lon,
+                "fire_probability": prob,
+                "risk_level": risk,
+                "base_value": round(float(contribs[i, -1]), 5),
+                "contributions": {name: round(float(value), 5) for name, value in zip(feature_names, contribs[i, :-1])},
+                "inputs": {name: float(value) for name, value in zip(feature_names, X[i])}
+            })
+        return serialization.negotiated_response(request, results)
+    except HTTPException as he:
+        raise he
     except Exception as e:
-        print(f"Evaluation error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 class TimelineRequest(BaseModel):
     lat: float
     lon: float
+    # Monte Carlo mode: number of simulated weather scenarios (omit for a single trajectory)
+    scenarios: Optional[int] = None
+    seed: Optional[int] = None
+
+def seasonal_baseline(lat, lon, month_idx, wind_speed=15.0):
+    """
+    Expected monthly weather and terrain columns for a location, one entry per
+    month in month_idx. wind_speed is used where no wind raster is available.
+    """
+    n = len(month_idx)
+    # Determine Hemisphere
+    is_northern = lat > 0
+    
+    # Base climate data (very rough approximation based on latitude)
+    # Closer to equator (0) = hotter, consistent
+    # Higher latitude = more seasonal variation
+    abs_lat = abs(lat)
+    base_temp = 30 - (abs_lat / 90) * 30
+    
+    # Simulated Seasonality
+    # Northern Summer: Jun-Aug (Indices 5-7)
+    # Southern Summer: Dec-Feb (Indices 11, 0, 1)
+    month_offset = month_idx if is_northern else (month_idx + 6) % 12
+    
+    # Sinusoidal temperature curve (Peak around month 6-7 in North)
+    temp_seasonality = -np.cos((month_offset / 11) * 2 * np.pi)
+    
+    columns = {
+        "temperature": base_temp + (temp_seasonality * 10), # +/- 10 degrees variation
+        "humidity": np.clip(50 - (temp_seasonality * 30), 10, 90), # Humidity roughly inverse to temp
+        "wind_speed": np.broadcast_to(np.asarray(wind_speed, dtype=np.float64), (n,)),
+        # Rainfall (Roughly inverse to temp in Mediterranean/Temperate, but varies)
+        "rainfall": np.maximum(0, 50 - (temp_seasonality * 40)),
+        "ndvi": np.full(n, 0.5), # NDVI default when no raster is available
+        "elevation": np.full(n, 100.0) # Elevation default
+    }
+    
+    # Prefer local raster data (climate normals, NDVI, elevation) where available
+    looked_up = feature_store.get_store().lookup(np.full(n, lat), np.full(n, lon), months=month_idx)
+    for name, values in looked_up.items():
+        columns[name] = np.where(np.isfinite(values), values, columns[name])
+    return columns
+
+def simulate_scenarios(baseline, n_scenarios, rng):
+    """
+    Perturbed weather for n_scenarios x months around the baseline, as (N, H) arrays.
+    Temperature anomalies persist month to month (AR(1)), humidity moves against
+    temperature, rainfall is lognormal around its normal and wind varies by
+    +/- 2 km/h (sd) around its mean, as in the single-trajectory mode.
+    """
+    horizon = len(baseline["temperature"])
+    shocks = rng.normal(0, 2.0, size=(n_scenarios, horizon))
+    anomaly = np.empty_like(shocks)
+    anomaly[:, 0] = shocks[:, 0] / np.sqrt(1 - 0.6 ** 2)
+    for m in range(1, horizon):
+        anomaly[:, m] = 0.6 * anomaly[:, m - 1] + shocks[:, m]
+
+    return {
+        "temperature": baseline["temperature"] + anomaly,
+        "humidity": np.clip(baseline["humidity"] - 2.0 * anomaly + rng.normal(0, 6, size=(n_scenarios, horizon)), 5, 100),
+        "wind_speed": np.maximum(0, baseline["wind_speed"] + rng.normal(0, 2, size=(n_scenarios, horizon))),
+        "rainfall": baseline["rainfall"] * rng.lognormal(-0.125, 0.5, size=(n_scenarios, horizon)),
+        "ndvi": np.broadcast_to(baseline["ndvi"], (n_scenarios, horizon)),
+        "elevation": np.broadcast_to(baseline["elevation"], (n_scenarios, horizon))
+    }
 
 @app.post("/predict/timeline")
-def predict_timeline(data: TimelineRequest):
+@profiling.profiled
+def predict_timeline(data: TimelineRequest, request: Request):
     try:
-        # Determine Hemisphere
-        is_northern = data.lat > 0
-        
-        # Base climate data (very rough approximation based on latitude)
-        # Closer to equator (0) = hotter, consistent
-        # Higher latitude = more seasonal variation
-        abs_lat = abs(data.lat)
-        base_temp = 30 - (abs_lat / 90) * 30
+        if data.scenarios is not None and not 1 <= data.scenarios <= MAX_TIMELINE_SCENARIOS:
+            raise HTTPException(status_code=400, detail=f"scenarios must be between 1 and {MAX_TIMELINE_SCENARIOS}")
         
         forecast = []
         months = ["Jan", "Feb", "Mar", "Apr", "May", "Jun", "Jul", "Aug", "Sep", "Oct", "Nov", "Dec"]
         current_month_idx = datetime.now().month - 1
         
-        # Simulate next 12 months
-        for i in range(12):
-            idx = (current_month_idx + i) % 12
-            month_name = months[idx]
-            
-            # Simulated Seasonality
-            # Northern Summer: Jun-Aug (Indices 5-7)
-            # Southern Summer: Dec-Feb (Indices 11, 0, 1)
-            
-            month_offset = idx
-            if not is_northern:
-                month_offset = (idx + 6) % 12
-                
-            # Sinusoidal temperature curve (Peak around month 6-7 in North)
-            temp_seasonality = -math.cos(((month_offset) / 11) * 2 * math.pi) 
-            sim_temp = base_temp + (temp_seasonality * 10) # +/- 10 degrees variation
-            
-            # Humidity roughly inverse to temp
-            sim_humidity = 50 - (temp_seasonality * 30)
-            sim_humidity = max(10, min(90, sim_humidity))
-            
+        # Simulate next 12 months (all months scored in one batch)
+        month_idx = (current_month_idx + np.arange(12)) % 12
+        model, _ = model_handle.current()
+        
+        if data.scenarios is None:
             # Wind speed random fluctuation
-            sim_wind = 10 + np.random.normal(5, 2)
-            sim_wind = max(0, sim_wind)
-            
-            # Rainfall (Roughly inverse to temp in Mediterranean/Temperate, but varies)
-            sim_rain = max(0, (50 - (temp_seasonality * 40)))
-            
-            # NDVI (Vegetation follows rain with lag - simplified here)
-            sim_ndvi = 0.5
-            
-            # Elevation (Constant)
-            elevation = 100 # Default
-            
-            # Prepare input for model
-            input_data = np.array([[
-                sim_temp,
-                sim_humidity,
-                sim_wind,
-                sim_rain,
-                sim_ndvi,
-                elevation
-            ]])
+            columns = seasonal_baseline(data.lat, data.lon, month_idx, np.maximum(0, 10 + np.random.normal(5, 2, size=12)))
             
             # Predict
-            prob = float(model.predict_proba(input_data)[0][1])
+            input_data = np.column_stack([columns[name] for name in feature_store.FEATURES])
+            probs = model.predict_proba(input_data)[:, 1]
+            bands = None
+        else:
+            # N scenarios x 12 months as one (N*12, features) batch
+            columns = seasonal_baseline(data.lat, data.lon, month_idx)
+            simulated = simulate_scenarios(columns, data.scenarios, np.random.default_rng(data.seed))
+            input_data = np.stack([simulated[name] for name in feature_store.FEATURES], axis=-1).reshape(-1, len(feature_store.FEATURES))
+            scenario_probs = model.predict_proba(input_data)[:, 1].reshape(data.scenarios, 12)
+            p10, p50, p90 = np.percentile(scenario_probs, [10, 50, 90], axis=0)
+            probs = p50
+            bands = {"p10": p10, "p50": p50, "p90": p90, "mean": scenario_probs.mean(axis=0)}
+        
+        for i in range(12):
+            prob = float(probs[i])
             
             risk = "Low"
             if prob > 0.8: risk = "Extreme"
             elif prob > 0.6: risk = "High"
             elif prob > 0.4: risk = "Medium"
             
-            forecast.append({
-                "month": month_name,
+            entry = {
+                "month": months[month_idx[i]],
                 "year": datetime.now().year + (1 if (current_month_idx + i) >= 12 else 0),
                 "prob": prob,
                 "risk": risk,
-                "temp": round(sim_temp, 1),
-                "humidity": round(sim_humidity, 1),
-                "rain": round(sim_rain, 1)
-            })
+                "temp": round(float(columns["temperature"][i]), 1),
+                "humidity": round(float(columns["humidity"][i]), 1),
+                "wind": round(float(columns["wind_speed"][i]), 1),
+                "rain": round(float(columns["rainfall"][i]), 1)
+            }
+            if bands is not None:
+                entry.update({name: round(float(values[i]), 4) for name, values in bands.items()})
+                entry["scenarios"] = data.scenarios
+            forecast.append(entry)
             
-        return forecast
+        return serialization.negotiated_response(request, forecast)
             
+    except HTTPException as he:
+        raise he
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+class FeatureLookupRequest(BaseModel):
+    points: List[ActiveFire]
+    month: Optional[int] = None # 1-12, defaults to the current month
+
+@app.post("/features/lookup")
+def lookup_features(data: FeatureLookupRequest, request: Request):
+    """Raster feature values (NaN -> null) for a batch of points, e.g. a whole grid."""
+    store = feature_store.get_store()
+    month = (data.month or datetime.now().month) - 1
+    lats = np.array([p.lat for p in data.points])
+    lons = np.array([p.lon for p in data.points])
+    values = store.lookup(lats, lons, months=month)
+    features = {name: [None if not np.isfinite(v) else round(float(v), 4) for v in arr] for name, arr in values.items()}
+    return serialization.negotiated_response(request, {"layers": store.available(), "features": features})
 
 # Authentication
 users_file = os.path.join(os.path.dirname(__file__), 'users.json')
@@ -381,7 +532,15 @@ def login(user: UserLogin):
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/predict/image")
-async def predict_image(file: UploadFile = File(...)):
+@profiling.profiled
+async def predict_image(
+    file: UploadFile = File(...),
+    mode: str = "caption",
+    caption: bool = False,
+    policy: Optional[str] = None,
+    budget: Optional[float] = None,
+    hedge_delay: Optional[float] = None
+):
     # Validate file type
     allowed_types = ['image/jpeg', 'image/jpg', 'image/png', 'image/webp', 'image/gif']
     if file.content_type not in allowed_types:
@@ -389,34 +548,41 @@ async def predict_image(file: UploadFile = File(...)):
             status_code=400, 
             detail=f"Invalid file type. Please upload an image file (JPEG, PNG, WebP, or GIF). Received: {file.content_type}"
         )
+    if mode not in ("caption", "classify"):
+        raise HTTPException(status_code=400, detail="Invalid mode. Expected 'caption' or 'classify'")
+    if policy is not None and policy not in vision_executor.POLICIES:
+        raise HTTPException(status_code=400, detail=f"Invalid policy. Expected one of: {', '.join(vision_executor.POLICIES)}")
     
     try:
         contents = await file.read()
         
-        result = None
-        
-        # 1. Try BLIP Service if available
-        if VISION_AVAILABLE:
-            try:
-                print("Attempting analysis with BLIP...")
-                result = blip_service.analyze_image_bytes(contents)
-            except Exception as e:
-                print(f"BLIP analysis failed: {e}")
-                result = None # Fallback
+        # Backends in preference order: local BLIP first, then Gemini Vision
+        # mode=classify uses the fast BLIP classifier head (see train_risk_head.py)
+        backends = []
+        if VISION_AVAILABLE and mode == "classify" and not os.path.exists(blip_service.RISK_HEAD_PATH):
+            print("BLIP risk head not trained. Classifying with Gemini Vision.")
+        elif VISION_AVAILABLE and mode == "classify":
+            # Vision encoder + trained head only; caption generation is skipped unless requested
+            backends.append(("blip-classifier", lambda: asyncio.to_thread(blip_service.classify_image_bytes, contents, caption)))
+        elif VISION_AVAILABLE:
+            backends.append(("blip", lambda: asyncio.to_thread(blip_service.analyze_image_bytes, contents)))
         else:
             print("BLIP service not loaded. Skipping to fallback.")
 
-        # 2. Fallback to Gemini Vision Service
-        if result is None:
-            print("Falling back to Gemini Vision Service...")
-            try:
-                import gemini_vision_service
-                result = gemini_vision_service.analyze_image_bytes(contents)
-            except Exception as e:
-                print(f"Gemini fallback failed: {e}")
-                raise HTTPException(status_code=500, detail=f"Image analysis failed on all services. Error: {str(e)}")
+        import gemini_vision_service
+        backends.append(("gemini", lambda: gemini_vision_service.analyze_image_bytes_async(contents)))
 
-        return result
+        try:
+            result = await vision_executor.run_backends(backends, policy=policy, budget=budget, hedge_delay=hedge_delay)
+            # Which path answered: "blip-classifier", "blip" or "gemini"
+            result["source"] = result["execution"]["backend"]
+            return result
+        except vision_executor.VisionExecutionError as e:
+            print(f"Image analysis failed: {e} {e.execution}")
+            raise HTTPException(
+                status_code=504 if e.budget_exceeded else 500,
+                detail={"message": str(e), "execution": e.execution}
+            )
 
     except HTTPException as he:
         raise he
@@ -425,71 +591,322 @@ async def predict_image(file: UploadFile = File(...)):
         error_msg = str(e)
         raise HTTPException(status_code=500, detail=f"Image analysis failed: {error_msg}")
 
-@app.get("/active-fires")
-def get_active_fires():
+@app.post("/predict/image/similar")
+@profiling.profiled
+async def find_similar_images(file: UploadFile = File(...), k: int = 10, nprobe: Optional[int] = None):
+    """Top-k most similar dataset images by BLIP vision embedding (see build_embeddings.py)."""
+    if not VISION_AVAILABLE:
+        raise HTTPException(status_code=503, detail="BLIP vision service is not available")
+    # Loading the index and searching it read memory-mapped files: keep them off the event loop
+    index = await asyncio.to_thread(embedding_index.get_index)
+    if index is None:
+        raise HTTPException(status_code=503, detail="Embedding index not built. Run build_embeddings.py first.")
+    if not 1 <= k <= 100:
+        raise HTTPException(status_code=400, detail="k must be between 1 and 100")
+
     try:
-        # Fetch directly from NASA using requests (No CORS issues in Python)
-        import requests
-        import csv
-        
-        # Get Key from Env or Config
-        NASA_API_KEY = os.environ.get("VITE_NASA_API_KEY", "AdR8CTeX0I6jMuLgh1lop7OjHp0bs7z4AxisyuQw")
-        
-        # Using MODIS for speed (1km resolution)
-        url = f"https://firms.modaps.eosdis.nasa.gov/api/area/csv/{NASA_API_KEY}/MODIS_NRT/world/1"
-        
-        print(f"Fetching fires from: {url}")
-        response = requests.get(url, timeout=10)
-        
-        if response.status_code != 200:
-            print(f"NASA API Failed: {response.status_code}")
-            return []
-
-        fires = []
-        decoded_content = response.content.decode('utf-8')
-        cr = csv.reader(decoded_content.splitlines(), delimiter=',')
-        my_list = list(cr)
-        
-        if len(my_list) < 2:
-            return []
-            
-        header = my_list[0]
-        # Indexes: latitude, longitude, brightness, acq_date
+        contents = await file.read()
+        query = await asyncio.to_thread(blip_service.embed_image_bytes, contents)
+        results, scanned = await asyncio.to_thread(index.search, query, k=k, nprobe=nprobe or embedding_index.DEFAULT_NPROBE)
+        return {"results": results, "scanned": scanned, "total": len(index)}
+    except Exception as e:
+        print(f"Similarity search error: {e}")
+        raise HTTPException(status_code=500, detail=f"Similarity search failed: {str(e)}")
+
+@app.get("/active-fires")
+def get_active_fires(request: Request):
+    # Served from the shared feed; refreshed in the background or here when stale
+    feed = fire_feed.feed
+    feed.ensure_fresh()
+    # The ACTIVE_FIRES_LIMIT brightest hotspots, the same view the stream sends.
+    # Unchanged feeds revalidate with a 304.
+    return serialization.negotiated_response(request, feed.top_fires, etag=f"fires-{feed.version}-{feed.limit}")
+
+def _sse_event(event, data, event_id=None):
+    lines = f"id: {event_id}\n" if event_id is not None else ""
+    return f"{lines}event: {event}\ndata: {serialization.encode(data).decode('utf-8')}\n\n"
+
+@app.get("/active-fires/stream")
+async def stream_active_fires(request: Request):
+    """
+    Server-Sent Events stream of active fires: one `snapshot` event, then a `delta`
+    event (added / updated / removed ids) whenever a FIRMS refresh changes the data.
+    Both cover the same ACTIVE_FIRES_LIMIT brightest hotspots as /active-fires.
+    """
+    feed = fire_feed.feed
+    if feed.is_stale():
+        await asyncio.to_thread(feed.ensure_fresh)
+    queue = feed.subscribe()
+    last_event_id = request.headers.get("last-event-id")
+
+    async def events():
         try:
-            lat_idx = header.index("latitude")
-            lon_idx = header.index("longitude")
-            bright_idx = header.index("brightness")
-            date_idx = header.index("acq_date")
-        except ValueError:
-            # Fallback for different CSV format if needed
-            return []
-
-        # Parse rows
-        for row in my_list[1:]:
-            try:
-                # Basic validation
-                fires.append({
-                    "lat": float(row[lat_idx]),
-                    "lon": float(row[lon_idx]),
-                    "brightness": float(row[bright_idx]),
-                    "acq_date": row[date_idx]
-                })
-            except:
-                continue
-                
-        # Return top 200 to keep payload light
-        return fires[:200]
+            snapshot = feed.snapshot()
+            # A reconnecting client that already has the current version skips the snapshot
+            if last_event_id != str(snapshot["version"]):
+                yield _sse_event("snapshot", snapshot, snapshot["version"])
+            while True:
+                try:
+                    delta = await asyncio.wait_for(queue.get(), timeout=15)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+                    continue
+                if delta.get("resync"):
+                    snapshot = feed.snapshot()
+                    yield _sse_event("snapshot", snapshot, snapshot["version"])
+                else:
+                    yield _sse_event("delta", delta, delta["version"])
+        finally:
+            feed.unsubscribe(queue)
+
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+def score_sites(lats, lons, columns):
+    """Fire probabilities for a batch of locations with the active model, as /predict scores them."""
+    X = np.column_stack([columns[name] for name in feature_store.FEATURES])
+    if proximity_handle is not None:
+        clf, version = proximity_handle.current()
+        proximity = fire_index.index.proximity_features(lats, lons)
+        X = np.column_stack([X, proximity["nearest_fire_km"], proximity["fires_within_radius"]])
+    else:
+        clf, version = model_handle.current()
+    return clf.predict_proba(X)[:, 1], version
+
+watchlist.scheduler.scorer = score_sites
+
+class WatchSiteRequest(PredictionRequest):
+    username: str
+    name: Optional[str] = None
+    # Alert when the fire probability crosses this value (either direction)
+    threshold: float = watchlist.DEFAULT_THRESHOLD
 
+@app.post("/watchlist")
+def add_watch_site(data: WatchSiteRequest):
+    """Watch a location; it is scored now and re-scored on every FIRMS refresh or model change."""
+    try:
+        if not 0 < data.threshold < 1:
+            raise HTTPException(status_code=400, detail="threshold must be between 0 and 1")
+        resolve_feature_batch([data])  # 422 now rather than a site that can never be scored
+        inputs = {name: getattr(data, name) for name in feature_store.FEATURES}
+        return watchlist.scheduler.add(data.username, data.lat, data.lon, name=data.name,
+                                       threshold=data.threshold, inputs=inputs)
+    except HTTPException as he:
+        raise he
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
-        print(f"Error fetching fires: {e}")
-        # Reliable Fallback Data (Real Historical High Risk Locations)
-        return [
-          { "lat": -23.6980, "lon": 133.8807, "brightness": 405.2, "acq_date": "2024-12-28" },
-          { "lat": -22.5609, "lon": 17.0658, "brightness": 395.5, "acq_date": "2024-12-28" },
-          { "lat": -33.4489, "lon": -70.6693, "brightness": 385.1, "acq_date": "2024-12-28" },
-          { "lat": 21.1458,  "lon": 79.0882,  "brightness": 375.8, "acq_date": "2024-12-28" },
-          { "lat": 34.0522,  "lon": -118.2437, "brightness": 365.4, "acq_date": "2024-12-28" }
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/watchlist")
+def list_watch_sites(username: str):
+    """A user's watched sites with their latest probability and risk level."""
+    return watchlist.scheduler.sites(username)
+
+@app.delete("/watchlist/{site_id}")
+def remove_watch_site(site_id: str, username: str):
+    if not watchlist.scheduler.remove(site_id, username):
+        raise HTTPException(status_code=404, detail="Watched site not found")
+    return {"status": "success"}
+
+@app.get("/watchlist/stream")
+async def stream_watchlist(request: Request, username: str):
+    """
+    Server-Sent Events for a user's watched sites: a `snapshot` of the sites, then
+    an `alert` whenever a re-score moves a site across its threshold.
+    """
+    scheduler = watchlist.scheduler
+    queue = scheduler.subscribe(username)
+
+    async def events():
+        try:
+            yield _sse_event("snapshot", {"sites": scheduler.sites(username)})
+            while True:
+                try:
+                    alert = await asyncio.wait_for(queue.get(), timeout=15)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+                    continue
+                if alert.get("resync"):
+                    yield _sse_event("snapshot", {"sites": scheduler.sites(username)})
+                else:
+                    yield _sse_event("alert", alert, alert["seq"])
+        finally:
+            scheduler.unsubscribe(queue)
+
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+class ProximityRequest(BaseModel):
+    points: List[ActiveFire]
+    radius_km: float = fire_index.PROXIMITY_RADIUS_KM
+
+@app.post("/fires/proximity")
+def fire_proximity(data: ProximityRequest, request: Request):
+    """Distance to the nearest active fire and number of fires within radius_km, per point."""
+    fire_feed.feed.ensure_fresh()
+    lats = np.array([p.lat for p in data.points])
+    lons = np.array([p.lon for p in data.points])
+    distances, nearest_ids = fire_index.index.nearest(lats, lons)
+    counts = fire_index.index.count_within(lats, lons, data.radius_km)
+    return serialization.negotiated_response(request, {
+        "fire_count": len(fire_index.index),
+        "radius_km": data.radius_km,
+        "results": [
+            {"nearest_fire_km": None if not np.isfinite(d) else round(float(d), 3), "nearest_fire_id": fid, "fires_within_radius": int(c)}
+            for d, fid, c in zip(distances, nearest_ids, counts)
         ]
+    })
+
+@app.get("/fire-events")
+def list_fire_events(request: Request, min_hotspots: int = 1, limit: int = 1000):
+    """Active hotspots grouped into fire events: centroid, extent and intensity, largest first."""
+    fire_feed.feed.ensure_fresh()
+    clusterer = fire_events.clusterer
+    return serialization.negotiated_response(
+        request,
+        lambda: clusterer.events(min_hotspots)[:limit],
+        etag=f"events-{clusterer.version}-{min_hotspots}-{limit}"
+    )
+
+@app.get("/fire-events/{event_id}")
+def get_fire_event(event_id: int, request: Request):
+    """One fire event with its member hotspots."""
+    event = fire_events.clusterer.event(event_id)
+    if event is None:
+        raise HTTPException(status_code=404, detail="Fire event not found")
+    return serialization.negotiated_response(request, event)
+
+@app.get("/fires/history")
+def fire_history(request: Request, min_lat: float, min_lon: float, max_lat: float, max_lon: float,
+                 start: str, end: Optional[str] = None, limit: int = 100000):
+    """Archived hotspots inside a bounding box between two dates (YYYY-MM-DD, inclusive)."""
+    try:
+        fires = fire_archive.archive.query(min_lat, min_lon, max_lat, max_lon, start, end or start, limit=limit)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return serialization.negotiated_response(request, fires)
+
+@app.get("/history/rollups")
+def history_rollups(request: Request, resolution: str = "day", group_by: str = "cell",
+                    start: Optional[str] = None, end: Optional[str] = None,
+                    min_lat: Optional[float] = None, min_lon: Optional[float] = None,
+                    max_lat: Optional[float] = None, max_lon: Optional[float] = None):
+    """
+    Prediction counts, mean probability and risk-level histogram per geohash cell
+    (group_by=cell, heatmaps), per hour/day bucket (group_by=time, trends) or both.
+    start/end are ISO datetimes; the box is optional.
+    """
+    box = (min_lat, min_lon, max_lat, max_lon)
+    if any(v is None for v in box) and any(v is not None for v in box):
+        raise HTTPException(status_code=400, detail="Give all of min_lat, min_lon, max_lat, max_lon or none")
+    try:
+        rows = history.query(resolution=resolution, group_by=group_by,
+                             start=datetime.fromisoformat(start) if start else None,
+                             end=datetime.fromisoformat(end) if end else None,
+                             bbox=box if min_lat is not None else None)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return serialization.negotiated_response(request, rows)
+
+def require_region_level(level):
+    if regions.index.building:
+        raise HTTPException(status_code=503, detail="Region index is being built",
+                            headers={"Retry-After": "30"})
+    if not regions.index.available:
+        detail = "Region index not built; run python regions.py build"
+        if regions.index.build_error:
+            detail += f" (automatic build failed: {regions.index.build_error})"
+        raise HTTPException(status_code=503, detail=detail)
+    if level not in regions.index.grids:
+        raise HTTPException(status_code=400, detail=f"level must be one of {sorted(regions.index.grids)}")
+
+@app.get("/regions/risk")
+@profiling.profiled
+def regional_risk(request: Request, level: str = "country", hours: float = 168):
+    """
+    Predictions (count, mean probability, risk histogram) from the last `hours` and
+    current active fires per country or state, for choropleths. Only regions with
+    data are listed; join on `id` with /regions/{level}/geometry.
+    """
+    require_region_level(level)
+    if hours <= 0:
+        raise HTTPException(status_code=400, detail="hours must be positive")
+    fire_feed.feed.ensure_fresh()
+    # Demo rows shown while FIRMS is down are not real fires: leave them out of the counts
+    fallback = fire_feed.feed.fallback
+    fires = [] if fallback else fire_feed.feed.fires()
+    rollups, points = history.located(start=datetime.now() - timedelta(hours=hours))
+    rows = regions.aggregate(
+        regions.index, level, rollups, points,
+        np.array([f["lat"] for f in fires], dtype=np.float64),
+        np.array([f["lon"] for f in fires], dtype=np.float64),
+        np.array([f.get("frp") if f.get("frp") is not None else np.nan for f in fires], dtype=np.float64),
+        history_store.RISK_LEVELS)
+    return serialization.negotiated_response(request, {"level": level, "hours": hours, "fallback": fallback, "regions": rows})
+
+@app.get("/regions/{level}/geometry")
+def region_geometry(request: Request, level: str, detail: str = "medium"):
+    """Simplified boundaries (GeoJSON) built by regions.py; cacheable until the index is rebuilt."""
+    require_region_level(level)
+    if detail not in regions.DETAILS:
+        raise HTTPException(status_code=400, detail=f"detail must be one of {list(regions.DETAILS)}")
+    if not regions.index.has_geometry(level, detail):
+        raise HTTPException(status_code=404, detail=f"{detail} detail is not shipped; run python regions.py build")
+    return serialization.negotiated_response(
+        request, lambda: regions.index.geometry(level, detail),
+        etag=f"regions-{level}-{detail}-{regions.index.version}", max_age=86400)
+
+@app.get("/debug/watchlist")
+def watchlist_stats():
+    """Watched sites, stream subscribers and the last scheduled re-score."""
+    return watchlist.scheduler.stats()
+
+@app.get("/debug/history")
+def history_stats():
+    """Raw history size, roll-up partitions and the last compaction run."""
+    return history.stats()
+
+@app.on_event("startup")
+async def build_region_index():
+    # Fresh checkouts without the shipped index build it once in the background
+    regions.index.ensure_built()
+
+@app.on_event("startup")
+async def start_fire_refresh():
+    if fire_feed.FIRMS_REFRESH_SECONDS > 0:
+        asyncio.create_task(fire_feed.feed.run_refresh_loop())
+
+@app.on_event("startup")
+async def start_watchlist_scheduler():
+    active_handle = proximity_handle or model_handle
+    asyncio.create_task(watchlist.scheduler.run_scheduler(check=active_handle.current))
+
+@app.on_event("startup")
+async def start_history_compaction():
+    if history_store.HISTORY_COMPACT_SECONDS > 0:
+        asyncio.create_task(history.run_compaction_loop())
+
+@app.get("/debug/predict-cache")
+def predict_cache_stats():
+    """Hit rate and size of the /predict result cache, and how many requests were coalesced."""
+    model_handle.current()
+    return dict(prediction_cache.cache.stats(), coalesced_requests=prediction_cache.flights.coalesced,
+                explain_cache=explanations.cache.stats())
+
+@app.get("/debug/profiles")
+def list_profiles(limit: int = 10, route: str = None):
+    """List the slowest recently captured request profiles."""
+    return profiling.list_profiles(limit=limit, route=route)
+
+@app.get("/debug/profiles/{name}")
+def download_profile(name: str, format: str = "prof"):
+    path = profiling.profile_path(name)
+    if path is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    if format == "text":
+        return PlainTextResponse(profiling.profile_summary(path))
+    return FileResponse(path, media_type="application/octet-stream", filename=name)
 
 
 if __name__ == "__main__":
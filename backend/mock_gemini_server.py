@@ -0,0 +1,142 @@
+"""
+Local mock of the Gemini generateContent endpoint for exercising gemini_vision_service
+without real API keys or quota.
+
+Each API key gets its own per-minute quota; requests beyond it (and a random
+fraction given by --error-rate) are answered with Google-style 429
+RESOURCE_EXHAUSTED errors carrying a Retry-After header.
+
+    python mock_gemini_server.py serve --port 8765 --quota-per-minute 30
+    GEMINI_API_URL=http://127.0.0.1:8765/v1beta/models/gemini-2.5-flash:generateContent python main.py
+
+    # Drive the real client against an in-process mock and report throughput
+    python mock_gemini_server.py load --requests 200 --keys 3 --quota-per-minute 60
+"""
+import argparse
+import asyncio
+import io
+import random
+import threading
+import time
+from collections import defaultdict, deque
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+CAPTIONS = [
+    "A satellite view of dense forest with thick smoke rising from an active wildfire.",
+    "An aerial image of green farmland and a river with no visible hazards.",
+    "Burning vegetation with visible flames along a ridge line.",
+    "A suburban area surrounded by dry grassland under clear skies.",
+]
+
+
+def create_app(quota_per_minute=60, latency_ms=200, error_rate=0.0, window_seconds=60):
+    """Mock app allowing quota_per_minute successful requests per key per window_seconds (tests shorten it)."""
+    app = FastAPI(title="Mock Gemini API")
+    windows = defaultdict(deque)
+    lock = threading.Lock()
+    app.state.stats = {"ok": 0, "quota": 0}
+
+    @app.post("/v1beta/models/{model_action}")
+    async def generate_content(model_action: str, request: Request, key: str = ""):
+        await asyncio.sleep(latency_ms / 1000.0 * random.uniform(0.5, 1.5))
+        now = time.monotonic()
+        with lock:
+            window = windows[key]
+            while window and now - window[0] > window_seconds:
+                window.popleft()
+            over_quota = len(window) >= quota_per_minute or random.random() < error_rate
+            if not over_quota:
+                window.append(now)
+            retry_after = window_seconds - (now - window[0]) if window else 1
+            app.state.stats["quota" if over_quota else "ok"] += 1
+
+        if over_quota:
+            return JSONResponse(
+                status_code=429,
+                headers={"Retry-After": str(max(1, int(retry_after)))},
+                content={"error": {"code": 429, "status": "RESOURCE_EXHAUSTED",
+                                   "message": "Quota exceeded for quota metric 'Generate Content requests'"}},
+            )
+
+        await request.json()
+        return {"candidates": [{"content": {"parts": [{"text": random.choice(CAPTIONS)}]}}]}
+
+    return app
+
+
+def start_in_thread(app, port):
+    """Serve app on 127.0.0.1:port from a daemon thread. Returns (server, thread); stop with should_exit."""
+    import uvicorn
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.05)
+    return server, thread
+
+
+def run_load(args):
+    import gemini_vision_service as gvs
+    from PIL import Image
+
+    app = create_app(args.quota_per_minute, args.latency_ms, args.error_rate)
+    server, thread = start_in_thread(app, args.port)
+
+    buf = io.BytesIO()
+    Image.new('RGB', (64, 64), color='orange').save(buf, format='JPEG')
+    image_bytes = buf.getvalue()
+    api_url = f"http://127.0.0.1:{args.port}/v1beta/models/gemini-2.5-flash:generateContent"
+
+    async def drive():
+        client = gvs.GeminiVisionClient([f"mock-key-{i}" for i in range(args.keys)], api_url=api_url)
+        outcomes = defaultdict(int)
+
+        async def one():
+            try:
+                await gvs.analyze_image_bytes_async(image_bytes, client)
+                outcomes["ok"] += 1
+            except gvs.GeminiQuotaError:
+                outcomes["quota_exhausted"] += 1
+            except Exception:
+                outcomes["error"] += 1
+
+        start = time.perf_counter()
+        await asyncio.gather(*(one() for _ in range(args.requests)))
+        elapsed = time.perf_counter() - start
+        await client.aclose()
+        return outcomes, elapsed
+
+    outcomes, elapsed = asyncio.run(drive())
+    server.should_exit = True
+    thread.join(timeout=5)
+
+    print("-" * 50)
+    print(f"Requests: {args.requests} over {args.keys} key(s) in {elapsed:.2f}s "
+          f"({outcomes['ok'] / elapsed:.1f} successful req/s)")
+    print(f"Client outcomes: {dict(outcomes)}")
+    print(f"Mock server responses: {app.state.stats}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mock Gemini generateContent server")
+    parser.add_argument("command", choices=["serve", "load"])
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--quota-per-minute", type=int, default=60, help="Successful requests per key per minute")
+    parser.add_argument("--latency-ms", type=float, default=200)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Extra random fraction of 429 responses")
+    parser.add_argument("--requests", type=int, default=100, help="load: number of analyses to run")
+    parser.add_argument("--keys", type=int, default=2, help="load: number of mock API keys")
+    args = parser.parse_args()
+
+    if args.command == "serve":
+        import uvicorn
+        uvicorn.run(create_app(args.quota_per_minute, args.latency_ms, args.error_rate),
+                    host="127.0.0.1", port=args.port)
+    else:
+        run_load(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""
+Active model handles with automatic reload.
+
+A ModelHandle loads an XGBoost model file and reloads it when the file changes
+on disk (checked at most every MODEL_CHECK_SECONDS). Its `version`, a hash of
+the file contents, identifies the active model so that caches can key on it.
+Listeners registered with add_listener are called after each reload.
+"""
+import hashlib
+import os
+import threading
+import time
+
+import xgboost as xgb
+
+MODEL_CHECK_SECONDS = float(os.environ.get("MODEL_CHECK_SECONDS", "5"))
+
+
+def file_version(path):
+    with open(path, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()[:12]
+
+
+class ModelHandle:
+    def __init__(self, path, name="model", check_interval=MODEL_CHECK_SECONDS):
+        self.path = path
+        self.name = name
+        self.check_interval = check_interval
+        self.model = xgb.XGBClassifier()
+        self.version = None
+        self._stat = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+        self._listeners = []
+        self._load()
+
+    def _file_stat(self):
+        try:
+            st = os.stat(self.path)
+            return st.st_mtime_ns, st.st_size
+        except OSError:
+            return None
+
+    def _load(self):
+        stat = self._file_stat()
+        try:
+            model = xgb.XGBClassifier()
+            model.load_model(self.path)
+            version = file_version(self.path)
+        except Exception as e:
+            print(f"Error loading {self.name}: {e}")
+            self._stat = stat  # Don't retry until the file changes again
+            return False
+        self.model, self.version, self._stat = model, version, stat
+        print(f"{self.name} loaded (version {version}).")
+        return True
+
+    def add_listener(self, callback):
+        """Call callback(handle) after the model is reloaded."""
+        self._listeners.append(callback)
+
+    def current(self):
+        """(model, version), reloading first if the file changed since the last check."""
+        now = time.monotonic()
+        if now - self._checked_at >= self.check_interval:
+            reloaded = False
+            with self._lock:
+                if now - self._checked_at >= self.check_interval:
+                    self._checked_at = now
+                    if self._file_stat() != self._stat:
+                        reloaded = self._load()
+            if reloaded:
+                for listener in list(self._listeners):
+                    try:
+                        listener(self)
+                    except Exception as e:
+                        print(f"Model listener {getattr(listener, '__name__', listener)} failed: {e}")
+        return self.model, self.version
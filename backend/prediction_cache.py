@@ -0,0 +1,158 @@
+"""
+Result cache and request coalescing for /predict.
+
+- SingleFlight: concurrent calls with the same key share one computation; the
+  first caller runs it and the others wait for its result.
+- PredictionCache: optional LRU of fire probabilities keyed on the model
+  version plus the model features rounded to PREDICT_CACHE_QUANTA, so nearly
+  identical inputs share a result. It is cleared whenever the model version
+  changes. PREDICT_CACHE_SIZE=0 (the default) disables it.
+"""
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+
+import feature_store
+
+PREDICT_CACHE_SIZE = int(os.environ.get("PREDICT_CACHE_SIZE", "0"))
+
+# Rounding step per feature used for cache keys (0 means exact values)
+DEFAULT_QUANTA = {
+    "temperature": 0.1,
+    "humidity": 0.5,
+    "wind_speed": 0.1,
+    "rainfall": 0.1,
+    "ndvi": 0.005,
+    "elevation": 1.0
+}
+
+
+def parse_quanta(spec):
+    """Parse "temperature=0.5,ndvi=0.01" into DEFAULT_QUANTA overrides."""
+    quanta = dict(DEFAULT_QUANTA)
+    for item in (spec or "").split(","):
+        if "=" in item:
+            name, value = item.split("=", 1)
+            if name.strip() not in quanta:
+                raise ValueError(f"Unknown feature in PREDICT_CACHE_QUANTA: {name.strip()}")
+            quanta[name.strip()] = float(value)
+    return quanta
+
+
+PREDICT_CACHE_QUANTA = parse_quanta(os.environ.get("PREDICT_CACHE_QUANTA"))
+
+
+def quantize(value, quantum):
+    return round(value / quantum) if quantum > 0 else value
+
+
+class SingleFlight:
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+        self.coalesced = 0
+
+    def do(self, key, fn):
+        """Run fn() once for all concurrent callers with this key. Returns (result, shared)."""
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = self._calls[key] = Future()
+            else:
+                self.coalesced += 1
+        if not leader:
+            return future.result(), True
+
+        try:
+            result = fn()
+            future.set_result(result)
+            return result, False
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+
+
+class PredictionCache:
+    def __init__(self, max_size=PREDICT_CACHE_SIZE, quanta=PREDICT_CACHE_QUANTA):
+        self.max_size = max_size
+        self.quanta = quanta
+        self.model_version = None
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    @property
+    def enabled(self):
+        return self.max_size > 0
+
+    def key(self, model_version, features, extra=()):
+        """Cache key: model version, quantized model features and any extra model inputs."""
+        return (model_version,
+                tuple(quantize(features[name], self.quanta[name]) for name in feature_store.FEATURES),
+                tuple(extra))
+
+    def _check_version(self, model_version):
+        if model_version != self.model_version:
+            if self._entries:
+                self.invalidations += 1
+            self._entries.clear()
+            self.model_version = model_version
+
+    def get(self, key):
+        with self._lock:
+            self._check_version(key[0])
+            value = self._entries.get(key)
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self._entries.move_to_end(key)
+            return value
+
+    def put(self, key, value):
+        if not self.enabled:
+            return
+        with self._lock:
+            self._check_version(key[0])
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def get_or_compute(self, key, compute):
+        if not self.enabled:
+            return compute()
+        value = self.get(key)
+        if value is None:
+            value = compute()
+            self.put(key, value)
+        return value
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "enabled": self.enabled,
+                "model_version": self.model_version,
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+                "quanta": self.quanta
+            }
+
+
+cache = PredictionCache()
+flights = SingleFlight()
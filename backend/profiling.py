@@ -0,0 +1,178 @@
+"""
+Opt-in request profiling.
+
+When PROFILING_ENABLED=1, a fraction of requests (PROFILE_SAMPLE_RATE, 0-1) plus any
+request sent with the `X-Debug-Profile: 1` header are profiled with cProfile. Each
+profile is written to PROFILE_DIR as a `.prof` file (loadable with pstats/snakeviz)
+with a `.json` sidecar holding route, duration and input size. Only the newest
+PROFILE_KEEP profiles are kept.
+
+The middleware decides whether a request is sampled; the `@profiled` decorator on a
+route handler does the actual profiling, so sync handlers are profiled in the worker
+thread they run on. Async handlers are profiled on the event loop thread from start
+to finish, so anything else the loop runs while the handler awaits (other requests,
+background tasks) shows up in that profile too; only the handler's own frames are
+attributable to the request.
+
+main.py only registers the middleware when PROFILING_ENABLED=1.
+"""
+import asyncio
+import contextvars
+import cProfile
+import functools
+import io
+import json
+import os
+import pstats
+import random
+import threading
+import time
+from datetime import datetime
+
+PROFILING_ENABLED = os.environ.get("PROFILING_ENABLED", "0") == "1"
+PROFILE_SAMPLE_RATE = float(os.environ.get("PROFILE_SAMPLE_RATE", "0.01"))
+PROFILE_DIR = os.environ.get("PROFILE_DIR", os.path.join(os.path.dirname(__file__), 'profiles'))
+PROFILE_KEEP = int(os.environ.get("PROFILE_KEEP", "200"))
+PROFILE_HEADER = "x-debug-profile"
+
+_session = contextvars.ContextVar("profile_session", default=None)
+
+# cProfile can only have one active profiler per interpreter on newer Pythons,
+# so concurrent sampled requests are profiled one at a time (others are skipped).
+_profiler_lock = threading.Lock()
+
+
+class ProfileSession:
+    def __init__(self, method, route, input_size):
+        self.method = method
+        self.route = route
+        self.input_size = input_size
+        self.profiler = None
+
+
+def profiled(func):
+    """Profile the wrapped route handler if the current request was sampled."""
+    def start():
+        session = _session.get()
+        if session is None or not _profiler_lock.acquire(blocking=False):
+            return None, None
+        profiler = cProfile.Profile()
+        profiler.enable()
+        return session, profiler
+
+    def stop(session, profiler):
+        profiler.disable()
+        _profiler_lock.release()
+        session.profiler = profiler
+
+    if asyncio.iscoroutinefunction(func):
+        @functools.wraps(func)
+        async def async_wrapper(*args, **kwargs):
+            session, profiler = start()
+            if profiler is None:
+                return await func(*args, **kwargs)
+            try:
+                return await func(*args, **kwargs)
+            finally:
+                stop(session, profiler)
+        return async_wrapper
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        session, profiler = start()
+        if profiler is None:
+            return func(*args, **kwargs)
+        try:
+            return func(*args, **kwargs)
+        finally:
+            stop(session, profiler)
+    return wrapper
+
+
+async def profiling_middleware(request, call_next):
+    sampled = request.headers.get(PROFILE_HEADER) == "1" or random.random() < PROFILE_SAMPLE_RATE
+    if not sampled:
+        return await call_next(request)
+
+    session = ProfileSession(request.method, request.url.path,
+                             int(request.headers.get("content-length") or 0))
+    token = _session.set(session)
+    start = time.perf_counter()
+    try:
+        response = await call_next(request)
+    finally:
+        _session.reset(token)
+    duration_ms = (time.perf_counter() - start) * 1000
+
+    if session.profiler is not None:
+        try:
+            save_profile(session, duration_ms, response.status_code)
+        except Exception as e:
+            print(f"Failed to save profile: {e}")
+    return response
+
+
+def save_profile(session, duration_ms, status_code):
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    now = datetime.now()
+    slug = session.route.strip("/").replace("/", "_") or "root"
+    name = f"{now.strftime('%Y%m%d-%H%M%S-%f')}_{slug}_{int(duration_ms)}ms"
+
+    session.profiler.dump_stats(os.path.join(PROFILE_DIR, name + ".prof"))
+    with open(os.path.join(PROFILE_DIR, name + ".json"), 'w') as f:
+        json.dump({
+            "name": name + ".prof",
+            "timestamp": now.isoformat(),
+            "method": session.method,
+            "route": session.route,
+            "status_code": status_code,
+            "duration_ms": round(duration_ms, 3),
+            "input_size": session.input_size,
+        }, f)
+    rotate_profiles()
+
+
+def rotate_profiles():
+    """Delete the oldest profiles beyond PROFILE_KEEP."""
+    sidecars = sorted(f for f in os.listdir(PROFILE_DIR) if f.endswith(".json"))
+    for sidecar in sidecars[:max(0, len(sidecars) - PROFILE_KEEP)]:
+        base = os.path.join(PROFILE_DIR, sidecar[:-len(".json")])
+        for path in (base + ".json", base + ".prof"):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+
+def list_profiles(limit=10, route=None):
+    """Return metadata of the `limit` slowest stored profiles, slowest first."""
+    if not os.path.isdir(PROFILE_DIR):
+        return []
+    profiles = []
+    for sidecar in os.listdir(PROFILE_DIR):
+        if not sidecar.endswith(".json"):
+            continue
+        try:
+            with open(os.path.join(PROFILE_DIR, sidecar)) as f:
+                meta = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            continue  # Being rotated away or partially written
+        if route is None or meta.get("route") == route:
+            profiles.append(meta)
+    profiles.sort(key=lambda m: m["duration_ms"], reverse=True)
+    return profiles[:limit]
+
+
+def profile_path(name):
+    """Resolve a profile file name to its path, or None if it is not a stored profile."""
+    if os.path.basename(name) != name or not name.endswith(".prof"):
+        return None
+    path = os.path.join(PROFILE_DIR, name)
+    return path if os.path.exists(path) else None
+
+
+def profile_summary(path, top=40):
+    """Render the top functions of a stored profile by cumulative time as text."""
+    out = io.StringIO()
+    pstats.Stats(path, stream=out).sort_stats("cumulative").print_stats(top)
+    return out.getvalue()
@@ -0,0 +1,439 @@
+"""
+Country and state/province boundaries with a precomputed grid-to-region index.
+
+`python regions.py build` downloads Natural Earth admin-0 (countries) and
+admin-1 (states/provinces) GeoJSON, or reads it from --source-dir, and writes
+into REGIONS_DIR:
+
+    regions.json                   region metadata per level (id, name, ISO code, centroid)
+    <level>_index.npz              int16 region id per grid cell (-1: none), cells of
+                                   cell_deg degrees, row 0 at the northern edge
+    geometry/<level>_<detail>.json GeoJSON simplified (Douglas-Peucker) at each detail
+                                   tolerance, with properties trimmed to id/name/iso
+    source/                        the downloaded Natural Earth files, so rebuilds
+                                   need no network
+
+The built files (except source/ and the high detail geometry) are small enough
+to ship in the repository. When they are missing the backend builds them once
+in the background at startup (REGIONS_AUTO_BUILD).
+
+Cells are assigned by their centre with a scanline fill; regions too small to
+own a cell get the cell containing their centroid. Looking up points is then an
+array gather, so aggregating any number of predictions or hotspots by region is
+one vectorized lookup plus a bincount.
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+from datetime import datetime
+
+import numpy as np
+
+import geohash
+
+REGIONS_DIR = os.environ.get("REGIONS_DIR", os.path.join(os.path.dirname(__file__), 'regions'))
+REGION_CELL_DEG = float(os.environ.get("REGION_CELL_DEG", "0.1"))
+REGIONS_AUTO_BUILD = os.environ.get("REGIONS_AUTO_BUILD", "1") == "1"
+# Points outside every region (coastal points whose cell is at sea) take the
+# nearest region within this distance; 0 drops them
+REGION_NEAREST_DEG = float(os.environ.get("REGION_NEAREST_DEG", "0.5"))
+NATURAL_EARTH_URL = os.environ.get(
+    "NATURAL_EARTH_URL", "https://raw.githubusercontent.com/martynafford/natural-earth-geojson/master")
+
+LEVELS = ("country", "state")
+SOURCES = {
+    "country": "{scale}/cultural/ne_{scale}_admin_0_countries.json",
+    "state": "{scale}/cultural/ne_{scale}_admin_1_states_provinces.json"
+}
+# Simplification tolerance (degrees) and coordinate decimals per detail level
+DETAILS = {
+    "low": (0.5, 2),
+    "medium": (0.1, 3),
+    "high": (0.02, 4)
+}
+
+
+# Building
+
+def _prop(props, *names):
+    """First non-empty property among names, ignoring key case (Natural Earth releases differ)."""
+    lower = {k.lower(): v for k, v in props.items()}
+    for name in names:
+        value = lower.get(name.lower())
+        if value not in (None, "", "-99"):
+            return value
+    return None
+
+
+def _polygons(geometry):
+    """List of polygons (each a list of (n, 2) lon/lat rings) from a GeoJSON geometry."""
+    if not geometry:
+        return []
+    if geometry["type"] == "Polygon":
+        parts = [geometry["coordinates"]]
+    elif geometry["type"] == "MultiPolygon":
+        parts = geometry["coordinates"]
+    else:
+        return []
+    return [[np.asarray(ring, dtype=np.float64)[:, :2] for ring in polygon if len(ring) >= 4] for polygon in parts]
+
+
+def _centroid(polygons):
+    """Centroid of the largest outer ring (planar lon/lat, good enough for labels)."""
+    best = None
+    for polygon in polygons:
+        x, y = polygon[0][:, 0], polygon[0][:, 1]
+        cross = x[:-1] * y[1:] - x[1:] * y[:-1]
+        area = cross.sum() / 2
+        if best is None or abs(area) > abs(best[0]):
+            best = (area, x, y, cross)
+    area, x, y, cross = best
+    if area == 0:
+        return float(y.mean()), float(x.mean())
+    return float(((y[:-1] + y[1:]) * cross).sum() / (6 * area)), float(((x[:-1] + x[1:]) * cross).sum() / (6 * area))
+
+
+def simplify_ring(points, tolerance):
+    """Douglas-Peucker simplification of a closed ring; None if it collapses."""
+    n = len(points)
+    if n <= 4:
+        return points
+    keep = np.zeros(n, dtype=bool)
+    keep[0] = keep[-1] = True
+    stack = [(0, n - 1)]
+    while stack:
+        start, end = stack.pop()
+        if end <= start + 1:
+            continue
+        a, b = points[start], points[end]
+        segment = points[start + 1:end]
+        ab = b - a
+        length = np.hypot(*ab)
+        if length == 0:
+            dist = np.hypot(*(segment - a).T)
+        else:
+            dist = np.abs(ab[0] * (segment[:, 1] - a[1]) - ab[1] * (segment[:, 0] - a[0])) / length
+        i = int(np.argmax(dist))
+        if dist[i] > tolerance:
+            keep[start + 1 + i] = True
+            stack.append((start, start + 1 + i))
+            stack.append((start + 1 + i, end))
+    simplified = points[keep]
+    return simplified if len(simplified) >= 4 else None
+
+
+def simplify_polygons(polygons, tolerance, decimals):
+    """GeoJSON MultiPolygon coordinates; an outer ring that collapses keeps a triangle."""
+    result = []
+    for polygon in polygons:
+        outer = simplify_ring(polygon[0], tolerance)
+        if outer is None:
+            ring = polygon[0]
+            outer = ring[[0, len(ring) // 3, 2 * len(ring) // 3, 0]]
+        rings = [outer] + [r for r in (simplify_ring(h, tolerance) for h in polygon[1:]) if r is not None]
+        result.append([np.round(r, decimals).tolist() for r in rings])
+    return result
+
+
+def rasterize(regions, cell_deg):
+    """
+    (rows, cols) int16 grid of region ids. Each grid row's centre latitude is
+    intersected with every edge of a polygon (holes included, even-odd rule)
+    and the cells whose centres fall between crossing pairs are filled.
+    """
+    rows, cols = int(round(180 / cell_deg)), int(round(360 / cell_deg))
+    grid = np.full((rows, cols), -1, dtype=np.int16)
+    centre_lats = 90 - (np.arange(rows) + 0.5) * cell_deg
+
+    for region_id, polygons in enumerate(regions):
+        filled = False
+        for polygon in polygons:
+            edges = np.concatenate([np.hstack([ring[:-1], ring[1:]]) for ring in polygon])
+            x0, y0, x1, y1 = edges.T
+            lo, hi = min(y0.min(), y1.min()), max(y0.max(), y1.max())
+            first = max(int(np.ceil((90 - hi) / cell_deg - 0.5)), 0)
+            last = min(int(np.floor((90 - lo) / cell_deg - 0.5)), rows - 1)
+            for row in range(first, last + 1):
+                lat = centre_lats[row]
+                crossing = (y0 <= lat) != (y1 <= lat)
+                if not crossing.any():
+                    continue
+                xs = np.sort(x0[crossing] + (lat - y0[crossing]) * (x1[crossing] - x0[crossing])
+                             / (y1[crossing] - y0[crossing]))
+                starts = np.ceil((xs[0::2] + 180) / cell_deg - 0.5).astype(np.int64)
+                ends = np.ceil((xs[1::2] + 180) / cell_deg - 0.5).astype(np.int64)
+                for start, end in zip(np.clip(starts, 0, cols), np.clip(ends, 0, cols)):
+                    if end > start:
+                        grid[row, start:end] = region_id
+                        filled = True
+        if not filled and polygons:
+            # Smaller than a cell: claim the cell under the centroid if it is free
+            lat, lon = _centroid(polygons)
+            row = min(int((90 - lat) / cell_deg), rows - 1)
+            col = min(int((lon + 180) / cell_deg), cols - 1)
+            if grid[row, col] == -1:
+                grid[row, col] = region_id
+    return grid
+
+
+def _load_source(level, scale, source_dir):
+    """Natural Earth GeoJSON from source_dir, downloaded into it first if missing."""
+    path = SOURCES[level].format(scale=scale)
+    local = os.path.join(source_dir, os.path.basename(path))
+    if not os.path.exists(local):
+        import requests
+        url = f"{NATURAL_EARTH_URL}/{path}"
+        print(f"Downloading {url}")
+        response = requests.get(url, timeout=120)
+        response.raise_for_status()
+        os.makedirs(source_dir, exist_ok=True)
+        with open(local + ".tmp", 'wb') as f:
+            f.write(response.content)
+        os.replace(local + ".tmp", local)
+    with open(local) as f:
+        return json.load(f)
+
+
+def build(directory=REGIONS_DIR, scale="50m", cell_deg=REGION_CELL_DEG, source_dir=None):
+    source_dir = source_dir or os.path.join(directory, "source")
+    os.makedirs(os.path.join(directory, "geometry"), exist_ok=True)
+    metadata = {
+        "built_at": datetime.now().isoformat(timespec="seconds"),
+        "scale": scale,
+        "cell_deg": cell_deg,
+        "levels": {}
+    }
+    country_codes = {}
+
+    for level in LEVELS:
+        features = _load_source(level, scale, source_dir)["features"]
+        regions, entries = [], []
+        for feature in features:
+            polygons = _polygons(feature.get("geometry"))
+            if not polygons:
+                continue
+            props = feature.get("properties") or {}
+            lat, lon = _centroid(polygons)
+            entry = {"id": len(entries), "lat": round(lat, 4), "lon": round(lon, 4)}
+            if level == "country":
+                entry["name"] = _prop(props, "NAME_LONG", "NAME", "ADMIN")
+                entry["iso"] = _prop(props, "ISO_A3", "ADM0_A3")
+                country_codes[_prop(props, "ADM0_A3", "ISO_A3")] = entry["id"]
+            else:
+                entry["name"] = _prop(props, "name", "name_en", "gn_name")
+                entry["iso"] = _prop(props, "iso_3166_2")
+                entry["country"] = _prop(props, "admin", "adm0_name")
+                entry["country_id"] = country_codes.get(_prop(props, "adm0_a3", "sov_a3"))
+            regions.append(polygons)
+            entries.append(entry)
+
+        grid = rasterize(regions, cell_deg)
+        # Mostly long runs of one id, so it compresses to a small fraction
+        np.savez_compressed(os.path.join(directory, f"{level}_index.npz"), grid=grid)
+        for detail, (tolerance, decimals) in DETAILS.items():
+            collection = {"type": "FeatureCollection", "features": [
+                {
+                    "type": "Feature",
+                    "properties": {k: entry[k] for k in ("id", "name", "iso", "country") if k in entry},
+                    "geometry": {"type": "MultiPolygon",
+                                 "coordinates": simplify_polygons(polygons, tolerance, decimals)}
+                }
+                for entry, polygons in zip(entries, regions)
+            ]}
+            with open(os.path.join(directory, "geometry", f"{level}_{detail}.json"), 'w') as f:
+                json.dump(collection, f, separators=(",", ":"))
+        metadata["levels"][level] = entries
+        print(f"{level}: {len(entries)} regions, {int((grid >= 0).sum())} cells")
+
+    with open(os.path.join(directory, "regions.json"), 'w') as f:
+        json.dump(metadata, f)
+    print(f"Region index saved to {directory}")
+
+
+# Lookups
+
+class RegionIndex:
+    def __init__(self, directory=REGIONS_DIR):
+        self.directory = directory
+        self.metadata = None
+        self.grids = {}
+        self._geometry = {}
+        self._lock = threading.Lock()
+        self._loaded = False
+        self.building = False
+        self.build_error = None
+
+    def _load(self):
+        with self._lock:
+            if self._loaded:
+                return
+            self._loaded = True
+            path = os.path.join(self.directory, "regions.json")
+            if not os.path.exists(path):
+                return
+            with open(path) as f:
+                self.metadata = json.load(f)
+            for level in self.metadata["levels"]:
+                path = os.path.join(self.directory, f"{level}_index.npz")
+                if os.path.exists(path):
+                    with np.load(path) as data:
+                        self.grids[level] = data["grid"]
+                else:
+                    # Index built before it was stored compressed
+                    self.grids[level] = np.load(os.path.join(self.directory, f"{level}_index.npy"), mmap_mode='r')
+            print(f"Region index loaded ({', '.join(self.grids)}, {self.metadata['cell_deg']} deg cells)")
+
+    def ensure_built(self, auto_build=REGIONS_AUTO_BUILD):
+        """Build the index in a background thread if it is missing. Returns the thread, if any."""
+        if not auto_build or os.path.exists(os.path.join(self.directory, "regions.json")):
+            return None
+        self.building = True
+
+        def run():
+            try:
+                build(self.directory)
+            except Exception as e:
+                self.build_error = str(e)
+                print(f"Region build failed: {e}")
+            with self._lock:
+                self._loaded = False  # pick the new files up on next use
+                self._geometry = {}
+            self.building = False
+
+        thread = threading.Thread(target=run, name="region-build", daemon=True)
+        thread.start()
+        return thread
+
+    @property
+    def available(self):
+        self._load()
+        return self.metadata is not None
+
+    @property
+    def version(self):
+        self._load()
+        return self.metadata["built_at"] if self.metadata else None
+
+    def regions(self, level):
+        self._load()
+        return self.metadata["levels"][level]
+
+    def lookup(self, lats, lons, level="country", nearest_deg=0):
+        """
+        Region id per point (-1 outside every region). With nearest_deg, points
+        outside every region take the region of the closest grid cell within
+        that many degrees.
+        """
+        self._load()
+        grid = self.grids[level]
+        cell = self.metadata["cell_deg"]
+        lats = np.asarray(lats, dtype=np.float64)
+        lons = (np.asarray(lons, dtype=np.float64) + 180) % 360 - 180
+        rows = np.clip(((90 - lats) / cell).astype(np.int64), 0, grid.shape[0] - 1)
+        cols = np.clip(((lons + 180) / cell).astype(np.int64), 0, grid.shape[1] - 1)
+        ids = np.array(grid[rows, cols])
+
+        missing = np.flatnonzero(ids < 0)
+        reach = int(np.ceil(nearest_deg / cell))
+        if reach and len(missing):
+            d_rows, d_cols = (d.ravel() for d in np.mgrid[-reach:reach + 1, -reach:reach + 1])
+            dist = d_rows ** 2 + d_cols ** 2
+            order = np.argsort(dist, kind="stable")
+            for d_row, d_col in zip(d_rows[order], d_cols[order]):
+                if d_row ** 2 + d_col ** 2 > reach ** 2:
+                    break
+                found = np.asarray(grid[np.clip(rows[missing] + d_row, 0, grid.shape[0] - 1),
+                                        (cols[missing] + d_col) % grid.shape[1]])
+                hit = found >= 0
+                ids[missing[hit]] = found[hit]
+                missing = missing[~hit]
+                if not len(missing):
+                    break
+        return ids
+
+    def has_geometry(self, level, detail):
+        return os.path.exists(os.path.join(self.directory, "geometry", f"{level}_{detail}.json"))
+
+    def geometry(self, level, detail="medium"):
+        """Simplified GeoJSON FeatureCollection (parsed once and kept in memory)."""
+        self._load()
+        key = (level, detail)
+        if key not in self._geometry:
+            with open(os.path.join(self.directory, "geometry", f"{level}_{detail}.json")) as f:
+                self._geometry[key] = json.load(f)
+        return self._geometry[key]
+
+
+def _risk_level(prob):
+    if prob > 0.8: return "Extreme"
+    if prob > 0.6: return "High"
+    if prob > 0.4: return "Medium"
+    return "Low"
+
+
+def aggregate(index, level, rollups, points, fire_lats, fire_lons, fire_frp, risk_levels,
+              nearest_deg=REGION_NEAREST_DEG):
+    """
+    Per-region prediction and hotspot totals. `rollups` is a history roll-up
+    table grouped by cell (only the cell centre is known, so it is looked up),
+    `points` are raw predictions (lat, lon, prob, risk) located exactly, and
+    fires are points. Only regions with data are returned.
+    """
+    n = len(index.regions(level))
+    cell_lats, cell_lons = geohash.decode(rollups["cell"])
+    pred_ids = np.concatenate([index.lookup(cell_lats, cell_lons, level, nearest_deg),
+                               index.lookup(points["lat"], points["lon"], level, nearest_deg)])
+    counts = np.concatenate([rollups["count"], np.ones(len(points["lat"]), dtype=np.int64)])
+    prob_sums = np.concatenate([rollups["prob_sum"], points["prob"]])
+    risk_rows = np.concatenate([rollups["risk"], points["risk"]])
+    valid = pred_ids >= 0
+    pred_ids = pred_ids[valid]
+    pred_count = np.bincount(pred_ids, weights=counts[valid], minlength=n)
+    prob_sum = np.bincount(pred_ids, weights=prob_sums[valid], minlength=n)
+    risk = np.zeros((n, len(risk_levels)), dtype=np.int64)
+    np.add.at(risk, pred_ids, risk_rows[valid])
+
+    fire_ids = index.lookup(fire_lats, fire_lons, level, nearest_deg)
+    on_land = fire_ids >= 0
+    fire_count = np.bincount(fire_ids[on_land], minlength=n)
+    frp_sum = np.bincount(fire_ids[on_land], weights=np.nan_to_num(fire_frp[on_land]), minlength=n)
+
+    rows = []
+    meta = index.regions(level)
+    for region_id in np.flatnonzero((pred_count > 0) | (fire_count > 0)).tolist():
+        entry = meta[region_id]
+        mean_prob = prob_sum[region_id] / pred_count[region_id] if pred_count[region_id] else None
+        row = {"id": region_id, "name": entry["name"], "iso": entry["iso"]}
+        if level == "state":
+            row["country"] = entry.get("country")
+        row.update(
+            predictions=int(pred_count[region_id]),
+            mean_prob=round(float(mean_prob), 4) if mean_prob is not None else None,
+            risk_level=_risk_level(mean_prob) if mean_prob is not None else None,
+            risk_counts=dict(zip(risk_levels, risk[region_id].tolist())),
+            active_fires=int(fire_count[region_id]),
+            total_frp=round(float(frp_sum[region_id]), 1)
+        )
+        rows.append(row)
+    return rows
+
+
+index = RegionIndex()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build the country/state region index")
+    parser.add_argument("command", choices=["build"])
+    parser.add_argument("--scale", choices=["10m", "50m", "110m"], default="50m",
+                        help="Natural Earth scale used for the index (geometry is simplified separately)")
+    parser.add_argument("--cell-deg", type=float, default=REGION_CELL_DEG)
+    parser.add_argument("--source-dir", help="Read already downloaded Natural Earth GeoJSON files from here")
+    parser.add_argument("--output", default=REGIONS_DIR)
+    args = parser.parse_args()
+    try:
+        build(args.output, scale=args.scale, cell_deg=args.cell_deg, source_dir=args.source_dir)
+    except Exception as e:
+        print(f"Region build failed: {e}")
+        sys.exit(1)
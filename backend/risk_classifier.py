@@ -0,0 +1,99 @@
+"""
+Shared caption risk classifier used by the BLIP and Gemini vision services and the
+dataset analysis scripts.
+
+All keywords are compiled into one word-boundary regex (longest phrase first, with
+optional plural "s"/"es"), so "forest fire" is matched as a phrase and "fireplace"
+does not match "fire". Each keyword has a weight; the summed weight of the distinct
+keywords found in a caption gives a graded risk level.
+
+Batches are scored with a single regex pass over the joined captions, and
+matches are mapped back to their captions with np.searchsorted instead of
+running the regex once per caption.
+"""
+import re
+
+import numpy as np
+
+DEFAULT_KEYWORD_WEIGHTS = {
+    "wildfire": 1.0,
+    "forest fire": 1.0,
+    "fire": 0.8,
+    "flame": 0.8,
+    "burning": 0.7,
+    "smoke": 0.6,
+    "ember": 0.4,
+    "ash": 0.3,
+}
+
+# (minimum score, level), highest first
+DEFAULT_RISK_THRESHOLDS = [(1.5, "Extreme"), (0.6, "High"), (0.3, "Medium")]
+
+
+class KeywordRiskClassifier:
+    def __init__(self, keyword_weights=None, thresholds=None):
+        self.keyword_weights = dict(keyword_weights or DEFAULT_KEYWORD_WEIGHTS)
+        self.thresholds = sorted(thresholds or DEFAULT_RISK_THRESHOLDS, reverse=True)
+        self.keywords = sorted(self.keyword_weights, key=len, reverse=True)
+        self._index = {k: i for i, k in enumerate(self.keywords)}
+        self._weights = np.array([self.keyword_weights[k] for k in self.keywords])
+        alternation = "|".join(re.escape(k).replace(r"\ ", r"\s+") for k in self.keywords)
+        self._pattern = re.compile(rf"\b({alternation})(?:e?s)?\b", re.IGNORECASE)
+
+    def risk_level(self, score):
+        for min_score, level in self.thresholds:
+            if score >= min_score:
+                return level
+        return "Low"
+
+    def _keyword_of(self, match):
+        return self._index[re.sub(r"\s+", " ", match.lower())]
+
+    def hit_matrix(self, captions):
+        """Boolean (n_captions, n_keywords) matrix of keywords found in each caption."""
+        hits = np.zeros((len(captions), len(self.keywords)), dtype=bool)
+        if not captions:
+            return hits
+        # Newlines are replaced so one caption's match can never run into the next
+        texts = [(c or "").replace("\n", " ") for c in captions]
+        ends = np.cumsum([len(t) + 1 for t in texts])
+        joined = "\n".join(texts)
+
+        positions, keyword_ids = [], []
+        for m in self._pattern.finditer(joined):
+            positions.append(m.start())
+            keyword_ids.append(self._keyword_of(m.group(1)))
+        if positions:
+            caption_ids = np.searchsorted(ends, np.asarray(positions), side="right")
+            hits[caption_ids, np.asarray(keyword_ids)] = True
+        return hits
+
+    def classify_batch(self, captions):
+        """Score a batch of captions; returns one result dict per caption."""
+        hits = self.hit_matrix(captions)
+        scores = hits @ self._weights
+        results = []
+        for row, score in zip(hits, scores):
+            # Report keywords strongest first
+            found = sorted((self.keywords[i] for i in np.flatnonzero(row)),
+                           key=lambda k: -self.keyword_weights[k])
+            results.append({
+                "risk_level": self.risk_level(score),
+                "risk_score": round(float(score), 3),
+                "detected_keywords": found,
+            })
+        return results
+
+    def classify(self, caption):
+        return self.classify_batch([caption])[0]
+
+
+_default_classifier = KeywordRiskClassifier()
+
+
+def classify_caption(caption):
+    return _default_classifier.classify(caption)
+
+
+def classify_captions(captions):
+    return _default_classifier.classify_batch(captions)
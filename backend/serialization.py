@@ -0,0 +1,201 @@
+"""
+Response serialization with content negotiation, compression and ETags.
+
+- JSON is encoded with orjson when installed, falling back to the stdlib encoder.
+- `Accept: application/msgpack` returns MessagePack; `application/vnd.columnar+msgpack`
+  returns lists of records as columns ({"length": n, "columns": {field: [...]}}).
+  Both need the optional msgpack package.
+- Bodies of at least COMPRESS_MIN_BYTES are brotli (if installed) or gzip encoded,
+  depending on Accept-Encoding (q-values honoured, q=0 excludes a coding).
+- If the caller passes an ETag derived from a data version (e.g. the fire feed
+  version), a matching If-None-Match is answered with 304 before anything is
+  serialized, and encoded bodies are cached per (ETag, format, encoding).
+  Without one, the ETag is a hash of the serialized body.
+- ETags are strong, so each representation gets its own: the media type and the
+  content coding are part of the tag (e.g. "fires-12-200-json-gzip").
+"""
+import gzip
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+
+from fastapi import Response
+
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+try:
+    import msgpack
+    MSGPACK_AVAILABLE = True
+except ImportError:
+    MSGPACK_AVAILABLE = False
+
+try:
+    import brotli
+    BROTLI_AVAILABLE = True
+except ImportError:
+    BROTLI_AVAILABLE = False
+
+COMPRESS_MIN_BYTES = int(os.environ.get("COMPRESS_MIN_BYTES", "1024"))
+ENCODED_CACHE_SIZE = 32
+
+JSON = "application/json"
+MSGPACK = "application/msgpack"
+COLUMNAR = "application/vnd.columnar+msgpack"
+
+_encoded_cache = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def _default(obj):
+    # numpy scalars and arrays
+    if hasattr(obj, "tolist"):
+        return obj.tolist()
+    if hasattr(obj, "dict"):
+        return obj.dict()
+    raise TypeError(f"Type is not serializable: {type(obj)}")
+
+
+def to_columns(records):
+    """Turn a list of dicts into {"length": n, "columns": {field: [values]}}."""
+    fields = []
+    for record in records:
+        for key in record:
+            if key not in fields:
+                fields.append(key)
+    return {"length": len(records), "columns": {f: [r.get(f) for r in records] for f in fields}}
+
+
+def encode(payload, media_type=JSON):
+    if media_type == JSON:
+        if ORJSON_AVAILABLE:
+            return orjson.dumps(payload, default=_default, option=orjson.OPT_SERIALIZE_NUMPY)
+        return json.dumps(payload, default=_default, separators=(",", ":")).encode("utf-8")
+    if media_type == COLUMNAR and isinstance(payload, list):
+        payload = to_columns(payload)
+    return msgpack.packb(payload, default=_default, use_bin_type=True)
+
+
+def parse_qvalues(header):
+    """{value: q} for an Accept-style header; malformed q-values count as 0."""
+    values = {}
+    for item in (header or "").lower().split(","):
+        parts = [p.strip() for p in item.split(";")]
+        if not parts[0]:
+            continue
+        q = 1.0
+        for param in parts[1:]:
+            if param.startswith("q="):
+                try:
+                    q = float(param[2:])
+                except ValueError:
+                    q = 0.0
+        values[parts[0]] = max(q, values.get(parts[0], 0.0))
+    return values
+
+
+def negotiate_media_type(accept):
+    accepted = parse_qvalues(accept)
+    if MSGPACK_AVAILABLE:
+        if accepted.get(COLUMNAR, 0) > 0:
+            return COLUMNAR
+        if accepted.get(MSGPACK, 0) > 0 or accepted.get("application/x-msgpack", 0) > 0:
+            return MSGPACK
+    return JSON
+
+
+def negotiate_encoding(accept_encoding):
+    """The acceptable coding with the highest q-value (brotli first on ties), or None."""
+    accepted = parse_qvalues(accept_encoding)
+    wildcard = accepted.get("*", 0.0)
+    best, best_q = None, 0.0
+    for coding in (["br"] if BROTLI_AVAILABLE else []) + ["gzip"]:
+        q = accepted.get(coding, wildcard)
+        if q > best_q:
+            best, best_q = coding, q
+    return best
+
+
+def content_coding(body, encoding):
+    """The coding compress() will apply to body: None below COMPRESS_MIN_BYTES."""
+    return encoding if encoding is not None and len(body) >= COMPRESS_MIN_BYTES else None
+
+
+def compress(body, encoding):
+    if content_coding(body, encoding) is None:
+        return body, None
+    if encoding == "br":
+        return brotli.compress(body, quality=5), "br"
+    return gzip.compress(body, compresslevel=5), "gzip"
+
+
+def _etag_matches(if_none_match, etag):
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    candidates = [t.strip() for t in if_none_match.split(",")]
+    return etag in candidates or f"W/{etag}" in candidates
+
+
+def negotiated_response(request, payload, etag=None, status_code=200, max_age=0):
+    """
+    Build a Response for `payload` (a value or a zero-argument callable producing it)
+    honouring Accept, Accept-Encoding and If-None-Match.
+
+    `etag` should identify the data version; the media type and the negotiated
+    coding are added to it so each representation gets its own tag.
+    """
+    media_type = negotiate_media_type(request.headers.get("accept"))
+    encoding = negotiate_encoding(request.headers.get("accept-encoding"))
+    if_none_match = request.headers.get("if-none-match")
+    headers = {"Vary": "Accept, Accept-Encoding", "Cache-Control": f"max-age={max_age}, must-revalidate"}
+
+    cache_key = None
+    if etag is not None:
+        # Tagged with the negotiated coding even if the body turns out too small to
+        # compress: distinct tags for identical bytes are fine, shared ones are not
+        suffix = f"-{encoding}" if encoding else ""
+        tag = f'"{etag}-{media_type.rsplit("/", 1)[-1]}{suffix}"'
+        headers["ETag"] = tag
+        if _etag_matches(if_none_match, tag):
+            return Response(status_code=304, headers=headers)
+        cache_key = (tag, media_type, encoding)
+        with _cache_lock:
+            cached = _encoded_cache.get(cache_key)
+            if cached is not None:
+                _encoded_cache.move_to_end(cache_key)
+        if cached is not None:
+            body, content_encoding = cached
+            if content_encoding:
+                headers["Content-Encoding"] = content_encoding
+            return Response(content=body, status_code=status_code, media_type=media_type, headers=headers)
+
+    if callable(payload):
+        payload = payload()
+    body = encode(payload, media_type)
+
+    if etag is None:
+        coding = content_coding(body, encoding)
+        suffix = f"-{coding}" if coding else ""
+        tag = '"' + hashlib.blake2b(body, digest_size=16).hexdigest() + suffix + '"'
+        headers["ETag"] = tag
+        if _etag_matches(if_none_match, tag):
+            return Response(status_code=304, headers=headers)
+
+    body, content_encoding = compress(body, encoding)
+    if content_encoding:
+        headers["Content-Encoding"] = content_encoding
+
+    if cache_key is not None:
+        with _cache_lock:
+            _encoded_cache[cache_key] = (body, content_encoding)
+            while len(_encoded_cache) > ENCODED_CACHE_SIZE:
+                _encoded_cache.popitem(last=False)
+
+    return Response(content=body, status_code=status_code, media_type=media_type, headers=headers)
@@ -0,0 +1,70 @@
+"""
+Incremental fire event clustering must give the same events as clustering the
+same hotspots from scratch. Run with pytest or directly: python test_fire_events.py
+"""
+import random
+
+import fire_events
+import fire_feed
+
+
+def make_fire(rng, box_deg):
+    fire = {
+        "lat": round(rng.uniform(0, box_deg), 4),
+        "lon": round(rng.uniform(0, box_deg), 4),
+        "brightness": round(rng.uniform(300, 450), 1),
+        "acq_date": "2025-08-01",
+        "acq_time": str(rng.randint(0, 2359))
+    }
+    fire["id"] = fire_feed.fire_id(fire)
+    return fire
+
+
+def partition(clusterer):
+    """Events as sets of hotspot ids, plus the noise hotspots."""
+    events = {frozenset(members) for members in clusterer._members.values()}
+    noise = {fid for fid, label in clusterer._labels.items() if label < 0}
+    return events, noise
+
+
+def check_incremental_matches_full(seed, min_points, initial=300, box_deg=0.5, steps=10):
+    # Hotspots spread evenly enough that many are close to the core threshold, so
+    # small deltas flip core points and neighbours outside the changed area matter
+    rng = random.Random(seed)
+    fires = {f["id"]: f for f in (make_fire(rng, box_deg) for _ in range(initial))}
+    incremental = fire_events.FireEventClusterer(eps_km=3.0, min_points=min_points)
+    incremental.replace(list(fires.values()))
+    for _ in range(steps):
+        removed = [fid for fid in fires if rng.random() < 0.05]
+        added = [f for f in (make_fire(rng, box_deg) for _ in range(rng.randint(0, 5))) if f["id"] not in fires]
+        for fid in removed:
+            del fires[fid]
+        fires.update((f["id"], f) for f in added)
+        incremental.apply_delta({"added": added, "updated": [], "removed": removed})
+
+        full = fire_events.FireEventClusterer(eps_km=3.0, min_points=min_points)
+        full.replace(list(fires.values()))
+        assert partition(incremental) == partition(full), f"seed {seed}, min_points {min_points}"
+        assert incremental._counts == full._counts
+
+
+def test_incremental_matches_full_min_points_3():
+    for seed in range(100):
+        check_incremental_matches_full(seed, min_points=3)
+
+
+def test_incremental_matches_full_min_points_5():
+    for seed in range(100):
+        check_incremental_matches_full(seed, min_points=5, initial=400)
+
+
+def test_incremental_matches_full_min_points_1():
+    for seed in range(30):
+        check_incremental_matches_full(seed, min_points=1)
+
+
+if __name__ == "__main__":
+    test_incremental_matches_full_min_points_3()
+    test_incremental_matches_full_min_points_5()
+    test_incremental_matches_full_min_points_1()
+    print("Incremental clustering matches full re-clustering")
@@ -0,0 +1,90 @@
+"""
+Key rotation and circuit breaking of the Gemini client against an in-process mock
+server. Run with pytest or directly: python test_gemini_vision_service.py
+"""
+import asyncio
+import socket
+import time
+
+import gemini_vision_service as gvs
+import mock_gemini_server
+
+
+def serve_mock(**kwargs):
+    """Start the mock on a free port. Returns (app, server, thread, api_url)."""
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    app = mock_gemini_server.create_app(**kwargs)
+    server, thread = mock_gemini_server.start_in_thread(app, port)
+    return app, server, thread, f"http://127.0.0.1:{port}/v1beta/models/gemini-2.5-flash:generateContent"
+
+
+def stop_mock(server, thread):
+    server.should_exit = True
+    thread.join(timeout=5)
+
+
+def test_quota_rotation_is_not_a_retry():
+    app, server, thread, api_url = serve_mock(quota_per_minute=1, latency_ms=10)
+
+    async def run():
+        # No retries at all: rotating away from an exhausted key must still succeed
+        client = gvs.GeminiVisionClient(["key-a", "key-b"], api_url=api_url, max_retries=0)
+        try:
+            first = await client.generate_caption("aGVsbG8=")
+            second = await client.generate_caption("aGVsbG8=")
+            return first, second, client.keys[0].breaker.remaining(time.monotonic())
+        finally:
+            await client.aclose()
+
+    try:
+        (_, first_key), (_, second_key), key_a_wait = asyncio.run(run())
+    finally:
+        stop_mock(server, thread)
+    assert (first_key, second_key) == (0, 1)
+    assert app.state.stats == {"ok": 2, "quota": 1}
+    assert key_a_wait > 0  # key-a's breaker is open for the Retry-After period
+
+
+def test_breaker_allows_one_trial_after_cooldown():
+    # One success per key per second; a 429 carries Retry-After: 1
+    app, server, thread, api_url = serve_mock(quota_per_minute=1, latency_ms=50, window_seconds=1)
+
+    async def run():
+        client = gvs.GeminiVisionClient(["key-a"], api_url=api_url, max_retries=0)
+        breaker = client.keys[0].breaker
+        try:
+            await client.generate_caption("aGVsbG8=")
+            try:
+                # Quota hit: the breaker opens and this call gives up before the cooldown ends
+                await client.generate_caption("aGVsbG8=", max_wait=0.5)
+                raise AssertionError("expected a quota error")
+            except gvs.GeminiQuotaError:
+                pass
+            opened = breaker.remaining(time.monotonic()) > 0
+            sent_before = sum(app.state.stats.values())
+
+            # Concurrent calls wait out the cooldown; only one is sent as the half-open trial
+            results = await asyncio.gather(*(client.generate_caption("aGVsbG8=") for _ in range(3)),
+                                           return_exceptions=True)
+            sent = sum(app.state.stats.values()) - sent_before
+            return opened, results, sent, breaker.remaining(time.monotonic())
+        finally:
+            await client.aclose()
+
+    try:
+        opened, results, sent, wait_after = asyncio.run(run())
+    finally:
+        stop_mock(server, thread)
+    assert opened
+    assert sent == 1
+    assert sum(isinstance(r, tuple) for r in results) == 1
+    assert sum(isinstance(r, gvs.GeminiQuotaError) for r in results) == 2
+    assert wait_after == 0  # the successful trial closed the breaker
+
+
+if __name__ == "__main__":
+    test_quota_rotation_is_not_a_retry()
+    test_breaker_allows_one_trial_after_cooldown()
+    print("Gemini key rotation and circuit breaker behave as expected")
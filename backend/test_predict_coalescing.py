@@ -0,0 +1,78 @@
+"""
+Concurrent /predict requests are coalesced only when their inputs are identical.
+Run with pytest or directly: python test_predict_coalescing.py
+"""
+import os
+import tempfile
+import threading
+import time
+
+_workdir = tempfile.mkdtemp()
+os.environ.setdefault("FIRMS_REFRESH_SECONDS", "0")
+os.environ.setdefault("FIRMS_API_URL", "http://127.0.0.1:9")
+os.environ.setdefault("FIRE_ARCHIVE_ENABLED", "0")
+os.environ.setdefault("HISTORY_COMPACT_SECONDS", "0")
+os.environ["PREDICTION_HISTORY_FILE"] = os.path.join(_workdir, "history.json")
+os.environ["WATCHLIST_FILE"] = os.path.join(_workdir, "watchlist.json")
+
+from fastapi.testclient import TestClient
+
+import main
+
+
+def request(temperature):
+    return {
+        "lat": 34.05, "lon": -118.25, "temperature": temperature, "humidity": 20.0,
+        "wind_speed": 15.0, "rainfall": 0.0, "ndvi": 0.3, "elevation": 100.0
+    }
+
+
+def post_concurrently(client, payloads):
+    """POST payloads at once while history writes are slowed down. Returns (responses, logged entries)."""
+    logged = []
+    original = main.history.append
+
+    def slow_append(entry):
+        logged.append(entry)
+        time.sleep(0.3)  # keep the first flight open while the others arrive
+
+    main.history.append = slow_append
+    responses = [None] * len(payloads)
+
+    def post(i):
+        responses[i] = client.post("/predict", json=payloads[i])
+
+    try:
+        threads = [threading.Thread(target=post, args=(i,)) for i in range(len(payloads))]
+        for thread in threads:
+            thread.start()
+            time.sleep(0.05)
+        for thread in threads:
+            thread.join()
+    finally:
+        main.history.append = original
+    return responses, logged
+
+
+def test_near_identical_requests_are_each_logged():
+    client = TestClient(main.app)
+    # Both temperatures round to the same prediction cache key
+    responses, logged = post_concurrently(client, [request(30.01), request(30.04)])
+    assert all(r.status_code == 200 for r in responses)
+    assert sorted(e["inputs"]["temperature"] for e in logged) == [30.01, 30.04]
+
+
+def test_identical_requests_share_one_scoring():
+    client = TestClient(main.app)
+    coalesced = main.prediction_cache.flights.coalesced
+    responses, logged = post_concurrently(client, [request(31.0), request(31.0)])
+    assert all(r.status_code == 200 for r in responses)
+    assert len(logged) == 1
+    assert responses[0].json() == responses[1].json()
+    assert main.prediction_cache.flights.coalesced == coalesced + 1
+
+
+if __name__ == "__main__":
+    test_near_identical_requests_are_each_logged()
+    test_identical_requests_share_one_scoring()
+    print("Only identical /predict requests are coalesced")
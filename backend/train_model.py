@@ -5,10 +5,13 @@ from sklearn.model_selection import train_test_split
 from sklearn.metrics import accuracy_score, classification_report
 import json
 import os
+import sys
+
+import drift
 
 # 1. Generate Synthetic Data
 # We simulate environmental factors and their correlation with fire risk.
-def generate_synthetic_data(n_samples=5000):
+def generate_synthetic_data(n_samples=5000, with_proximity=False):
     np.random.seed(42)
     
     # Features
@@ -44,6 +47,16 @@ def generate_synthetic_data(n_samples=5000):
     # Add some noise
     risk_score += np.random.normal(0, 0.05, n_samples)
     
+    # Active-fire proximity (same meaning as fire_index.proximity_features)
+    # Drawn from a separate generator so the base features are unchanged
+    if with_proximity:
+        prox_rng = np.random.default_rng(7)
+        nearest_fire_km = np.minimum(prox_rng.exponential(150, n_samples), 500)
+        fires_within_radius = prox_rng.poisson(np.maximum(0, 8 * (1 - nearest_fire_km / 50)))
+        # Being close to burning hotspots raises the chance of ignition/spread
+        risk_score += np.clip(1 - nearest_fire_km / 100, 0, 1) * 0.15
+        risk_score += np.minimum(fires_within_radius, 10) * 0.01
+    
     # Threshold for fire occurrence (simulating ground truth)
     fire_occurrence = (risk_score > 0.55).astype(int)
     
@@ -57,11 +70,15 @@ def generate_synthetic_data(n_samples=5000):
         'fire_occurrence': fire_occurrence
     })
     
+    if with_proximity:
+        df.insert(6, 'nearest_fire_km', nearest_fire_km)
+        df.insert(7, 'fires_within_radius', fires_within_radius)
+    
     return df
 
-def train_model():
+def train_model(with_proximity=False):
     print("Generating synthetic data...")
-    df = generate_synthetic_data()
+    df = generate_synthetic_data(with_proximity=with_proximity)
     
     X = df.drop('fire_occurrence', axis=1)
     y = df['fire_occurrence']
@@ -88,9 +105,14 @@ def train_model():
     print(classification_report(y_test, y_pred))
     
     # Save model
-    model_path = os.path.join(os.path.dirname(__file__), 'wildfire_model.json')
+    model_name = 'wildfire_model_proximity.json' if with_proximity else 'wildfire_model.json'
+    model_path = os.path.join(os.path.dirname(__file__), model_name)
     model.save_model(model_path)
     print(f"Model saved to {model_path}")
 
+    # Training input distribution, used by the API's /drift monitor
+    drift.save_reference_profile(X_train, model_path)
+
 if __name__ == "__main__":
-    train_model()
+    # --with-proximity trains the variant used when USE_PROXIMITY_MODEL=1
+    train_model(with_proximity="--with-proximity" in sys.argv)
@@ -0,0 +1,130 @@
+"""
+Execution policies for running several image-analysis backends on one request.
+
+- sequential: try backends in order, the next one only after the previous failed
+- hedged:     start the next backend if the running ones haven't answered within
+              `hedge_delay` seconds (or as soon as one fails)
+- race:       start every backend at once
+
+In every mode the first successful result wins, the remaining backends are
+cancelled and the whole request is bounded by `budget` seconds. Backends running
+in a worker thread (BLIP) cannot be interrupted; cancelling them only stops
+waiting for their result.
+"""
+import asyncio
+import os
+import time
+
+POLICIES = ("sequential", "hedged", "race")
+
+VISION_POLICY = os.environ.get("VISION_POLICY", "sequential")
+VISION_HEDGE_DELAY = float(os.environ.get("VISION_HEDGE_DELAY", "5"))
+VISION_LATENCY_BUDGET = float(os.environ.get("VISION_LATENCY_BUDGET", "45"))
+
+
+class VisionExecutionError(Exception):
+    def __init__(self, message, execution, budget_exceeded=False):
+        super().__init__(message)
+        self.execution = execution
+        self.budget_exceeded = budget_exceeded
+
+
+async def run_backends(backends, policy=None, budget=None, hedge_delay=None):
+    """
+    Run `backends`, an ordered list of (name, coroutine_factory) pairs, under the
+    given policy. Returns the winning result with an added "execution" entry that
+    records the policy, the backend that answered and per-backend timings.
+    """
+    policy = policy or VISION_POLICY
+    budget = VISION_LATENCY_BUDGET if budget is None else budget
+    hedge_delay = VISION_HEDGE_DELAY if hedge_delay is None else hedge_delay
+    if policy not in POLICIES:
+        raise ValueError(f"Unknown vision policy '{policy}'. Expected one of {', '.join(POLICIES)}")
+
+    loop = asyncio.get_running_loop()
+    start = loop.time()
+    deadline = start + budget
+    timings = {name: {"status": "not_started"} for name, _ in backends}
+    execution = {"policy": policy, "backend": None, "budget_s": budget, "timings": timings}
+
+    pending = {}
+    started_at = {}
+    next_index = 0
+
+    def launch():
+        nonlocal next_index
+        name, factory = backends[next_index]
+        next_index += 1
+        task = asyncio.ensure_future(factory())
+        pending[task] = name
+        started_at[name] = time.perf_counter()
+        timings[name]["status"] = "running"
+
+    def finish(name, status, error=None):
+        timings[name]["status"] = status
+        timings[name]["elapsed_ms"] = round((time.perf_counter() - started_at[name]) * 1000, 1)
+        if error is not None:
+            timings[name]["error"] = str(error)
+
+    async def cancel_pending():
+        for task, name in pending.items():
+            task.cancel()
+            finish(name, "cancelled")
+        await asyncio.gather(*pending, return_exceptions=True)
+        pending.clear()
+
+    launch()
+    if policy == "race":
+        while next_index < len(backends):
+            launch()
+    next_hedge = start + hedge_delay
+
+    try:
+        while pending or next_index < len(backends):
+            if not pending:
+                # Everything started so far failed; move on to the next backend
+                launch()
+                next_hedge = loop.time() + hedge_delay
+                continue
+
+            now = loop.time()
+            timeout = deadline - now
+            hedging = policy == "hedged" and next_index < len(backends)
+            if hedging:
+                timeout = min(timeout, next_hedge - now)
+
+            done, _ = await asyncio.wait(list(pending), timeout=max(0.0, timeout),
+                                         return_when=asyncio.FIRST_COMPLETED)
+            if not done:
+                if loop.time() >= deadline:
+                    break
+                # Hedge timer fired
+                launch()
+                next_hedge = loop.time() + hedge_delay
+                continue
+
+            for task in done:
+                name = pending.pop(task)
+                error = task.exception()
+                if error is None and execution["backend"] is None:
+                    finish(name, "ok")
+                    execution["backend"] = name
+                    result = dict(task.result())
+                elif error is not None:
+                    print(f"{name} analysis failed: {error}")
+                    finish(name, "error", error)
+                else:
+                    finish(name, "ok")
+
+            if execution["backend"] is not None:
+                await cancel_pending()
+                execution["total_ms"] = round((loop.time() - start) * 1000, 1)
+                result["execution"] = execution
+                return result
+    finally:
+        await cancel_pending()
+
+    execution["total_ms"] = round((loop.time() - start) * 1000, 1)
+    budget_exceeded = loop.time() >= deadline
+    reason = f"latency budget of {budget}s exceeded" if budget_exceeded else "all backends failed"
+    raise VisionExecutionError(f"Image analysis failed on all services ({reason})", execution, budget_exceeded)
@@ -0,0 +1,321 @@
+"""
+Watched locations that are re-scored whenever the model inputs change.
+
+Users register sites (lat/lon, optional fixed inputs, a probability threshold).
+Nobody polls them: a scheduler re-scores every site in one batch when
+
+- a FIRMS refresh changes the active fires (proximity inputs),
+- a new model version is loaded, or
+- the month changes (monthly raster normals),
+
+so the cost grows with the number of refreshes, not with users or sites polled.
+Bursts of triggers are coalesced into one run. When a site's probability moves
+across its threshold, an `alert` is pushed to the owner's stream subscribers.
+
+Raster-filled inputs only change with the month, so the site columns are
+resolved once per month (or when sites change). Each run is then one proximity
+query and one predict_proba call over all sites.
+Sites and their last scores are saved in WATCHLIST_FILE.
+"""
+import asyncio
+import json
+import os
+import threading
+import time
+import uuid
+from datetime import datetime
+
+import numpy as np
+
+import feature_store
+
+WATCHLIST_FILE = os.environ.get("WATCHLIST_FILE", os.path.join(os.path.dirname(__file__), 'watchlist.json'))
+WATCHLIST_MAX_SITES_PER_USER = int(os.environ.get("WATCHLIST_MAX_SITES_PER_USER", "100"))
+# Triggers arriving within this window (e.g. a refresh that also reloads the model) share one run
+WATCHLIST_DEBOUNCE_SECONDS = float(os.environ.get("WATCHLIST_DEBOUNCE_SECONDS", "1"))
+# While idle, how often to look for a new model file or month
+WATCHLIST_CHECK_SECONDS = float(os.environ.get("WATCHLIST_CHECK_SECONDS", "60"))
+SUBSCRIBER_QUEUE_SIZE = 64
+DEFAULT_THRESHOLD = 0.6
+
+
+def _risk_level(prob):
+    if prob > 0.8: return "Extreme"
+    if prob > 0.6: return "High"
+    if prob > 0.4: return "Medium"
+    return "Low"
+
+
+class Watchlist:
+    def __init__(self, path=WATCHLIST_FILE, scorer=None):
+        """
+        scorer(lats, lons, columns) -> (probabilities, model_version) scores a batch
+        with the active model; `columns` maps each model feature to an array.
+        """
+        self.path = path
+        self.scorer = scorer
+        self._sites = {}  # id -> site dict (definition plus last score)
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()
+        self._columns = None  # (sites version, month, ids, lats, lons, columns, thresholds)
+        self._version = 0
+        self._pending = set()
+        self._loop = None
+        self._wake = None
+        self._subscribers = set()  # (loop, queue, username)
+        self.alert_seq = 0
+        self.runs = 0
+        self.last_run = None
+        self._load()
+
+    # --- sites -------------------------------------------------------------
+
+    def _load(self):
+        try:
+            with open(self.path) as f:
+                data = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return
+        self._sites = {site["id"]: site for site in data.get("sites", [])}
+        self.alert_seq = data.get("alert_seq", 0)
+
+    def _save(self):
+        with self._save_lock:
+            with self._lock:
+                data = {"alert_seq": self.alert_seq, "sites": [dict(s) for s in self._sites.values()]}
+            tmp = self.path + ".tmp"
+            with open(tmp, 'w') as f:
+                json.dump(data, f)
+            os.replace(tmp, self.path)
+
+    def sites(self, username=None):
+        with self._lock:
+            return [dict(s) for s in self._sites.values() if username is None or s["username"] == username]
+
+    def add(self, username, lat, lon, name=None, threshold=DEFAULT_THRESHOLD, inputs=None):
+        """Register a site and score it right away (without an alert). Returns the site."""
+        with self._lock:
+            owned = sum(1 for s in self._sites.values() if s["username"] == username)
+            if owned >= WATCHLIST_MAX_SITES_PER_USER:
+                raise ValueError(f"At most {WATCHLIST_MAX_SITES_PER_USER} watched sites per user")
+            site = {
+                "id": uuid.uuid4().hex[:12],
+                "username": username,
+                "name": name or f"{lat:.3f}, {lon:.3f}",
+                "lat": lat,
+                "lon": lon,
+                "threshold": threshold,
+                "inputs": {k: v for k, v in (inputs or {}).items() if v is not None},
+                "created_at": datetime.now().isoformat(),
+                "prob": None,
+                "risk": None,
+                "above": None,
+                "scored_at": None,
+                "model_version": None
+            }
+            self._sites[site["id"]] = site
+            self._version += 1
+        self.rescore(["added"], site_ids=[site["id"]], notify=False)
+        return self.sites_by_id([site["id"]])[0]
+
+    def sites_by_id(self, ids):
+        with self._lock:
+            return [dict(self._sites[i]) for i in ids if i in self._sites]
+
+    def remove(self, site_id, username):
+        with self._lock:
+            site = self._sites.get(site_id)
+            if site is None or site["username"] != username:
+                return False
+            del self._sites[site_id]
+            self._version += 1
+        self._save()
+        return True
+
+    def _site_columns(self, month):
+        """Columnar site data, raster gaps filled for `month`; rebuilt only when sites or month change."""
+        with self._lock:
+            cached = self._columns
+            if cached is not None and cached[0] == self._version and cached[1] == month:
+                return cached[2:]
+            version = self._version
+            sites = list(self._sites.values())
+        ids = [s["id"] for s in sites]
+        lats = np.array([s["lat"] for s in sites], dtype=np.float64)
+        lons = np.array([s["lon"] for s in sites], dtype=np.float64)
+        columns = {
+            name: np.array([s["inputs"].get(name, np.nan) for s in sites], dtype=np.float64)
+            for name in feature_store.FEATURES
+        }
+        missing = [name for name, values in columns.items() if np.isnan(values).any()]
+        if missing and sites:
+            looked_up = feature_store.get_store().lookup(lats, lons, months=month, features=missing)
+            for name, values in looked_up.items():
+                columns[name] = np.where(np.isnan(columns[name]), values, columns[name])
+        thresholds = np.array([s["threshold"] for s in sites], dtype=np.float64)
+        with self._lock:
+            self._columns = (version, month, ids, lats, lons, columns, thresholds)
+        return ids, lats, lons, columns, thresholds
+
+    # --- scoring -----------------------------------------------------------
+
+    def rescore(self, reasons, site_ids=None, notify=True):
+        """Score all sites (or site_ids) in one batch and publish threshold crossings."""
+        started = time.perf_counter()
+        month = datetime.now().month - 1
+        ids, lats, lons, columns, thresholds = self._site_columns(month)
+        if site_ids is not None:
+            wanted = set(site_ids)
+            rows = np.array([i for i, site_id in enumerate(ids) if site_id in wanted], dtype=np.int64)
+            ids = [ids[i] for i in rows]
+            lats, lons, thresholds = lats[rows], lons[rows], thresholds[rows]
+            columns = {name: values[rows] for name, values in columns.items()}
+
+        # Sites whose inputs can't be resolved (no raster coverage) are left unscored
+        resolved = ~np.isnan(np.column_stack([columns[n] for n in feature_store.FEATURES])).any(axis=1)
+        probs = np.full(len(ids), np.nan)
+        version = None
+        if resolved.any():
+            scored, version = self.scorer(lats[resolved], lons[resolved],
+                                          {name: values[resolved] for name, values in columns.items()})
+            probs[resolved] = scored
+
+        now = datetime.now().isoformat()
+        alerts = []
+        with self._lock:
+            for site_id, prob, threshold in zip(ids, probs.tolist(), thresholds.tolist()):
+                site = self._sites.get(site_id)
+                if site is None or prob != prob:  # removed meanwhile, or unresolved (NaN)
+                    continue
+                above = prob >= threshold
+                previous = site["prob"]
+                if notify and above != bool(site["above"]) and (site["above"] is not None or above):
+                    self.alert_seq += 1
+                    alerts.append({
+                        "seq": self.alert_seq,
+                        "site_id": site_id,
+                        "username": site["username"],
+                        "name": site["name"],
+                        "lat": site["lat"],
+                        "lon": site["lon"],
+                        "direction": "above" if above else "below",
+                        "threshold": threshold,
+                        "prob": round(prob, 4),
+                        "previous_prob": round(previous, 4) if previous is not None else None,
+                        "risk": _risk_level(prob),
+                        "reasons": reasons,
+                        "model_version": version,
+                        "at": now
+                    })
+                site.update(prob=round(prob, 4), risk=_risk_level(prob), above=above,
+                            scored_at=now, model_version=version)
+
+        if ids:
+            self._save()
+        for alert in alerts:
+            self._publish(alert)
+        summary = {
+            "reasons": reasons,
+            "sites": len(ids),
+            "scored": int(resolved.sum()),
+            "alerts": len(alerts),
+            "model_version": version,
+            "elapsed_ms": round((time.perf_counter() - started) * 1000, 2),
+            "at": now
+        }
+        if site_ids is None:
+            self.runs += 1
+            self.last_run = summary
+        return summary
+
+    # --- scheduling --------------------------------------------------------
+
+    def request_rescore(self, reason):
+        """Ask the scheduler for a run; safe to call from any thread (feed/model listeners)."""
+        with self._lock:
+            self._pending.add(reason)
+        loop, wake = self._loop, self._wake
+        if loop is not None:
+            try:
+                loop.call_soon_threadsafe(wake.set)
+            except RuntimeError:
+                pass  # Event loop already closed
+
+    async def run_scheduler(self, check=None, interval=WATCHLIST_CHECK_SECONDS):
+        """
+        Run rescoring whenever request_rescore was called. `check()` is called while
+        idle (e.g. to let the model handle notice a new file) and the month is
+        watched, so inputs that change without an event still trigger a run.
+        """
+        self._loop = asyncio.get_running_loop()
+        self._wake = asyncio.Event()
+        month = datetime.now().month
+        self.request_rescore("startup")
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=interval)
+            except asyncio.TimeoutError:
+                if check is not None:
+                    await asyncio.to_thread(check)
+                if datetime.now().month != month:
+                    month = datetime.now().month
+                    self.request_rescore("month")
+                continue
+            self._wake.clear()
+            await asyncio.sleep(WATCHLIST_DEBOUNCE_SECONDS)
+            self._wake.clear()
+            with self._lock:
+                reasons, self._pending = sorted(self._pending), set()
+            if not reasons or not self._sites:
+                continue
+            try:
+                summary = await asyncio.to_thread(self.rescore, reasons)
+                print(f"Watchlist rescored {summary['sites']} sites ({', '.join(reasons)}) "
+                      f"in {summary['elapsed_ms']} ms, {summary['alerts']} alerts")
+            except Exception as e:
+                print(f"Watchlist rescore failed: {e}")
+
+    # --- streaming ---------------------------------------------------------
+
+    def subscribe(self, username):
+        queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        self._subscribers.add((asyncio.get_running_loop(), queue, username))
+        return queue
+
+    def unsubscribe(self, queue):
+        self._subscribers = {s for s in self._subscribers if s[1] is not queue}
+
+    def _publish(self, alert):
+        for loop, queue, username in list(self._subscribers):
+            if username != alert["username"]:
+                continue
+            try:
+                loop.call_soon_threadsafe(self._enqueue, queue, alert)
+            except RuntimeError:
+                self.unsubscribe(queue)  # Event loop already closed
+
+    @staticmethod
+    def _enqueue(queue, alert):
+        if queue.full():
+            # Slow consumer: drop its backlog and ask it to resync from a snapshot
+            while not queue.empty():
+                queue.get_nowait()
+            queue.put_nowait({"resync": True})
+        else:
+            queue.put_nowait(alert)
+
+    def stats(self):
+        with self._lock:
+            users = {s["username"] for s in self._sites.values()}
+            return {
+                "sites": len(self._sites),
+                "users": len(users),
+                "subscribers": len(self._subscribers),
+                "runs": self.runs,
+                "alerts": self.alert_seq,
+                "pending": sorted(self._pending),
+                "last_run": self.last_run
+            }
+
+
+scheduler = Watchlist()
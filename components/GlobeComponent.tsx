@@ -1,6 +1,7 @@
 import React, { useEffect, useRef, useState, useMemo } from 'react';
 import Globe, { GlobeMethods } from 'react-globe.gl';
-import { ActiveFire, AnalyzedHotspot, RiskLevel } from '../types';
+import { ActiveFire, AnalyzedHotspot, RegionRisk, RiskLevel } from '../types';
+import { fetchRegionGeometry, fetchRegionalRisk } from '../services/regionService';
 
 interface GlobeComponentProps {
   allActiveFires: ActiveFire[];
@@ -32,6 +33,7 @@ const GlobeComponent: React.FC<GlobeComponentProps> = ({
   const [dimensions, setDimensions] = useState({ width: 0, height: 0 });
   const [countries, setCountries] = useState({ features: [] });
   const [states, setStates] = useState({ features: [] });
+  const [regionRisk, setRegionRisk] = useState<Map<number, RegionRisk>>(new Map());
 
   useEffect(() => {
     const updateDimensions = () => {
@@ -47,18 +49,36 @@ const GlobeComponent: React.FC<GlobeComponentProps> = ({
     const observer = new ResizeObserver(updateDimensions);
     if (containerRef.current) observer.observe(containerRef.current);
     
-    // Load Global Data
+    // Load Global Data (tagged by level: backend and Natural Earth properties differ)
+    const tag = (data: any, level: string) => {
+        data.features.forEach((f: any) => { f.properties.level = level; });
+        return data;
+    };
     Promise.all([
-        fetch('https://raw.githubusercontent.com/martynafford/natural-earth-geojson/master/110m/cultural/ne_110m_admin_0_countries.json').then(r => r.json()),
-        fetch('https://raw.githubusercontent.com/martynafford/natural-earth-geojson/master/110m/cultural/ne_110m_admin_1_states_provinces.json').then(r => r.json())
+        fetchRegionGeometry('country'),
+        fetchRegionGeometry('state')
     ]).then(([countryData, stateData]) => {
-        setCountries(countryData);
-        setStates(stateData);
+        setCountries(tag(countryData, 'country'));
+        setStates(tag(stateData, 'state'));
     }).catch(err => console.error("Failed to load map data:", err));
 
-    return () => observer.disconnect();
+    // Country choropleth from the backend's per-region aggregates
+    const loadRisk = () => fetchRegionalRisk('country').then(setRegionRisk);
+    loadRisk();
+    const riskTimer = setInterval(loadRisk, 5 * 60 * 1000);
+
+    return () => {
+        observer.disconnect();
+        clearInterval(riskTimer);
+    };
   }, []);
 
+  const getRegionColor = (d: any) => {
+      if (d.properties.level !== 'country' || d.properties.id === undefined) return 'rgba(0,0,0,0)';
+      const risk = regionRisk.get(d.properties.id);
+      return risk?.risk_level ? `${getRiskColor(risk.risk_level)}40` : 'rgba(0,0,0,0)';
+  };
+
   // Helper to calculate centroid and approximate area for filtering
   const getFeatureInfo = (feature: any) => {
       if (!feature.geometry) return null;
@@ -97,7 +117,7 @@ const GlobeComponent: React.FC<GlobeComponentProps> = ({
              labels.push({
                 lat: info.lat, 
                 lng: info.lng, 
-                text: d.properties.NAME_LONG || d.properties.NAME || d.properties.ADMIN,
+                text: d.properties.NAME_LONG || d.properties.NAME || d.properties.ADMIN || d.properties.name,
                 type: 'country',
                 size: Math.min(1.2, Math.max(0.4, info.points / 200)) // Scale label by size
             });
@@ -107,7 +127,7 @@ const GlobeComponent: React.FC<GlobeComponentProps> = ({
       // Add State Labels (SELECTIVE: Only for India to avoid global clutter)
       states.features.forEach((d: any) => {
           // Check for target countries (admin name usually maps to country)
-          const admin = d.properties.adm0_name || d.properties.admin;
+          const admin = d.properties.adm0_name || d.properties.admin || d.properties.country;
           const isTargetCountry = admin === 'India'; // Only show for India as requested
 
           if (isTargetCountry) {
@@ -202,12 +222,12 @@ const GlobeComponent: React.FC<GlobeComponentProps> = ({
 
         // Regions
         polygonsData={[...states.features, ...countries.features]}
-        polygonCapColor={() => 'rgba(0,0,0,0)'} 
+        polygonCapColor={getRegionColor}
         polygonSideColor={() => 'rgba(0,0,0,0.02)'}
         polygonStrokeColor={(d: any) => {
-            return d.properties.ADMIN ? 'rgba(148, 163, 184, 0.4)' : 'rgba(71, 85, 105, 0.2)'; 
+            return d.properties.level === 'country' ? 'rgba(148, 163, 184, 0.4)' : 'rgba(71, 85, 105, 0.2)'; 
         }}
-        polygonAltitude={(d: any) => d.properties.ADMIN ? 0.006 : 0.005}
+        polygonAltitude={(d: any) => d.properties.level === 'country' ? 0.006 : 0.005}
         polygonsMerge={true}
         
         // Real-time Fire Data (Dense GIS Layer)
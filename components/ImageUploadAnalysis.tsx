@@ -5,8 +5,12 @@ interface AnalysisResult {
     caption: string;
     risk_level: string;
     detected_keywords: string[];
+    risk_score?: number;
+    source?: string; // Backend that answered: blip-classifier, blip or gemini
 }
 
+const isHighRisk = (riskLevel: string) => riskLevel === 'High' || riskLevel === 'Extreme';
+
 const ImageUploadAnalysis: React.FC = () => {
     const [selectedFile, setSelectedFile] = useState<File | null>(null);
     const [previewUrl, setPreviewUrl] = useState<string | null>(null);
@@ -124,18 +128,18 @@ const ImageUploadAnalysis: React.FC = () => {
             )}
 
             {result && (
-                <div className={`p-4 rounded-lg border backdrop-blur-md transition-all duration-500 animate-fade-in ${result.risk_level === 'High'
+                <div className={`p-4 rounded-lg border backdrop-blur-md transition-all duration-500 animate-fade-in ${isHighRisk(result.risk_level)
                     ? 'bg-red-500/10 border-red-500/30'
                     : 'bg-green-500/10 border-green-500/30'
                     }`}>
                     <div className="flex justify-between items-start mb-2">
                         <div>
-                             <span className="text-[10px] text-slate-400 font-mono uppercase">Risk Assessment</span>
-                             <div className={`text-lg font-bold ${result.risk_level === 'High' ? 'text-red-400 glow-text-orange' : 'text-green-400'}`}>
+                             <span className="text-[10px] text-slate-400 font-mono uppercase">Risk Assessment{result.source ? ` · ${result.source}` : ''}</span>
+                             <div className={`text-lg font-bold ${isHighRisk(result.risk_level) ? 'text-red-400 glow-text-orange' : 'text-green-400'}`}>
                                  {result.risk_level.toUpperCase()}
                              </div>
                         </div>
-                         {result.risk_level === 'High' ? (
+                         {isHighRisk(result.risk_level) ? (
                              <div className="h-8 w-8 rounded-full bg-red-500/20 flex items-center justify-center border border-red-500/40 animate-pulse">
                                  <svg className="w-4 h-4 text-red-500" fill="currentColor" viewBox="0 0 20 20"><path fillRule="evenodd" d="M12.395 2.553a1 1 0 00-1.45-.385c-.345.23-.614.558-.822.88-.214.33-.403.713-.57 1.116-.334.804-.614 1.768-.84 2.734a31.365 31.365 0 00-.613 3.58 2.64 2.64 0 01-.945-1.067c-.328-.68-.398-1.534-.398-2.654A1 1 0 005.05 6.05 6.981 6.981 0 003 11a7 7 0 1011.95-4.95c-.592-.591-.98-.985-1.348-1.467-.363-.476-.724-1.063-1.207-2.03zM12.12 15.12A3 3 0 017 13s.879.5 2.5.5c0-1 .5-4 1.25-4.5.5 1 .786 1.293 1.371 1.879A2.99 2.99 0 0113 13a2.99 2.99 0 01-.879 2.121z" clipRule="evenodd" /></svg>
                              </div>
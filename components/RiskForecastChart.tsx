@@ -27,6 +27,11 @@ const CustomTooltip = ({ active, payload, label }: any) => {
                     <p className={`font-semibold ${data.risk === 'Extreme' ? 'text-red-500' : data.risk === 'High' ? 'text-orange-500' : 'text-blue-400'}`}>
                         Risk: {data.risk}
                     </p>
+                    {data.p10 !== undefined && data.p90 !== undefined && (
+                        <p className="text-slate-400">
+                            Range (p10–p90): {(data.p10 * 100).toFixed(0)}–{(data.p90 * 100).toFixed(0)}%
+                        </p>
+                    )}
                     <p className="text-slate-400">Temp: {data.temp}°C</p>
                     <p className="text-slate-400">Humidity: {data.humidity}%</p>
                     <p className="text-slate-400">Wind: {data.wind} km/h</p>
@@ -59,6 +64,15 @@ const RiskForecastChart: React.FC<RiskForecastChartProps> = ({ forecast }) => {
                         interval={2}
                     />
                     <Tooltip content={<CustomTooltip />} />
+                    {/* Uncertainty band across simulated weather scenarios */}
+                    <Area
+                        type="monotone"
+                        dataKey={(d: TimelineForecast) => [d.p10 ?? d.prob, d.p90 ?? d.prob]}
+                        stroke="none"
+                        fill="#f97316"
+                        fillOpacity={0.15}
+                        isAnimationActive={false}
+                    />
                     <Area
                         type="monotone"
                         dataKey="prob"
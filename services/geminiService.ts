@@ -22,8 +22,55 @@ const createPrompt = (data: WildfireInputData): string => {
   `;
 };
 
+const FEATURE_LABELS: Record<string, string> = {
+  temperature: 'temperature',
+  humidity: 'humidity',
+  wind_speed: 'wind',
+  rainfall: 'rainfall',
+  ndvi: 'vegetation',
+  elevation: 'elevation',
+  nearest_fire_km: 'nearby fires',
+  fires_within_radius: 'nearby fires'
+};
+
+// Per-feature contributions (log-odds) from the backend /explain endpoint
+const fetchFeatureContributions = async (inputs: object): Promise<Record<string, number> | null> => {
+  try {
+    const response = await fetch('http://localhost:8000/explain', {
+      method: 'POST',
+      headers: { 'Content-Type': 'application/json' },
+      body: JSON.stringify({ points: [inputs] })
+    });
+    if (!response.ok) return null;
+    const [explained] = await response.json();
+    return explained?.contributions ?? null;
+  } catch (error) {
+    console.warn("Failed to fetch feature contributions:", error);
+    return null;
+  }
+};
+
+const describeTopDrivers = (contributions: Record<string, number>, count: number = 3): string => {
+  return Object.entries(contributions)
+    .sort((a, b) => Math.abs(b[1]) - Math.abs(a[1]))
+    .slice(0, count)
+    .map(([name, value]) => `${FEATURE_LABELS[name] || name} (${value > 0 ? 'raises' : 'lowers'} risk)`)
+    .join(', ');
+};
+
 export const fetchWildfirePrediction = async (data: WildfireInputData, lat?: number, lon?: number): Promise<PredictionResult> => {
   try {
+    const modelInputs = {
+        lat: lat || 0,
+        lon: lon || 0,
+        temperature: data.temperature,
+        humidity: data.humidity,
+        wind_speed: data.windSpeed,
+        rainfall: data.rainfall,
+        ndvi: data.ndvi,
+        elevation: data.elevation
+    };
+
     // 1. Try to get prediction from local XGBoost API
     try {
         const response = await fetch('http://localhost:8000/predict', {
@@ -31,16 +78,7 @@ export const fetchWildfirePrediction = async (data: WildfireInputData, lat?: num
             headers: {
                 'Content-Type': 'application/json',
             },
-            body: JSON.stringify({
-                lat: lat || 0,
-                lon: lon || 0,
-                temperature: data.temperature,
-                humidity: data.humidity,
-                wind_speed: data.windSpeed,
-                rainfall: data.rainfall,
-                ndvi: data.ndvi,
-                elevation: data.elevation
-            }),
+            body: JSON.stringify(modelInputs),
         });
 
         if (response.ok) {
@@ -52,10 +90,14 @@ export const fetchWildfirePrediction = async (data: WildfireInputData, lat?: num
             else if (result.risk_level === "High") riskLevel = RiskLevel.High;
             else if (result.risk_level === "Medium") riskLevel = RiskLevel.Medium;
 
+            const contributions = await fetchFeatureContributions(modelInputs);
+            const drivers = contributions ? ` Top drivers: ${describeTopDrivers(contributions)}.` : '';
+
             return {
                 riskLevel,
-                explanation: `XGBoost Model Prediction: ${(result.fire_probability * 100).toFixed(2)}% probability. Risk Level: ${result.risk_level}. (Temp: ${data.temperature.toFixed(1)}°C, Wind: ${data.windSpeed.toFixed(1)}km/h)`,
-                source: 'XGBoost'
+                explanation: `XGBoost Model Prediction: ${(result.fire_probability * 100).toFixed(2)}% probability. Risk Level: ${result.risk_level}. (Temp: ${data.temperature.toFixed(1)}°C, Wind: ${data.windSpeed.toFixed(1)}km/h)${drivers}`,
+                source: 'XGBoost',
+                contributions: contributions || undefined
             };
         }
     } catch (apiError) {
@@ -314,12 +356,12 @@ export const evaluateModel = async (activeFires: ActiveFire[]): Promise<Evaluati
     }
 };
 
-export const fetchTimelinePrediction = async (lat: number, lon: number): Promise<TimelineForecast[]> => {
+export const fetchTimelinePrediction = async (lat: number, lon: number, scenarios: number = 500): Promise<TimelineForecast[]> => {
     try {
         const response = await fetch('http://localhost:8000/predict/timeline', {
             method: 'POST',
             headers: { 'Content-Type': 'application/json' },
-            body: JSON.stringify({ lat, lon })
+            body: JSON.stringify({ lat, lon, scenarios })
         });
         
         if (response.ok) {
@@ -32,3 +32,47 @@ export const fetchActiveFires = async (): Promise<ActiveFire[]> => {
     ];
   }
 };
+
+interface ActiveFireDelta {
+  version: number;
+  added: ActiveFire[];
+  updated: ActiveFire[];
+  removed: string[];
+}
+
+// Subscribes to the backend's Server-Sent Events stream. The backend sends one snapshot
+// and then only the hotspots that changed on each FIRMS refresh; onUpdate receives the
+// full current list after every event. onOpen / onError report whether the stream is
+// connected, so callers can fall back to polling. Returns a function that closes the stream.
+export const subscribeActiveFires = (
+  onUpdate: (fires: ActiveFire[]) => void,
+  onError?: (error: Event) => void,
+  onOpen?: () => void
+): (() => void) => {
+  const fires = new Map<string, ActiveFire>();
+  const source = new EventSource('http://localhost:8000/active-fires/stream');
+
+  source.addEventListener('snapshot', (event) => {
+    const snapshot = JSON.parse((event as MessageEvent).data) as { fires: ActiveFire[] };
+    fires.clear();
+    snapshot.fires.forEach((fire) => fires.set(fire.id!, fire));
+    onUpdate(Array.from(fires.values()));
+  });
+
+  source.addEventListener('delta', (event) => {
+    const delta = JSON.parse((event as MessageEvent).data) as ActiveFireDelta;
+    delta.removed.forEach((id) => fires.delete(id));
+    [...delta.added, ...delta.updated].forEach((fire) => fires.set(fire.id!, fire));
+    onUpdate(Array.from(fires.values()));
+  });
+
+  source.onopen = () => onOpen?.();
+
+  source.onerror = (error) => {
+    // EventSource reconnects on its own (resuming via Last-Event-ID)
+    console.warn("Active fire stream interrupted:", error);
+    onError?.(error);
+  };
+
+  return () => source.close();
+};
@@ -0,0 +1,47 @@
+import { RegionRisk } from '../types';
+
+type RegionLevel = 'country' | 'state';
+
+const NATURAL_EARTH_FALLBACK: Record<RegionLevel, string> = {
+  country: 'https://raw.githubusercontent.com/martynafford/natural-earth-geojson/master/110m/cultural/ne_110m_admin_0_countries.json',
+  state: 'https://raw.githubusercontent.com/martynafford/natural-earth-geojson/master/110m/cultural/ne_110m_admin_1_states_provinces.json'
+};
+
+// Simplified boundaries served by the backend (shipped in backend/regions, or built on first start).
+// Natural Earth on GitHub is only used when the backend cannot be reached; those features
+// have no `id`, so they cannot be joined to /regions/risk.
+export const fetchRegionGeometry = async (level: RegionLevel, detail: 'low' | 'medium' | 'high' = 'medium'): Promise<any> => {
+  let response: Response;
+  try {
+    response = await fetch(`http://localhost:8000/regions/${level}/geometry?detail=${detail}`);
+  } catch (error) {
+    console.warn(`Backend unreachable, using Natural Earth boundaries (${level}):`, error);
+    const fallback = await fetch(NATURAL_EARTH_FALLBACK[level]);
+    return fallback.json();
+  }
+  const retryAfter = response.headers.get('Retry-After');
+  if (response.status === 503 && retryAfter) {
+    // The backend is still building its region index
+    await new Promise((resolve) => setTimeout(resolve, Number(retryAfter) * 1000));
+    return fetchRegionGeometry(level, detail);
+  }
+  if (!response.ok) {
+    throw new Error(`Backend responded with status: ${response.status}`);
+  }
+  return response.json();
+};
+
+// Predictions and active fires aggregated per region; keyed by region id.
+export const fetchRegionalRisk = async (level: RegionLevel = 'country', hours = 168): Promise<Map<number, RegionRisk>> => {
+  try {
+    const response = await fetch(`http://localhost:8000/regions/risk?level=${level}&hours=${hours}`);
+    if (!response.ok) {
+      throw new Error(`Backend responded with status: ${response.status}`);
+    }
+    const data = await response.json() as { regions: RegionRisk[] };
+    return new Map(data.regions.map((region) => [region.id, region]));
+  } catch (error) {
+    console.error("Error fetching regional risk:", error);
+    return new Map();
+  }
+};
@@ -0,0 +1,60 @@
+import { WatchAlert, WatchSite } from '../types';
+
+const WATCHLIST_URL = 'http://localhost:8000/watchlist';
+
+// Only lat/lon are sent so the backend fills the inputs from its rasters each month.
+export const addWatchSite = async (username: string, lat: number, lon: number, name?: string, threshold = 0.6): Promise<WatchSite> => {
+  const response = await fetch(WATCHLIST_URL, {
+    method: 'POST',
+    headers: { 'Content-Type': 'application/json' },
+    body: JSON.stringify({ username, lat, lon, name, threshold })
+  });
+  if (!response.ok) {
+    const body = await response.json().catch(() => null);
+    throw new Error(body?.detail || `Backend responded with status: ${response.status}`);
+  }
+  return response.json();
+};
+
+export const fetchWatchSites = async (username: string): Promise<WatchSite[]> => {
+  const response = await fetch(`${WATCHLIST_URL}?username=${encodeURIComponent(username)}`);
+  if (!response.ok) {
+    throw new Error(`Backend responded with status: ${response.status}`);
+  }
+  return response.json();
+};
+
+export const removeWatchSite = async (username: string, siteId: string): Promise<void> => {
+  const response = await fetch(`${WATCHLIST_URL}/${siteId}?username=${encodeURIComponent(username)}`, { method: 'DELETE' });
+  if (!response.ok) {
+    throw new Error(`Backend responded with status: ${response.status}`);
+  }
+};
+
+/**
+ * Threshold-crossing alerts for a user's watched sites. The backend re-scores all
+ * sites on each FIRMS refresh or model change, so nothing is polled here.
+ * Returns an unsubscribe function.
+ */
+export const subscribeWatchlistAlerts = (
+  username: string,
+  onAlert: (alert: WatchAlert) => void,
+  onSites?: (sites: WatchSite[]) => void
+): (() => void) => {
+  const source = new EventSource(`${WATCHLIST_URL}/stream?username=${encodeURIComponent(username)}`);
+
+  source.addEventListener('snapshot', (event) => {
+    const snapshot = JSON.parse((event as MessageEvent).data) as { sites: WatchSite[] };
+    onSites?.(snapshot.sites);
+  });
+
+  source.addEventListener('alert', (event) => {
+    onAlert(JSON.parse((event as MessageEvent).data) as WatchAlert);
+  });
+
+  source.onerror = (error) => {
+    console.warn("Watchlist stream interrupted:", error);
+  };
+
+  return () => source.close();
+};
@@ -9,6 +9,9 @@ export interface ActiveFire {
     lon: number;
     brightness: number; 
     acq_date: string;
+    acq_time?: string;
+    id?: string; // Stable hotspot id assigned by the backend feed
+    sensors?: string[]; // FIRMS products that detected this hotspot
 }
 
 export enum RiskLevel {
@@ -33,6 +36,7 @@ export interface PredictionResult {
     riskLevel: RiskLevel;
     explanation: string;
     source?: string;
+    contributions?: Record<string, number>; // Per-feature log-odds contributions from /explain
 }
 
 export interface TimelineForecast {
@@ -44,6 +48,12 @@ export interface TimelineForecast {
     humidity: number;
     rain: number;
     wind?: number; // Backend sends sim_wind, need to map it or ignore
+    // Monte Carlo scenario mode: probability quantiles across simulated weather
+    p10?: number;
+    p50?: number;
+    p90?: number;
+    mean?: number;
+    scenarios?: number;
 }
 
 export interface AnalyzedHotspot {
@@ -52,3 +62,50 @@ export interface AnalyzedHotspot {
     envData: WildfireInputData;
     prediction?: PredictionResult;
 }
+
+// Per-region totals from the backend's /regions/risk (joined to boundaries by id)
+export interface RegionRisk {
+    id: number;
+    name: string;
+    iso: string | null;
+    country?: string | null;
+    predictions: number;
+    mean_prob: number | null;
+    risk_level: RiskLevel | null;
+    risk_counts: Record<string, number>;
+    active_fires: number;
+    total_frp: number;
+}
+
+// A location re-scored by the backend watchlist on every data refresh
+export interface WatchSite {
+    id: string;
+    username: string;
+    name: string;
+    lat: number;
+    lon: number;
+    threshold: number;
+    prob: number | null;
+    risk: RiskLevel | null;
+    above: boolean | null;
+    scored_at: string | null;
+    model_version: string | null;
+}
+
+// Pushed when a watched site's probability crosses its threshold
+export interface WatchAlert {
+    seq: number;
+    site_id: string;
+    username: string;
+    name: string;
+    lat: number;
+    lon: number;
+    direction: 'above' | 'below';
+    threshold: number;
+    prob: number;
+    previous_prob: number | null;
+    risk: RiskLevel;
+    reasons: string[];
+    model_version: string | null;
+    at: string;
+}